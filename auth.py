@@ -1,53 +1,218 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.hash import bcrypt
-from fastapi import Header, HTTPException
-from jose import JWTError, jwt
+from password_hasher import hash_password, verify_and_update
+from fastapi import Depends, Header, HTTPException
 from pydantic import BaseModel
+from collections import OrderedDict
+from dataclasses import dataclass
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+
+from models import RevokedToken
 
 # Secret key and algorithm
 SECRET_KEY = "Parr@matta"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+SIGNED_URL_SECONDS = 3600          # signed links stay valid between one and two of these
+
+TOKEN_CACHE_SIZE = 10000           # verified tokens kept per worker
+REVOCATION_REFRESH_SECONDS = 15    # how soon a logout on another worker takes effect
 
 
 class TokenData(BaseModel):
     username: str | None = None
 
-def verify_token(authorization: str = Header(...)):
+
+@dataclass(frozen=True)
+class AuthContext:
+    """Claims of a verified bearer token."""
+    token: str
+    sub: str
+    user_id: int | None = None
+    assignment: int | None = None   # user_assignment_id, set on tokens issued to QR scanners
+    jti: str | None = None
+    expires_at: float | None = None  # epoch seconds
+
+
+class TokenCache:
+    """LRU of verified tokens; entries are dropped once their token expires.
+
+    A hit skips the signature check: the key is the exact token string that
+    already verified, and it is never served past its own exp claim.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> AuthContext | None:
+        with self._lock:
+            context = self._entries.get(token)
+            if context is None:
+                return None
+            if context.expires_at is not None and context.expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return context
+
+    def put(self, context: AuthContext):
+        with self._lock:
+            self._entries[context.token] = context
+            self._entries.move_to_end(context.token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RevocationList:
+    """jti -> expiry of revoked tokens, for an O(1) check on every request."""
+
+    def __init__(self):
+        self._revoked = {}
+
+    def __contains__(self, jti) -> bool:
+        return jti is not None and jti in self._revoked
+
+    def add(self, jti: str, expires_at: float):
+        self._revoked[jti] = expires_at
+
+    def replace(self, revoked: dict):
+        # Swap in one assignment; readers never see a half-built dict
+        self._revoked = dict(revoked)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+token_cache = TokenCache()
+revoked_tokens = RevocationList()
+
+
+def decode_token(token: str) -> AuthContext:
+    """Verified claims of token (cached); raises JWTError if invalid, expired or revoked."""
+    context = token_cache.get(token)
+    if context is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("sub") is None:
+            raise JWTError("Token payload invalid")
+        context = AuthContext(
+            token=token,
+            sub=payload["sub"],
+            user_id=payload.get("user_id"),
+            assignment=payload.get("assignment"),
+            jti=payload.get("jti"),
+            expires_at=payload.get("exp"),
+        )
+        token_cache.put(context)
+    if context.jti in revoked_tokens:
+        raise JWTError("Token has been revoked")
+    return context
+
+
+def get_auth_context(authorization: str = Header(...)) -> AuthContext:
+    # FastAPI resolves a dependency once per request, so every Depends on this
+    # (including verify_token) shares one decode
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid token format")
-    
+
     token = authorization.split(" ")[1]
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Token payload invalid")
-        return username
+        return decode_token(token)
     except JWTError:
         raise HTTPException(status_code=401, detail="Token is invalid or expired")
-    
-    
+
+
+def verify_token(auth: AuthContext = Depends(get_auth_context)):
+    return auth.sub
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(12)})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+
+def revoke_token(db, context: AuthContext):
+    """Revoke a token in this worker now and, through revoked_token, in the others."""
+    if context.jti is None:
+        raise ValueError("Token has no jti and cannot be revoked")
+    expires_at = context.expires_at or time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    db.merge(RevokedToken(
+        jti=context.jti,
+        expires_at=datetime.utcfromtimestamp(expires_at),
+        revoked_at=datetime.utcnow(),
+    ))
+    db.commit()
+    revoked_tokens.add(context.jti, expires_at)
+    token_cache.discard(context.token)
+
+
+def refresh_revocations(session_factory):
+    """Reload the revocation list from revoked_token, pruning rows past expiry."""
+    db = session_factory()
+    try:
+        now = datetime.utcnow()
+        db.query(RevokedToken).filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+        db.commit()
+        revoked_tokens.replace({
+            jti: (expires_at - datetime(1970, 1, 1)).total_seconds()
+            for jti, expires_at in db.query(RevokedToken.jti, RevokedToken.expires_at)
+        })
+    finally:
+        db.close()
+
+
+# Signed links: an HMAC of path and expiry under SECRET_KEY, checked without a token
+def _url_signature(path: str, expires: int) -> str:
+    digest = hmac.new(SECRET_KEY.encode("utf-8"), f"url:{path}:{expires}".encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode("ascii")
+
+
+def sign_url(path: str, now: float | None = None) -> str:
+    """path with an expiring signature, for links that cannot carry a bearer header (<img src>).
+
+    The expiry is rounded up to a whole SIGNED_URL_SECONDS step, so the same
+    link is handed out for a while and browsers can reuse their cached copy.
+    """
+    expires = (int(now if now is not None else time.time()) // SIGNED_URL_SECONDS + 2) * SIGNED_URL_SECONDS
+    return f"{path}?expires={expires}&sig={_url_signature(path, expires)}"
+
+
+def verify_signed_url(path: str, expires: int | None, sig: str | None) -> bool:
+    if expires is None or not sig or expires <= time.time():
+        return False
+    return hmac.compare_digest(sig, _url_signature(path, expires))
+
+
+# Inline (blocking) variants for scripts; /login goes through the PasswordHasher pool
 def verify_password(plain_password, hashed_password):
-    return bcrypt.verify(plain_password, hashed_password)
+    return verify_and_update(plain_password, hashed_password)[0]
 
 def get_password_hash(password):
-    return bcrypt.hash(password)
+    return hash_password(password)
 
 def get_assignment_id_from_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        assignment_id = payload.get("assignment")  
+        assignment_id = decode_token(token).assignment
         if assignment_id is None:
             raise ValueError("Invalid token: no user ID")
         return assignment_id
     except JWTError:
         raise ValueError("Invalid token")
+
@@ -0,0 +1,61 @@
+# bench/auth_bench.py
+"""Auth overhead per request: full JWT verification against the cached path.
+
+From the repository root:
+
+    python -m bench.auth_bench --requests 200000 --tokens 1000 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jose import jwt
+
+from auth import ALGORITHM, SECRET_KEY, create_access_token, get_auth_context, token_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auth overhead per request")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--tokens", type=int, default=1000, help="distinct clients (tokens) in the mix")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    tokens = [
+        create_access_token({"sub": f"user{i}", "user_id": i, "assignment": i})
+        for i in range(args.tokens)
+    ]
+    headers = [f"Bearer {token}" for token in tokens]
+
+    def run(fn, n):
+        start = time.perf_counter()
+        for i in range(n):
+            fn(headers[i % len(headers)])
+        return time.perf_counter() - start
+
+    def uncached(header):
+        payload = jwt.decode(header.split(" ")[1], SECRET_KEY, algorithms=[ALGORITHM])
+        return payload["sub"]
+
+    uncached_n = min(args.requests, 20000)
+    elapsed = run(uncached, uncached_n)
+    print(f"jwt.decode every request: {elapsed / uncached_n * 1e6:8.2f} us/request  "
+          f"({uncached_n / elapsed:10.0f} req/s on one thread)")
+
+    token_cache.clear()
+    run(get_auth_context, len(headers))  # warm
+    elapsed = run(get_auth_context, args.requests)
+    print(f"cached auth context:      {elapsed / args.requests * 1e6:8.2f} us/request  "
+          f"({args.requests / elapsed:10.0f} req/s on one thread)")
+
+    per_thread = args.requests // args.threads
+    with ThreadPoolExecutor(args.threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: run(get_auth_context, per_thread), range(args.threads)))
+        elapsed = time.perf_counter() - start
+    print(f"cached, {args.threads} threads:        {elapsed / (per_thread * args.threads) * 1e6:8.2f} us/request  "
+          f"({per_thread * args.threads / elapsed:10.0f} req/s total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# bench/login_storm_bench.py
+"""Other endpoints' latency during a login storm, against a running server.
+
+From the repository root:
+
+    python -m bench.login_storm_bench --url http://127.0.0.1:8000 --user admin --password secret --token <jwt>
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Other endpoints' latency during a login storm")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--token", required=True, help="bearer token for the probed endpoint")
+    parser.add_argument("--probe", default="/admin-dashboard")
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+
+    def percentiles(samples):
+        samples = sorted(samples)
+        return "  ".join(
+            f"p{p} {samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000:7.1f} ms" for p in (50, 95, 99)
+        )
+
+    def probe(client):
+        samples = []
+        for _ in range(args.probes):
+            started = time.perf_counter()
+            client.get(args.probe, headers={"Authorization": f"Bearer {args.token}"})
+            samples.append(time.perf_counter() - started)
+            time.sleep(0.01)
+        return samples
+
+    with httpx.Client(base_url=args.url, timeout=30) as client:
+        print(f"{args.probe} idle:        {percentiles(probe(client))}")
+
+        statuses = {}
+
+        def login(_):
+            response = client.post("/login", json={"portal_user_name": args.user, "password": args.password})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            storm = [pool.submit(login, i) for i in range(args.logins)]
+            during = probe(client)
+            for future in storm:
+                future.result()
+        print(f"{args.probe} login storm: {percentiles(during)}")
+        print(f"login responses: {dict(sorted(statuses.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# bench/mail_bench.py
+"""Per-message cost: a connection per mail against the pooled MailQueue.
+
+Against a local stand-in, from the repository root:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_USE_TLS=false SMTP_USERNAME= python -m bench.mail_bench --to you@example.com
+"""
+import argparse
+import logging
+import time
+
+from emailer import MailQueue, send_email
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-message cost: connection per mail vs pooled queue")
+    parser.add_argument("--to", required=True)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    started = time.perf_counter()
+    for i in range(args.count):
+        send_email(args.to, f"bench {i}", "<p>bench</p>", "bench")
+    one_off = (time.perf_counter() - started) / args.count
+
+    mail_queue = MailQueue(pool_size=args.pool_size, max_queue=args.count)
+    mail_queue.start()
+    started = time.perf_counter()
+    for i in range(args.count):
+        mail_queue.enqueue(args.to, f"bench {i}", "<p>bench</p>", "bench")
+    mail_queue.stop(timeout=300)
+    pooled = (time.perf_counter() - started) / args.count
+
+    print(f"connection per mail {one_off * 1000:7.2f} ms/mail")
+    print(f"pooled ({args.pool_size})          {pooled * 1000:7.2f} ms/mail")
+    print(mail_queue.stats())
+
+
+if __name__ == "__main__":
+    main()
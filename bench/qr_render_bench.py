@@ -0,0 +1,51 @@
+# bench/qr_render_bench.py
+"""Per-QR rendering cost for each profile, inline against the process pool.
+
+From the repository root:
+
+    python -m bench.qr_render_bench --count 200 --workers 3
+"""
+import argparse
+import time
+
+from qr_render import (
+    PNG_PROFILE, QR_RENDER_POOL_MIN_BATCH, QR_RENDER_WORKERS, SVG_PROFILE, QrProfile, QrRenderer, _render_chunk,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-QR rendering cost")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=QR_RENDER_WORKERS)
+    args = parser.parse_args()
+
+    urls = [f"https://qr.example.com/#/verify-secret-code/{i:08d}" for i in range(args.count)]
+    profiles = [
+        ("png, ec=M", PNG_PROFILE),
+        ("png, ec=L, box=6", QrProfile(box_size=6, error_correction="L")),
+        ("png, fixed mask", QrProfile(mask_pattern=0)),
+        ("svg, auto mask", QrProfile(fmt="svg")),
+        ("svg, fixed mask", SVG_PROFILE),
+    ]
+    renderer = QrRenderer(args.workers)
+    renderer.render_batch(urls[:QR_RENDER_POOL_MIN_BATCH * args.workers])  # start the workers
+    try:
+        for label, profile in profiles:
+            started = time.perf_counter()
+            _render_chunk(urls, profile)
+            serial = (time.perf_counter() - started) / len(urls)
+            started = time.perf_counter()
+            renderer.render_batch(urls, profile)
+            pooled = (time.perf_counter() - started) / len(urls)
+            started = time.perf_counter()
+            for url in urls[:50]:
+                renderer.render_one(url, profile)
+            single = (time.perf_counter() - started) / min(50, len(urls))
+            print(f"{label:<18} inline {serial * 1000:7.2f} ms/QR   pool({args.workers}) {pooled * 1000:7.2f} ms/QR"
+                  f"   one at a time {single * 1000:7.2f} ms/QR")
+    finally:
+        renderer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
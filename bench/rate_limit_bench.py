@@ -0,0 +1,37 @@
+# bench/rate_limit_bench.py
+"""Rate limiter cost per check, in memory or against a Redis server.
+
+From the repository root:
+
+    python -m bench.rate_limit_bench --checks 200000 --keys 50000
+    python -m bench.rate_limit_bench --redis-url redis://localhost:6379/0
+"""
+import argparse
+import time
+
+from rate_limit import QR_INITIATE_PER_IP, QR_INITIATE_PER_SECRET, make_rate_limiter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limiter cost per check")
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=50000, help="distinct clients")
+    parser.add_argument("--redis-url", default="")
+    args = parser.parse_args()
+
+    limiter = make_rate_limiter("redis" if args.redis_url else "memory", args.redis_url)
+    checks = min(args.checks, 5000) if args.redis_url else args.checks
+    for label, buckets in (("one bucket", 1), ("ip + secret", 2)):
+        denied = 0
+        started = time.perf_counter()
+        for i in range(checks):
+            client = f"10.0.{i % args.keys // 256}.{i % 256}"
+            pairs = [(QR_INITIATE_PER_IP, client), (QR_INITIATE_PER_SECRET, f"secret{i % args.keys}")]
+            denied += limiter.hit_all(pairs[:buckets]) > 0
+        elapsed = time.perf_counter() - started
+        print(f"{type(limiter).__name__} {label:<12} {elapsed / checks * 1e6:7.2f} us/check, "
+              f"{denied} of {checks} denied")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench/scan_log_bench.py
+"""Scan log write latency: a commit per event against the write-behind buffer.
+
+Writes rows tagged "benchmark" to the configured database and deletes them
+afterwards. From the repository root:
+
+    python -m bench.scan_log_bench --user-assignment-id 1 --count 2000
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import UserScanLog
+from scan_log import ScanLogBuffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan log write latency: commit per event vs write-behind")
+    parser.add_argument("--user-assignment-id", type=int, required=True)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    def per_event(_):
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            db.add(UserScanLog(user_assignment_id=args.user_assignment_id, scan_datetime=datetime.utcnow(),
+                               verification_status="benchmark"))
+            db.commit()
+        finally:
+            db.close()
+        return time.perf_counter() - started
+
+    buffer = ScanLogBuffer(SessionLocal)
+
+    def buffered(_):
+        started = time.perf_counter()
+        buffer.record(args.user_assignment_id, "benchmark")
+        return time.perf_counter() - started
+
+    def report(label, fn):
+        with ThreadPoolExecutor(args.threads) as pool:
+            started = time.perf_counter()
+            latencies = sorted(pool.map(fn, range(args.count)))
+            elapsed = time.perf_counter() - started
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"{label:<16} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   {args.count / elapsed:9.0f} events/s")
+
+    try:
+        report("commit per event", per_event)
+        buffer.start()
+        report("write-behind", buffered)
+        started = time.perf_counter()
+        buffer.stop()
+        print(f"final flush {(time.perf_counter() - started) * 1000:.1f} ms, {buffer.flushed} rows written")
+    finally:
+        db = SessionLocal()
+        db.query(UserScanLog).filter(UserScanLog.verification_status == "benchmark").delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
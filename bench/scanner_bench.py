@@ -0,0 +1,75 @@
+# bench/scanner_bench.py
+"""Panel tree scan: listdir + isdir/isfile against the scandir scanner.
+
+From the repository root:
+
+    python -m bench.scanner_bench --panels 10000 --files 20
+    python -m bench.scanner_bench --root /home/qrhertz/panels
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from scanner import SCAN_MAX_WORKERS, scan_tree
+
+
+def _legacy_scan(base_dir: str) -> dict:
+    tree = {}
+    for panel_name in os.listdir(base_dir):
+        panel_path = os.path.join(base_dir, panel_name)
+        if os.path.isdir(panel_path):
+            tree[panel_name] = [
+                fname for fname in os.listdir(panel_path)
+                if os.path.isfile(os.path.join(panel_path, fname))
+            ]
+    return tree
+
+
+def _generate_tree(root: str, panels: int, files: int):
+    for p in range(panels):
+        panel_path = os.path.join(root, f"panel_{p:05d}")
+        os.mkdir(panel_path)
+        for f in range(files):
+            with open(os.path.join(panel_path, f"manual_{f:02d}.pdf"), "wb") as fh:
+                fh.write(b"%PDF-1.4\n")
+
+
+def _timed(label: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    total = sum(len(v) for v in result.values())
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms  ({len(result)} panels, {total} files)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare listdir+isfile scanning with the scandir scanner")
+    parser.add_argument("--root", help="existing panel tree to scan (default: generate one)")
+    parser.add_argument("--panels", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=SCAN_MAX_WORKERS)
+    args = parser.parse_args()
+
+    root = args.root
+    generated = root is None
+    if generated:
+        root = tempfile.mkdtemp(prefix="panel-bench-")
+        print(f"Generating {args.panels} panels x {args.files} files under {root} ...")
+        _generate_tree(root, args.panels, args.files)
+    try:
+        _timed("listdir + isdir/isfile", lambda: _legacy_scan(root))
+        _timed("scandir, names only, 1 thread", lambda: scan_tree(root, with_stat=False, max_workers=1))
+        _timed(f"scandir, names only, {args.workers} threads",
+               lambda: scan_tree(root, with_stat=False, max_workers=args.workers))
+        _timed("scandir + stat, 1 thread", lambda: scan_tree(root, max_workers=1))
+        _timed(f"scandir + stat, {args.workers} threads", lambda: scan_tree(root, max_workers=args.workers))
+    finally:
+        if generated:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
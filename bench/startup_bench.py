@@ -0,0 +1,88 @@
+# bench/startup_bench.py
+"""Worker startup time: import main, run the lifespan, serve the first request.
+
+Each run is a fresh interpreter, like a worker after a (rolling) restart.
+From the repository root:
+
+    python -m bench.startup_bench --runs 5
+    python -m bench.startup_bench --database-url mysql+pymysql://user:pw@host/db
+
+Without --database-url a throwaway SQLite file is used (the first run also
+creates the schema there). Needs httpx for FastAPI's TestClient.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line of timings in ms
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+from auth import create_access_token
+headers = {"Authorization": "Bearer " + create_access_token({"sub": "startup-bench"})}
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    status = client.get(sys.argv[2], headers=headers).status_code
+    t3 = time.perf_counter()
+print(json.dumps({"import": (t1 - t0) * 1000, "lifespan": (t2 - t1) * 1000,
+                  "first_request": (t3 - t2) * 1000, "total": (t3 - t0) * 1000, "status": status}))
+"""
+
+# Only needed to build the mail queue; the benchmark never sends mail
+_PLACEHOLDER_ENV = {
+    "SMTP_HOST": "localhost",
+    "SMTP_USERNAME": "",
+    "SMTP_PASSWORD": "",
+    "SMTP_FROM_EMAIL": "startup-bench@example.com",
+}
+
+
+def run_once(env: dict, path: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD, ROOT_DIR, path],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker startup (import + lifespan + first request)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/panels", help="endpoint used for the first request")
+    parser.add_argument("--database-url", default="", help="default: a temporary SQLite file")
+    args = parser.parse_args()
+
+    env = {**_PLACEHOLDER_ENV, **os.environ}
+    tmp_db = None
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    elif "DATABASE_URL" not in env:
+        tmp_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp_db.close()
+        env["DATABASE_URL"] = f"sqlite:///{tmp_db.name}"
+
+    try:
+        runs = [run_once(env, args.path) for _ in range(args.runs)]
+    finally:
+        if tmp_db:
+            os.unlink(tmp_db.name)
+
+    print(f"{args.runs} runs, first request GET {args.path} -> {runs[-1]['status']}")
+    for key in ("import", "lifespan", "first_request", "total"):
+        values = [run[key] for run in runs]
+        print(f"{key:>14}: median {statistics.median(values):8.1f} ms   "
+              f"min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
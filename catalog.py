@@ -0,0 +1,79 @@
+# catalog.py
+import hashlib
+import json
+import threading
+import time
+from typing import NamedTuple
+
+from models import PanelMaster, FileMeta
+
+CATALOG_MAX_AGE_SECONDS = 60  # rebuild even without a sync signal, e.g. after manual DB edits
+
+
+class CatalogSnapshot(NamedTuple):
+    etag: str
+    body: bytes
+    built_at: float
+
+
+def build_panel_catalog(db) -> list:
+    """Active panels with their active files, from a single joined query."""
+    rows = (
+        db.query(PanelMaster.panel_id, PanelMaster.panel_name, FileMeta.file_meta_id, FileMeta.file_name)
+        .outerjoin(FileMeta, (FileMeta.panel_id == PanelMaster.panel_id) & (FileMeta.is_deleted == False))
+        .filter(PanelMaster.is_deleted == False)
+        .order_by(PanelMaster.panel_id, FileMeta.file_meta_id)
+    )
+
+    panels = []
+    current = None
+    for panel_id, panel_name, file_meta_id, file_name in rows:
+        if current is None or current["panel_id"] != panel_id:
+            current = {"panel_id": panel_id, "panel_name": panel_name, "file_count": 0, "files": []}
+            panels.append(current)
+        if file_meta_id is not None:
+            current["files"].append({"file_meta_id": file_meta_id, "file_name": file_name})
+            current["file_count"] += 1
+    return panels
+
+
+class PanelCatalog:
+    """In-process, pre-serialised snapshot of the /panels response.
+
+    The snapshot is rebuilt lazily after invalidate() (called when a panel
+    sync changes something) or once it is older than max_age. Its ETag is the
+    hash of the serialised body, so it is strong and identical across workers.
+    """
+
+    def __init__(self, session_factory, max_age: float = CATALOG_MAX_AGE_SECONDS):
+        self.session_factory = session_factory
+        self.max_age = max_age
+        self._snapshot = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def invalidate(self, *args):
+        self._stale = True
+
+    def snapshot(self) -> CatalogSnapshot:
+        snap = self._snapshot
+        if snap is not None and not self._stale and time.monotonic() - snap.built_at < self.max_age:
+            return snap
+        with self._lock:
+            snap = self._snapshot
+            if snap is not None and not self._stale and time.monotonic() - snap.built_at < self.max_age:
+                return snap
+            # Clear the flag first so an invalidation during the build is not lost
+            self._stale = False
+            db = self.session_factory()
+            try:
+                panels = build_panel_catalog(db)
+            except Exception:
+                self._stale = True
+                raise
+            finally:
+                db.close()
+            body = json.dumps(panels, separators=(",", ":")).encode("utf-8")
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            self._snapshot = CatalogSnapshot(etag, body, time.monotonic())
+            return self._snapshot
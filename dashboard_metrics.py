@@ -0,0 +1,258 @@
+# dashboard_metrics.py
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from models import DashboardCounter, FileMeta, PanelMaster, User, UserAssignment, UserScanLog
+
+METRICS_REFRESH_SECONDS = 30
+METRICS_SCAN_DAYS = 30           # days of per-status scan counts shown on the dashboard
+METRICS_SCAN_CHUNK = 50000       # scan log ids folded into the counters per pass
+METRICS_RECOUNT_SECONDS = 3600   # safety-net recount of the entity tables, by one worker
+
+SCAN_HIGH_WATER_KEY = "scan_log:high_water"   # last log_id already counted
+METRICS_FOLD_KEY = "dashboard_metrics:last_fold"         # epoch of the last scan fold, by any worker
+METRICS_RECOUNT_KEY = "dashboard_metrics:last_recount"   # epoch of the last entity recount
+ENTITY_KEYS = ("panels", "files", "users", "assignments")
+# Statuses counted on their own; anything else a client posts to /user-scan-log
+# is counted as "other", so the counter table grows by at most this many rows a day
+SCAN_STATUSES = frozenset({"qr_initiated", "otp_verified", "1", "2", "success", "failed"})
+
+
+def scan_key(day, status) -> str:
+    return f"scans:{day}:{status if status in SCAN_STATUSES else 'other'}"
+
+
+def recount_entities(db) -> dict:
+    """Count the entity tables outright; the write sites only send deltas (DashboardMetrics.adjust)."""
+    return {
+        "panels": db.query(func.count(PanelMaster.panel_id)).filter(PanelMaster.is_deleted == False).scalar(),
+        "files": db.query(func.count(FileMeta.file_meta_id)).filter(FileMeta.is_deleted == False).scalar(),
+        "users": db.query(func.count(User.user_id)).scalar(),
+        "assignments": db.query(func.count(UserAssignment.user_assignment_id)).scalar(),
+    }
+
+
+def _upsert(db, values: dict, now: datetime, add: bool):
+    # Callers hold the high-water row lock, so nobody else writes counters meanwhile
+    existing = dict(
+        db.query(DashboardCounter.metric_key, DashboardCounter.value)
+        .filter(DashboardCounter.metric_key.in_(values))
+    )
+    updates = [
+        {"k": key, "v": (existing[key] + value) if add else value, "t": now}
+        for key, value in values.items() if key in existing
+    ]
+    inserts = [
+        {"metric_key": key, "value": value, "updated_at": now}
+        for key, value in values.items() if key not in existing
+    ]
+    if updates:
+        db.execute(
+            update(DashboardCounter.__table__)
+            .where(DashboardCounter.__table__.c.metric_key == bindparam("k"))
+            .values(value=bindparam("v"), updated_at=bindparam("t")),
+            updates,
+        )
+    if inserts:
+        db.execute(DashboardCounter.__table__.insert(), inserts)
+
+
+def _add_deltas(db, deltas: dict, now: datetime):
+    # value = value + delta, no read first: safe against other workers flushing theirs.
+    # A missing row is left to the recount, which runs first on a fresh database
+    table = DashboardCounter.__table__
+    db.execute(
+        update(table)
+        .where(table.c.metric_key == bindparam("k"))
+        .values(value=table.c.value + bindparam("d"), updated_at=bindparam("t")),
+        [{"k": key, "d": delta, "t": now} for key, delta in deltas.items()],
+    )
+
+
+def claim_run(db, key: str, seconds: float) -> bool:
+    """True for at most one caller per `seconds` across all workers (the RetentionJob pattern)."""
+    try:
+        row = lock_counter(db, key)
+    except IntegrityError:
+        db.rollback()  # another worker created the row first, and so claimed this run
+        return False
+    now = int(time.time())
+    if now - row.value < seconds:
+        db.commit()
+        return False
+    row.value = now
+    row.updated_at = datetime.utcnow()
+    db.commit()
+    return True
+
+
+def lock_counter(db, key: str) -> DashboardCounter:
+    """The counter row for key, locked for this transaction (created at 0 if missing)."""
+    row = (
+        db.query(DashboardCounter)
+        .filter(DashboardCounter.metric_key == key)
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        row = DashboardCounter(metric_key=key, value=0, updated_at=datetime.utcnow())
+        db.add(row)
+        db.flush()  # IntegrityError if another worker created it first
+    return row
+
+
+def update_counters(db, ceiling: int) -> int:
+    """Fold scan logs with high-water < log_id <= ceiling into per-day counters.
+
+    Runs in one transaction per chunk under a lock on the high-water row, so
+    several workers refreshing at once never count a scan twice. Returns
+    the number of log ids folded.
+    """
+    folded = 0
+    while True:
+        high_water = lock_counter(db, SCAN_HIGH_WATER_KEY)
+        now = datetime.utcnow()
+        upper = min(ceiling, high_water.value + METRICS_SCAN_CHUNK)
+        scans = {}
+        if upper > high_water.value:
+            day = func.date(UserScanLog.scan_datetime)
+            for scan_day, status, count in (
+                db.query(day, UserScanLog.verification_status, func.count(UserScanLog.log_id))
+                .filter(UserScanLog.log_id > high_water.value, UserScanLog.log_id <= upper,
+                        UserScanLog.scan_datetime.isnot(None))
+                .group_by(day, UserScanLog.verification_status)
+            ):
+                key = scan_key(scan_day, status)
+                scans[key] = scans.get(key, 0) + count
+            _upsert(db, scans, now, add=True)
+            folded += upper - high_water.value
+            high_water.value = upper
+            high_water.updated_at = now
+        db.commit()
+        if upper >= ceiling:
+            return folded
+
+
+class DashboardMetrics:
+    """Dashboard numbers served from memory, refreshed from the dashboard_counter table.
+
+    The write sites report entity changes through adjust() (the panel sync
+    through note_sync()); refresh(), run by a PeriodicJob in every worker,
+    adds this worker's pending deltas to the counters and reloads the cache.
+    Folding new scan logs is done by one worker per interval, and a full
+    recount of the entity tables, which also repairs deltas lost in a crash,
+    by one worker every recount_seconds. A recount can miss or double-count
+    deltas other workers have not flushed yet; the next one corrects that.
+
+    snapshot() never touches the database once the cache is loaded (a cold
+    load before the first refresh uses read_session_factory, e.g. a read
+    replica).
+    """
+
+    def __init__(self, session_factory, scan_days: int = METRICS_SCAN_DAYS, read_session_factory=None,
+                 interval: float = METRICS_REFRESH_SECONDS, recount_seconds: float = METRICS_RECOUNT_SECONDS):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory or session_factory
+        self.scan_days = scan_days
+        self.interval = interval
+        self.recount_seconds = recount_seconds
+        self._snapshot = None
+        self._seen_max_log_id = None
+        self._deltas = {}
+        self._deltas_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def adjust(self, **deltas):
+        """Record entity changes already committed, e.g. adjust(users=1, assignments=3)."""
+        with self._deltas_lock:
+            for key, delta in deltas.items():
+                if key not in ENTITY_KEYS:
+                    raise ValueError(f"Unknown dashboard counter: {key}")
+                self._deltas[key] = self._deltas.get(key, 0) + delta
+
+    def note_sync(self, report):
+        """Panel sync listener; report is None for a sync in another worker, which counts it itself."""
+        if report is not None:
+            self.adjust(
+                panels=report.panels_added + report.panels_reactivated - report.panels_deleted,
+                files=report.files_added + report.files_reactivated - report.files_deleted,
+            )
+
+    def refresh(self):
+        with self._lock:
+            db = self.session_factory()
+            try:
+                self._flush_deltas(db)
+                if claim_run(db, METRICS_FOLD_KEY, self.interval / 2):
+                    self._fold_scans(db)
+                if claim_run(db, METRICS_RECOUNT_KEY, self.recount_seconds):
+                    _upsert(db, recount_entities(db), datetime.utcnow(), add=False)
+                    db.commit()
+                self._snapshot = self._load(db)
+            finally:
+                db.close()
+
+    def _flush_deltas(self, db):
+        with self._deltas_lock:
+            deltas, self._deltas = {key: delta for key, delta in self._deltas.items() if delta}, {}
+        if not deltas:
+            return
+        try:
+            _add_deltas(db, deltas, datetime.utcnow())
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.adjust(**deltas)  # try again at the next refresh
+            raise
+
+    def _fold_scans(self, db):
+        max_log_id = db.query(func.max(UserScanLog.log_id)).scalar() or 0
+        # Count only up to the max seen on the previous fold: a batch that
+        # had taken lower ids but not committed yet has certainly landed by now
+        ceiling = max_log_id if self._seen_max_log_id is None else min(self._seen_max_log_id, max_log_id)
+        try:
+            update_counters(db, ceiling)
+        except IntegrityError:
+            db.rollback()  # another worker created the same counters first
+            update_counters(db, ceiling)
+        self._seen_max_log_id = max_log_id
+
+    def snapshot(self) -> dict:
+        if self._snapshot is None:
+            db = self.read_session_factory()
+            try:
+                self._snapshot = self._load(db)
+            finally:
+                db.close()
+        return self._snapshot
+
+    def _load(self, db) -> dict:
+        cutoff = (datetime.utcnow() - timedelta(days=self.scan_days - 1)).date()
+        rows = (
+            db.query(DashboardCounter.metric_key, DashboardCounter.value, DashboardCounter.updated_at)
+            .filter(or_(
+                DashboardCounter.metric_key.in_(ENTITY_KEYS),
+                and_(DashboardCounter.metric_key >= f"scans:{cutoff}", DashboardCounter.metric_key < "scans;"),
+            ))
+            .all()
+        )
+        snapshot = {key: 0 for key in ENTITY_KEYS}
+        scans_by_day = {}
+        updated_at = None
+        for key, value, row_updated_at in rows:
+            if key.startswith("scans:"):
+                _, day, status = key.split(":", 2)
+                scans_by_day.setdefault(day, {})[status] = value
+            else:
+                snapshot[key] = value
+            if row_updated_at and (updated_at is None or row_updated_at > updated_at):
+                updated_at = row_updated_at
+        today = f"{datetime.utcnow().date()}"
+        snapshot["scans_today"] = scans_by_day.get(today, {})
+        snapshot["scans_by_day"] = dict(sorted(scans_by_day.items()))
+        snapshot["updated_at"] = updated_at.isoformat() if updated_at else None
+        return snapshot
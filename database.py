@@ -5,31 +5,149 @@ Created on Sun Apr 20 14:29:39 2025
 @author: AshokKumarSathasivam
 """
 
+from functools import lru_cache
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 import json
 import os
+import threading
 import urllib.parse
 
 
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 config_path = '/'.join([ROOT_DIR, 'config.json'])
 
-# read json file
-with open(config_path) as config_file:
-    config = json.load(config_file)
-    sql_config = config['localdatabase']  # Change to 'production' for production settings
+# Pool defaults; a profile may override any of them. Recycling well inside the
+# server's / proxy's idle timeout plus a pre-ping on checkout keeps connections
+# that RDS dropped while idle from failing the first request after a quiet spell
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+POOL_TIMEOUT = 30        # seconds to wait for a free connection
+POOL_RECYCLE = 1800      # seconds before a pooled connection is replaced
+POOL_PRE_PING = True
 
+# Nothing here reads config.json or builds an engine at import time; the
+# first session (or get_engine()) does, so importing models/CLI tools is free
+_engines = {}
+_engines_lock = threading.Lock()
 
-SQL_server = sql_config['server']
-SQL_database = sql_config['database']
-SQL_user = sql_config['user']
-#SQL_password = sql_config['password']
-SQL_password = urllib.parse.quote_plus(sql_config['password'])
-SQL_port = sql_config.get('port', 3306)
 
-DATABASE_URL = f"mysql+pymysql://{SQL_user}:{SQL_password}@{SQL_server}:{SQL_port}/{SQL_database}"
+@lru_cache(maxsize=None)
+def load_config() -> dict:
+    with open(config_path) as config_file:
+        return json.load(config_file)
+
+
+def db_profile() -> dict:
+    # Profile in config.json to connect with, e.g. DB_PROFILE=database for production
+    return load_config()[os.environ.get("DB_PROFILE", "localdatabase")]
+
+
+def profile_url(profile: dict) -> str:
+    if profile.get("url"):
+        return profile["url"]
+    password = urllib.parse.quote_plus(profile['password'])
+    port = profile.get('port', 3306)
+    return f"mysql+pymysql://{profile['user']}:{password}@{profile['server']}:{port}/{profile['database']}"
+
+
+def make_engine(url: str, profile: dict):
+    options = {"pool_pre_ping": profile.get("pool_pre_ping", POOL_PRE_PING)}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=int(profile.get("pool_size", POOL_SIZE)),
+            max_overflow=int(profile.get("max_overflow", MAX_OVERFLOW)),
+            pool_timeout=int(profile.get("pool_timeout", POOL_TIMEOUT)),
+            pool_recycle=int(profile.get("pool_recycle", POOL_RECYCLE)),
+        )
+    return create_engine(url, **options)
+
+
+def _replica_profile(profile: dict) -> dict | None:
+    # "read_replica" is either the name of another profile or an inline one;
+    # pool settings not given there are inherited from the primary
+    replica = profile.get("read_replica")
+    if not replica:
+        return None
+    if isinstance(replica, str):
+        replica = load_config()[replica]
+    pool_keys = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle", "pool_pre_ping")
+    return {**{k: profile[k] for k in pool_keys if k in profile}, **replica}
+
+
+def _build_engines() -> dict:
+    # DATABASE_URL / DATABASE_READ_URL override the profile's connection (not its pool settings).
+    # With a plain URL in the environment config.json is not read at all
+    write_url = os.environ.get("DATABASE_URL")
+    read_url = os.environ.get("DATABASE_READ_URL")
+    profile = {} if write_url and read_url else db_profile()
+    primary = make_engine(write_url or profile_url(profile), profile)
+    replica_config = None if read_url else _replica_profile(profile)
+    if read_url or replica_config:
+        replica = make_engine(read_url or profile_url(replica_config), replica_config or profile)
+    else:
+        replica = primary
+    return {"write": primary, "read": replica}
+
+
+def _engine(role: str):
+    if not _engines:
+        with _engines_lock:
+            if not _engines:
+                _engines.update(_build_engines())
+    return _engines[role]
+
+
+def get_engine():
+    return _engine("write")
+
+
+def get_read_engine():
+    """Read replica engine when one is configured, else the primary."""
+    return _engine("read")
+
+
+def dispose_engines():
+    # Closes pooled connections; the engines stay usable and reconnect on demand
+    for engine in set(_engines.values()):
+        engine.dispose()
+
+
+def reset_engines():
+    """Dispose and forget the engines; the next session reads the environment again."""
+    with _engines_lock:
+        for engine in set(_engines.values()):
+            engine.dispose()
+        _engines.clear()
+
+
+class LazySessionmaker:
+    """sessionmaker whose engine is created on the first session, not on import."""
+
+    def __init__(self, engine_getter, **options):
+        self.engine_getter = engine_getter
+        self.options = options
+        self._factory = None
+
+    def __call__(self, **kwargs):
+        engine = self.engine_getter()
+        if self._factory is None or self._factory.kw["bind"] is not engine:
+            self._factory = sessionmaker(bind=engine, **self.options)
+        return self._factory(**kwargs)
+
+
+SessionLocal = LazySessionmaker(get_engine, autocommit=False, autoflush=False)
+# Read-only endpoints use ReadSessionLocal; without a replica it is the primary
+ReadSessionLocal = LazySessionmaker(get_read_engine, autocommit=False, autoflush=False)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+def __getattr__(name):
+    # Older call sites import the engines as module attributes
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,12 +1,38 @@
 # emailer.py
+import email
+import email.policy
+import heapq
+import itertools
+import logging
+import os
+import queue
 import smtplib, ssl
+import threading
+import time
+import uuid
+from collections import deque
 from email.message import EmailMessage
-from settings import settings
+from settings import get_settings
 
-def send_email(to_email: str, subject: str, html_body: str, text_body: str | None = None):
+logger = logging.getLogger(__name__)
+
+MAIL_RETRY_BASE_SECONDS = 2.0     # backoff doubles per attempt: 2, 4, 8...
+MAIL_RETRY_MAX_SECONDS = 60.0
+MAIL_IDLE_NOOP_SECONDS = 30.0     # check a connection that sat idle this long before reusing it
+MAIL_IDLE_CLOSE_SECONDS = 240.0   # servers drop idle sessions around 5 minutes; close first
+MAIL_LATENCY_SAMPLES = 1000       # latencies kept for the percentiles in stats()
+MAIL_SMTP_TIMEOUT = 30.0          # socket timeout, so a hung server cannot wedge a delivery thread
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+def build_message(to_email: str, subject: str, html_body: str, text_body: str | None = None) -> EmailMessage:
     if not to_email:
         raise ValueError("Recipient email required")
 
+    settings = get_settings()
     msg = EmailMessage()
     msg["Subject"] = subject
     msg["From"] = f"{settings.SMTP_FROM_NAME} <{settings.SMTP_FROM_EMAIL}>"
@@ -18,15 +44,291 @@ def send_email(to_email: str, subject: str, html_body: str, text_body: str | Non
         msg.add_alternative(html_body, subtype="html")
     else:
         msg.add_alternative(html_body, subtype="html")
+    return msg
+
 
+def open_smtp() -> smtplib.SMTP:
+    """Connected and authenticated SMTP session (no login when SMTP_USERNAME is empty)."""
+    settings = get_settings()
     if settings.SMTP_USE_SSL:
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, context=context) as server:
-            server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=MAIL_SMTP_TIMEOUT,
+                                  context=ssl.create_default_context())
     else:
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            if settings.SMTP_USE_TLS:
-                server.starttls(context=ssl.create_default_context())
-            server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=MAIL_SMTP_TIMEOUT)
+        if settings.SMTP_USE_TLS:
+            server.starttls(context=ssl.create_default_context())
+    if settings.SMTP_USERNAME:
+        server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+    return server
+
+
+def send_email(to_email: str, subject: str, html_body: str, text_body: str | None = None):
+    """One-off send on a fresh connection; request paths should use MailQueue.enqueue."""
+    msg = build_message(to_email, subject, html_body, text_body)
+    with open_smtp() as server:
+        server.send_message(msg)
+
+
+def _is_permanent(exc: Exception) -> bool:
+    # 5xx replies (bad recipient, rejected content) will not succeed on retry
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _PooledConnection:
+    """A long-lived SMTP session owned by one delivery thread."""
+
+    def __init__(self):
+        self.server = None
+        self.last_used = 0.0
+
+    def send(self, msg: EmailMessage):
+        now = time.monotonic()
+        if self.server is not None and now - self.last_used > MAIL_IDLE_CLOSE_SECONDS:
+            self.close()
+        elif self.server is not None and now - self.last_used > MAIL_IDLE_NOOP_SECONDS:
+            try:
+                if self.server.noop()[0] != 250:
+                    self.close()
+            except OSError:   # includes SMTPException
+                self.close()
+        if self.server is None:
+            self.server = open_smtp()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between messages: reconnect once before failing the attempt
+            self.close()
+            self.server = open_smtp()
+            self.server.send_message(msg)
+        except smtplib.SMTPException:
+            # Rejected by the server: leave the session usable for the next message
+            try:
+                self.server.rset()
+            except OSError:
+                self.close()
+            raise
+        except OSError:
+            self.close()
+            raise
+        finally:
+            self.last_used = time.monotonic()
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self.server.close()
+            except OSError:
+                pass
+        self.server = None
+
+
+class _Job:
+    __slots__ = ("msg", "enqueued_at", "attempts", "spool_path")
+
+    def __init__(self, msg: EmailMessage, spool_path: str | None = None):
+        self.msg = msg
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.spool_path = spool_path
+
+
+class MailQueue:
+    """Bounded outgoing mail queue drained by a small pool of persistent SMTP sessions.
+
+    Each delivery thread keeps one authenticated connection open between
+    messages. Transient failures are retried with exponential backoff;
+    whatever is still queued at stop() is written to spool_dir and picked
+    up again by the next start().
+    """
+
+    def __init__(self, pool_size: int = 2, max_queue: int = 1000, max_attempts: int = 4, spool_dir: str = ""):
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.spool_dir = spool_dir
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._delayed = []   # heap of (due, seq, job) waiting for a retry
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._latencies = deque(maxlen=MAIL_LATENCY_SAMPLES)
+        self._counters = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "rejected": 0}
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for job in self._load_spool():
+            self._queue.put_nowait(job)
+        for i in range(self.pool_size):
+            thread = threading.Thread(target=self._run, name=f"mail-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Let the workers drain the queue for up to timeout seconds, then spool the rest."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self._threads and (self._queue.unfinished_tasks or self._delayed):
+            time.sleep(0.05)
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()) + 1.0)
+        self._threads = []
+        self._spool_remaining()
+
+    def enqueue(self, to_email: str, subject: str, html_body: str, text_body: str | None = None):
+        """Queue a message for delivery; raises MailQueueFull instead of blocking the request."""
+        job = _Job(build_message(to_email, subject, html_body, text_body))
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise MailQueueFull("Mail queue is full")
+        self._count("enqueued")
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats["queued"] = self._queue.qsize()
+            stats["waiting_retry"] = len(self._delayed)
+        for label, pct in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            stats[f"latency_{label}_ms"] = (
+                round(latencies[min(len(latencies) - 1, int(len(latencies) * pct))] * 1000, 1) if latencies else None
+            )
+        return stats
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _next_job(self):
+        with self._lock:
+            if self._delayed and self._delayed[0][0] <= time.monotonic():
+                return heapq.heappop(self._delayed)[2]
+            wait = min(0.5, self._delayed[0][0] - time.monotonic()) if self._delayed else 0.5
+        try:
+            return self._queue.get(timeout=max(0.01, wait))
+        except queue.Empty:
+            return None
+
+    def _run(self):
+        connection = _PooledConnection()
+        try:
+            while not self._stop.is_set():
+                job = self._next_job()
+                if job is None:
+                    if connection.server and time.monotonic() - connection.last_used > MAIL_IDLE_CLOSE_SECONDS:
+                        connection.close()
+                    continue
+                self._deliver(connection, job)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: _PooledConnection, job: _Job):
+        job.attempts += 1
+        try:
+            connection.send(job.msg)
+        except Exception as exc:
+            if _is_permanent(exc) or job.attempts >= self.max_attempts:
+                logger.error("Mail to %s failed after %d attempts: %s", job.msg["To"], job.attempts, exc)
+                self._count("failed")
+                self._finish(job)
+            else:
+                delay = min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+                logger.warning("Mail to %s failed (%s), retrying in %.0fs", job.msg["To"], exc, delay)
+                with self._lock:
+                    self._counters["retried"] += 1
+                    heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), job))
+                self._task_done(job)
+            return
+        with self._lock:
+            self._counters["sent"] += 1
+            self._latencies.append(time.monotonic() - job.enqueued_at)
+        self._finish(job)
+
+    def _task_done(self, job: _Job):
+        # Retries come off the heap, not the queue: only first attempts were get()
+        if job.attempts == 1:
+            self._queue.task_done()
+
+    def _finish(self, job: _Job):
+        self._task_done(job)
+        if job.spool_path:
+            try:
+                os.remove(job.spool_path)
+            except FileNotFoundError:
+                pass
+
+    # ------------------ Spool ------------------
+
+    def _spool_remaining(self):
+        jobs = []
+        while True:
+            try:
+                jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            jobs.extend(job for _, _, job in self._delayed)
+            self._delayed = []
+        if not jobs:
+            return
+        if not self.spool_dir:
+            logger.error("Dropping %d undelivered mails: SMTP_SPOOL_DIR is not set", len(jobs))
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for job in jobs:
+            if job.spool_path:
+                # Still on disk from the previous run: release the claim
+                os.replace(job.spool_path, job.spool_path.rsplit(".", 1)[0])
+                continue
+            path = os.path.join(self.spool_dir, f"{time.time():.6f}-{uuid.uuid4().hex}.eml")
+            with open(path + ".tmp", "wb") as fh:
+                fh.write(job.msg.as_bytes())
+            os.replace(path + ".tmp", path)
+        logger.info("Spooled %d undelivered mails to %s", len(jobs), self.spool_dir)
+
+    def _load_spool(self):
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return []
+        jobs = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if len(jobs) >= self._queue.maxsize:
+                break
+            stem, _, owner = name.rpartition(".eml.")
+            if stem and owner.isdigit() and not _pid_alive(int(owner)):
+                name = stem + ".eml"   # claimed by a process that died mid-send
+                os.replace(os.path.join(self.spool_dir, f"{stem}.eml.{owner}"), os.path.join(self.spool_dir, name))
+            if not name.endswith(".eml"):
+                continue
+            # Claim by rename so several workers sharing the spool do not send twice
+            path = os.path.join(self.spool_dir, name)
+            claimed = f"{path}.{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed, "rb") as fh:
+                msg = email.message_from_binary_file(fh, policy=email.policy.default)
+            jobs.append(_Job(msg, spool_path=claimed))
+        return jobs
+
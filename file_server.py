@@ -0,0 +1,291 @@
+# file_server.py
+import mimetypes
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+from http_cache import etag_matches
+
+CHUNK_SIZE = 256 * 1024   # read size when the server cannot do zero-copy sends
+MAX_RANGES = 16           # more parts than this is treated as abuse and served as a full 200
+
+EXPOSED_HEADERS = "Content-Length, Content-Range, Accept-Ranges, ETag, Last-Modified"
+
+
+def resolve_panel_file(base_dir: str, panel_name: str, file_name: str) -> str:
+    """Join panel/file onto base_dir, refusing names that could escape the panel tree."""
+    for part in (panel_name, file_name):
+        if part in ("", ".", "..") or "/" in part or "\\" in part or "\0" in part:
+            raise HTTPException(status_code=404, detail="File not found")
+    return os.path.join(base_dir, panel_name, file_name)
+
+
+def guess_media_type(file_name: str) -> str:
+    return mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+
+def content_disposition(file_name: str, disposition: str = "inline") -> str:
+    try:
+        file_name.encode("latin-1")
+        return f'{disposition}; filename="{file_name}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(file_name)}"
+
+
+def parse_range_header(range_header: str | None, size: int):
+    """Parse a bytes Range header into sorted, merged (start, end) inclusive pairs.
+
+    Returns None when the header should be ignored (absent, malformed, not
+    bytes, too many parts) and [] when no range is satisfiable.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start_s, sep, end_s = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if start_s == "":
+                # suffix range: last N bytes
+                length = int(end_s)
+                if length <= 0:
+                    continue
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(start_s)
+                end = int(end_s) if end_s else size - 1
+                if end_s and end < start:
+                    return None
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_allows(request: Request, etag: str, last_modified: str) -> bool:
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range needs a strong comparison
+        return not if_range.startswith("W/") and if_range == etag
+    return if_range == last_modified
+
+
+class FileRangeResponse(Response):
+    """Sends (parts of) a file without buffering it in Python when possible.
+
+    Uses the ASGI zerocopysend extension (sendfile) when the server offers it,
+    pathsend for whole-file bodies, and otherwise pread()s fixed chunks in a
+    worker thread. The file descriptor is always closed, including when the
+    client disconnects half way.
+    """
+
+    def __init__(self, path: str, size: int, ranges, media_type: str, headers: dict, status_code: int = 200):
+        self.path = path
+        self.size = size
+        self.ranges = ranges
+        self.media_type = media_type
+        self.status_code = status_code
+        self.background = None
+        self.boundary = None
+        self.parts = []
+
+        if status_code == 206 and len(ranges) > 1:
+            self.boundary = secrets.token_hex(16)
+            content_length = 0
+            for start, end in ranges:
+                part_header = (
+                    f"--{self.boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((part_header, start, end))
+                content_length += len(part_header) + (end - start + 1) + 2
+            self.trailer = f"--{self.boundary}--\r\n".encode("latin-1")
+            content_length += len(self.trailer)
+            headers["Content-Type"] = f"multipart/byteranges; boundary={self.boundary}"
+        elif status_code == 206:
+            start, end = ranges[0]
+            self.parts.append((b"", start, end))
+            content_length = end - start + 1
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Type"] = media_type
+        else:
+            self.parts.append((b"", 0, size - 1))
+            content_length = size
+            headers["Content-Type"] = media_type
+
+        headers["Content-Length"] = str(content_length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        extensions = scope.get("extensions") or {}
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if self.boundary is None and self.status_code == 200 and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        async with anyio.create_task_group() as task_group:
+            async def send_and_cancel():
+                await self._send_body(send, extensions)
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(send_and_cancel)
+            await self._wait_for_disconnect(receive)
+            task_group.cancel_scope.cancel()
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def _send_body(self, send, extensions):
+        zero_copy = "http.response.zerocopysend" in extensions
+        fh = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            for part_header, start, end in self.parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                if zero_copy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": fh,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": True,
+                    })
+                else:
+                    offset = start
+                    while offset <= end:
+                        length = min(CHUNK_SIZE, end - offset + 1)
+                        chunk = await anyio.to_thread.run_sync(os.pread, fh.fileno(), length, offset)
+                        if not chunk:
+                            break
+                        offset += len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+            if self.boundary:
+                await send({"type": "http.response.body", "body": self.trailer, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            fh.close()
+
+
+def offload_response(mode: str, file_path: str, panel_name: str, file_name: str,
+                     prefix: str = "", disposition: str = "inline") -> Response:
+    """Empty response telling the reverse proxy to send the file itself.
+
+    x-accel-redirect points nginx at an internal location (prefix) that maps
+    onto the panel directory; x-sendfile gives Apache/lighttpd the real path.
+    """
+    headers = {
+        "Content-Type": guess_media_type(file_name),
+        "Content-Disposition": content_disposition(file_name, disposition),
+        "Access-Control-Expose-Headers": EXPOSED_HEADERS,
+    }
+    if mode == "x-accel-redirect":
+        headers["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{quote(panel_name)}/{quote(file_name)}"
+    elif mode == "x-sendfile":
+        # Header values go out as latin-1: send the path's raw (UTF-8) bytes, which is what the proxy opens
+        headers["X-Sendfile"] = os.fsencode(os.path.abspath(file_path)).decode("latin-1")
+    else:
+        raise ValueError(f"Unknown file offload mode: {mode}")
+    return Response(status_code=200, headers=headers)
+
+
+def serve_file(request: Request, file_path: str, file_name: str, indexed=None,
+               disposition: str = "inline") -> Response:
+    """Build the response for a file download, honouring Range and conditional headers.
+
+    indexed is the (file_size, file_mtime, content_hash) row from file_meta;
+    while it still matches the file on disk its SHA-256 becomes the ETag, so
+    identical documents share a validator across panels.
+    """
+    try:
+        st = os.stat(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    size = st.st_size
+    if indexed and indexed[2] and indexed[0] == st.st_size and indexed[1] == st.st_mtime:
+        etag = f'"{indexed[2]}"'
+    else:
+        etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    media_type = guess_media_type(file_name)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(file_name, disposition),
+        "Access-Control-Expose-Headers": EXPOSED_HEADERS,
+    }
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    ranges = None
+    if size and _if_range_allows(request, etag, last_modified):
+        ranges = parse_range_header(request.headers.get("range"), size)
+        if ranges == []:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+
+    if ranges:
+        return FileRangeResponse(file_path, size, ranges, media_type, headers, status_code=206)
+    if size == 0:
+        return Response(content=b"", media_type=media_type, headers=headers)
+    return FileRangeResponse(file_path, size, None, media_type, headers)
@@ -1,29 +1,91 @@
 import hmac
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import Request, Response
+from fastapi import Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, LargeBinary, DateTime, text
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, LargeBinary, DateTime, text, func
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base, Session
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
 import uvicorn
-from database import SessionLocal, Base, engine
-from pydantic import BaseModel
+from database import ReadSessionLocal, SessionLocal, Base, dispose_engines, get_engine
+from pydantic import BaseModel, Field
 from fastapi.security import OAuth2PasswordRequestForm
 from models import OtpChallenge, PanelMaster, PortalUser, FileMeta, User, UserAssignment, UserScanLog
 from auth import verify_token, verify_password, create_access_token, get_password_hash, get_assignment_id_from_token
+from auth import REVOCATION_REFRESH_SECONDS, AuthContext, decode_token, get_auth_context, refresh_revocations, revoke_token
+from auth import verify_signed_url
+from jose import JWTError
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
 import secrets
 import string
-import qrcode
 import base64
 import os
 import hashlib
-from emailer import send_email
+import time
+import json
+from emailer import MailQueue, MailQueueFull
+from otp_store import (
+    CONSUMED, COOLDOWN, EXPIRED, INVALID, NOT_FOUND, RESENT, TOO_MANY_ATTEMPTS, VERIFIED,
+    make_challenge_store, new_challenge,
+)
 from otp_email import otp_email_html, otp_email_text
-
-app = FastAPI()
+from panel_sync import PanelSyncService
+from scan_log import ScanLogBuffer
+from migrations import migrate
+from scheduler import PeriodicJob
+from dashboard_metrics import METRICS_REFRESH_SECONDS, DashboardMetrics
+from scan_rollup import MAX_BUCKETS, ROLLUP_REFRESH_SECONDS, ScanRollup, scan_series
+from retention import RETENTION_INTERVAL_SECONDS, RetentionJob
+from catalog import PanelCatalog
+from http_cache import etag_matches
+from file_server import offload_response, resolve_panel_file, serve_file
+from settings import get_settings
+from qr_images import QrImageCache, qr_etag
+from qr_render import PNG_PROFILE, SVG_PROFILE, QrProfile
+from user_import import ImportJobRegistry, ImportValidationError, parse_rows, run_import, validate_rows
+from user_listing import USER_PAGE_MAX, USER_PAGE_SIZE, STREAM_BATCH_SIZE, assignment_rows, group_by_user, page_user_ids
+from password_hasher import PasswordHasher, PasswordPoolBusy
+from secret_filter import SECRET_FILTER_REFRESH_SECONDS, SecretCodeFilter
+from rate_limit import (
+    OTP_RESEND_PER_SESSION, OTP_VERIFY_PER_IP, OTP_VERIFY_PER_SESSION, QR_INITIATE_PER_IP, QR_INITIATE_PER_SECRET,
+    SECRET_CHECK_PER_IP, SECRET_CHECK_PER_SECRET, RateLimiter, client_ip, enforce, make_rate_limiter,
+)
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    _configure_services(settings)
+    if settings.DB_MIGRATE_ON_STARTUP:
+        migrate(get_engine())
+    panel_sync_service.start()
+    mail_queue.start()
+    scan_log_buffer.start()
+    dashboard_metrics_job.start()
+    scan_rollup_job.start()
+    revocation_job.start()
+    secret_filter_job.start()
+    retention_periodic_job.start()
+    try:
+        yield
+    finally:
+        dashboard_metrics_job.stop()
+        scan_rollup_job.stop()
+        revocation_job.stop()
+        secret_filter_job.stop()
+        retention_periodic_job.stop()
+        panel_sync_service.stop()
+        mail_queue.stop()
+        scan_log_buffer.stop()
+        qr_image_cache.renderer.shutdown()
+        password_hasher.shutdown()
+        dispose_engines()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add this CORS configuration
 origins = [
@@ -37,6 +99,68 @@ PANEL_BASE_DIR = "/home/qrhertz/panels"
 WEBAPP_URL = "https://qr.hertzelectricals.in/#/"
 OTP_TTL_SECONDS = 180  # 3 minutes
 OTP_MAX_ATTEMPTS = 5
+OTP_CLIENT_COOKIE = "qr_client"
+OTP_CLIENT_COOKIE_MAX_AGE = 30 * 24 * 3600
+OTP_FAILURES = {
+    NOT_FOUND: (400, "Session not found"),
+    CONSUMED: (400, "Session already used"),
+    EXPIRED: (400, "OTP expired"),
+    TOO_MANY_ATTEMPTS: (429, "Too many attempts"),
+    INVALID: (401, "Invalid OTP"),
+}
+
+# Keeps panel_master/file_meta reconciled with PANEL_BASE_DIR in the background,
+# so list endpoints only read the tables
+panel_sync_service = PanelSyncService(PANEL_BASE_DIR, SessionLocal)
+panel_catalog = PanelCatalog(ReadSessionLocal)
+import_jobs = ImportJobRegistry()
+# Scan events are batched into multi-row inserts off the request path
+scan_log_buffer = ScanLogBuffer(SessionLocal)
+dashboard_metrics = DashboardMetrics(SessionLocal, read_session_factory=ReadSessionLocal)
+dashboard_metrics_job = PeriodicJob("dashboard-metrics", METRICS_REFRESH_SECONDS, dashboard_metrics.refresh)
+scan_rollup = ScanRollup(SessionLocal)
+scan_rollup_job = PeriodicJob("scan-rollup", ROLLUP_REFRESH_SECONDS, scan_rollup.refresh)
+# Known secret codes, so garbage and replayed codes are turned away before any SQL
+secret_filter = SecretCodeFilter(SessionLocal)
+secret_filter_job = PeriodicJob("secret-filter", SECRET_FILTER_REFRESH_SECONDS, secret_filter.refresh)
+# Logouts made on other workers reach this one's in-memory revocation list
+revocation_job = PeriodicJob(
+    "token-revocations", REVOCATION_REFRESH_SECONDS, lambda: refresh_revocations(SessionLocal)
+)
+# Built from settings by the lifespan (_configure_services), so importing this
+# module needs neither configuration nor a database
+qr_image_cache: QrImageCache | None = None
+password_hasher: PasswordHasher | None = None
+rate_limiter: RateLimiter | None = None
+otp_store = None
+retention_job: RetentionJob | None = None
+retention_periodic_job: PeriodicJob | None = None
+mail_queue: MailQueue | None = None
+
+
+def _configure_services(settings):
+    global qr_image_cache, password_hasher, rate_limiter, otp_store, retention_job, retention_periodic_job, mail_queue
+    qr_image_cache = QrImageCache(settings.QR_CACHE_DIR)
+    password_hasher = PasswordHasher(
+        settings.PASSWORD_POOL_SIZE, settings.PASSWORD_MAX_PENDING, settings.PASSWORD_BCRYPT_ROUNDS
+    )
+    otp_store = make_challenge_store(settings.OTP_STORE, settings.OTP_REDIS_URL)
+    rate_limiter = make_rate_limiter(settings.RATE_LIMIT_BACKEND, settings.RATE_LIMIT_REDIS_URL)
+    retention_job = RetentionJob(
+        SessionLocal, settings.RETENTION_OTP_DAYS, settings.RETENTION_SCAN_LOG_DAYS, settings.RETENTION_ARCHIVE_DIR
+    )
+    retention_periodic_job = PeriodicJob("retention", RETENTION_INTERVAL_SECONDS, retention_job.run, run_at_start=False)
+    # OTP mails go out through persistent SMTP sessions instead of a login per message
+    mail_queue = MailQueue(
+        pool_size=settings.SMTP_POOL_SIZE,
+        max_queue=settings.SMTP_QUEUE_SIZE,
+        max_attempts=settings.SMTP_MAX_ATTEMPTS,
+        spool_dir=settings.SMTP_SPOOL_DIR,
+    )
+
+panel_sync_service.add_listener(panel_catalog.invalidate)
+panel_sync_service.add_listener(dashboard_metrics.note_sync)
+panel_sync_service.add_listener(lambda report: dashboard_metrics_job.trigger())
 
 app.add_middleware(
     CORSMiddleware,
@@ -60,6 +184,8 @@ class TokenResponse(BaseModel):
 class FileInfo(BaseModel):
     file_meta_id: int
     file_name: str
+    file_size: int | None = None
+    mime_type: str | None = None
 
 class FilesDetail(BaseModel):
     user_assignment_id: int
@@ -145,7 +271,7 @@ class PanelUpdate(BaseModel):
 class ScanLogRequest(BaseModel):
     user_assignment_id: int
     secret_code: str
-    verification_status: str
+    verification_status: str = Field(max_length=100)  # user_scan_log.verification_status is String(100)
 
 class QrInitiateRequest(BaseModel):
     encoded_secret: str  # you already have this in the QR
@@ -159,6 +285,9 @@ class VerifyOtpRequest(BaseModel):
     session_id: str
     otp: str
 
+class ResendOtpRequest(BaseModel):
+    session_id: str
+
 class VerifyOtpResponse(BaseModel):
     access_token: str
 
@@ -168,14 +297,10 @@ def generate_secret_code(length: int = 8) -> str:
     alphabet = string.ascii_letters + string.digits
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
-def generate_qr_code_bytes(url: str) -> bytes:
-    qr = qrcode.QRCode(version=1, box_size=10, border=4)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    byte_stream = BytesIO()
-    img.save(byte_stream, format='PNG')
-    return byte_stream.getvalue()
+def secret_code_url(secret_code: str) -> str:
+    # URL encoded in the QR sticker for an assignment
+    encoded_str = base64.b64encode(secret_code.encode('utf-8')).decode('utf-8')
+    return f"{WEBAPP_URL}verify-secret-code/{encoded_str}"
     
 # ------------------ DEPENDENCY ------------------
 
@@ -186,11 +311,34 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    # Read replica when one is configured (may lag the primary slightly), else the primary
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # ------------------ Helpers ------------------
+def _client_ip(request: Request) -> str:
+    return client_ip(request, get_settings().RATE_LIMIT_TRUST_FORWARDED)
+
 def _hash_otp(otp: str) -> str:
     # Fast hash is fine here; you can use HMAC with a server secret if you prefer
     return hashlib.sha256(otp.encode("utf-8")).hexdigest()
 
+def _otp_client_key(request: Request, response: Response) -> str:
+    # Identifies the browser scanning, from a cookie set on its first scan; the
+    # cookie itself never reaches the challenge store, only its hash
+    token = request.cookies.get(OTP_CLIENT_COOKIE)
+    if not token or len(token) > 64:
+        token = secrets.token_urlsafe(24)
+        response.set_cookie(
+            OTP_CLIENT_COOKIE, token, max_age=OTP_CLIENT_COOKIE_MAX_AGE, httponly=True,
+            secure=get_settings().OTP_CLIENT_COOKIE_SECURE, samesite="lax",
+        )
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
 def _generate_otp() -> str:
     # 6-digit numeric OTP, no leading zero bias
     return f"{secrets.randbelow(900000) + 100000}"
@@ -200,191 +348,164 @@ def _mask_email(email: str) -> str:
     name, dom = email.split("@", 1)
     return (name[:1] + "***@" + dom)
 
-# ------------------ Functions ------------------
-def sync_panels_and_files(db: Session):
-    # Step 1: Read current panel folders from disk
-    actual_panels = {
-        panel_name: os.path.join(PANEL_BASE_DIR, panel_name)
-        for panel_name in os.listdir(PANEL_BASE_DIR)
-        if os.path.isdir(os.path.join(PANEL_BASE_DIR, panel_name))
-    }
-
-    # Step 2: Fetch all existing panels from DB
-    db_panels = db.query(PanelMaster).all()
-    db_panel_map = {p.panel_name: p for p in db_panels}
-
-    actual_panel_names = set(actual_panels.keys())
-    db_panel_names = set(db_panel_map.keys())
-
-    # Step 3: Mark deleted panels (present in DB but not on disk)
-    panels_to_delete = db_panel_names - actual_panel_names
-    for pname in panels_to_delete:
-        db_panel_map[pname].is_deleted = True
-
-    # Step 4: Add new panels and files
-    for panel_name, panel_path in actual_panels.items():
-        if panel_name not in db_panel_map:
-            # New Panel
-            new_panel = PanelMaster(panel_name=panel_name, description="", is_deleted=False)
-            db.add(new_panel)
-            db.commit()
-            db.refresh(new_panel)
-            db_panel_map[panel_name] = new_panel
-        else:
-            # Reactivate if it was previously marked deleted
-            if db_panel_map[panel_name].is_deleted:
-                db_panel_map[panel_name].is_deleted = False
-
-        panel_id = db_panel_map[panel_name].panel_id
-
-        # Fetch file records for this panel
-        existing_files = db.query(FileMeta).filter(FileMeta.panel_id == panel_id).all()
-        existing_file_names = {f.file_name: f for f in existing_files}
-
-        # Files from disk
-        actual_file_names = set()
-        for fname in os.listdir(panel_path):
-            file_path = os.path.join(panel_path, fname)
-            if os.path.isfile(file_path):
-                actual_file_names.add(fname)
-                if fname not in existing_file_names:
-                    # New file
-                    new_file = FileMeta(panel_id=panel_id, file_name=fname, is_deleted=False)
-                    db.add(new_file)
-                else:
-                    # Reactivate if deleted
-                    file = existing_file_names[fname]
-                    if file.is_deleted:
-                        file.is_deleted = False
-
-        # Mark missing files as deleted
-        db_file_names = set(existing_file_names.keys())
-        deleted_files = db_file_names - actual_file_names
-        for missing_fname in deleted_files:
-            existing_file_names[missing_fname].is_deleted = True
-
-    db.commit()
+def _send_otp_email(email_id: str, user_name: str, otp: str):
+    subject = "Your OTP for Panel Portal"
+    html_body = otp_email_html(otp, user_name=user_name)
+    text_body = otp_email_text(otp, user_name=user_name)
+    try:
+        mail_queue.enqueue(email_id, subject, html_body, text_body)
+    except MailQueueFull:
+        raise HTTPException(status_code=503, detail="Too many pending emails, please retry shortly",
+                            headers={"Retry-After": "5"})
 
 #------------------- APIs -------------------------
 
 @app.post("/qr/verify-otp", response_model=VerifyOtpResponse)
-def qr_verify_otp(payload: VerifyOtpRequest, db: Session = Depends(get_db)):
-    # unwrap session
-    try:
-        otp_id = int(base64.urlsafe_b64decode(payload.session_id.encode()).decode())
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid session")
-
-    challenge = db.query(OtpChallenge).filter(OtpChallenge.otp_id == otp_id).first()
-    if not challenge:
-        raise HTTPException(status_code=400, detail="Session not found")
-
-    # basic checks
-    if challenge.consumed:
-        raise HTTPException(status_code=400, detail="Session already used")
-    if datetime.utcnow() > challenge.expires_at:
-        raise HTTPException(status_code=400, detail="OTP expired")
-    if challenge.attempts >= challenge.max_attempts:
-        raise HTTPException(status_code=429, detail="Too many attempts")
-
-    # verify
-    challenge.attempts += 1
-    if not hmac.compare_digest(challenge.otp_hash, _hash_otp(payload.otp)):
-        db.commit()
-        raise HTTPException(status_code=401, detail="Invalid OTP")
-
-    # success: consume challenge, issue access token
-    challenge.consumed = True
-    db.commit()
-
-    assignment = db.query(UserAssignment).filter(
-        UserAssignment.user_assignment_id == challenge.user_assignment_id
-    ).first()
-    if not assignment:
-        raise HTTPException(status_code=500, detail="Assignment missing")
-
-    user = db.query(User).filter(User.user_id == assignment.user_id).first()
+def qr_verify_otp(payload: VerifyOtpRequest, request: Request, db: Session = Depends(get_db)):
+    enforce(rate_limiter, (OTP_VERIFY_PER_IP, _client_ip(request)), (OTP_VERIFY_PER_SESSION, payload.session_id))
+    outcome, challenge = otp_store.verify(db, payload.session_id, _hash_otp(payload.otp))
+    if outcome != VERIFIED:
+        db.commit()  # keep the counted attempt
+        status_code, detail = OTP_FAILURES[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
 
     # your existing token pattern
     token = create_access_token(
-        data={"sub": user.name, "user_id": user.user_id, "assignment": assignment.user_assignment_id}
+        data={"sub": challenge.user_name, "user_id": challenge.user_id, "assignment": challenge.user_assignment_id}
     )
 
-    # log successful verification
-    db.add(UserScanLog(
-        user_assignment_id=assignment.user_assignment_id,
-        scan_datetime=datetime.utcnow(),    # <-- fix: call the function
-        verification_status="otp_verified"
-    ))
     db.commit()
+    scan_log_buffer.record(challenge.user_assignment_id, "otp_verified")
 
     return VerifyOtpResponse(access_token=token)
 
 @app.post("/qr/initiate", response_model=QrInitiateResponse)
 def qr_initiate(
     payload: QrInitiateRequest,
-    background: BackgroundTasks,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
+    # Before any DB work or mail: a scripted client must not exhaust either
+    enforce(rate_limiter, (QR_INITIATE_PER_IP, _client_ip(request)), (QR_INITIATE_PER_SECRET, payload.encoded_secret))
     # Decode secret from QR
     try:
         secret_code = base64.b64decode(payload.encoded_secret).decode("utf-8")
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid secret")
+    if not secret_filter.might_exist(secret_code):
+        raise HTTPException(status_code=403, detail="Invalid secret")
 
-    # Find assignment
-    assignment = db.query(UserAssignment).filter_by(secret_code=secret_code).first()
+    # Find assignment and its user in one query
+    assignment = (
+        db.query(UserAssignment.user_assignment_id, User.user_id, User.name, User.email_id)
+        .join(User, User.user_id == UserAssignment.user_id)
+        .filter(UserAssignment.secret_code == secret_code)
+        .first()
+    )
     if not assignment:
         raise HTTPException(status_code=403, detail="Invalid secret")
+    if not assignment.email_id:
+        raise HTTPException(status_code=400, detail="User email not available")
 
-    # Log initiation
-    db.add(UserScanLog(
-        user_assignment_id=assignment.user_assignment_id,
-        scan_datetime=datetime.utcnow(),
-        verification_status="qr_initiated"
-    ))
-    db.commit()
-
-    # Create OTP challenge
-    otp = _generate_otp()
-    challenge = OtpChallenge(
-        user_assignment_id=assignment.user_assignment_id,
-        otp_hash=_hash_otp(otp),
-        expires_at=datetime.utcnow() + timedelta(seconds=OTP_TTL_SECONDS),
-        attempts=0,
-        max_attempts=OTP_MAX_ATTEMPTS,
-        consumed=False,
-        created_at=datetime.utcnow(),
+    scan_log_buffer.record(assignment.user_assignment_id, "qr_initiated")
+    # A repeated scan of the same sticker from the same browser reuses its pending
+    # challenge: the OTP already mailed still works. Anyone else scanning it gets a
+    # challenge of their own, so they can never spend this one's attempts or resends
+    client_key = _otp_client_key(request, response)
+    session_id = otp_store.find_live(
+        db, assignment.user_assignment_id, client_key, get_settings().OTP_COALESCE_SECONDS
     )
-    db.add(challenge)
+    otp = None
+    if session_id is None:
+        otp = _generate_otp()
+        session_id = otp_store.create(db, new_challenge(
+            assignment.user_assignment_id, assignment.user_id, assignment.name, assignment.email_id,
+            _hash_otp(otp), OTP_TTL_SECONDS, OTP_MAX_ATTEMPTS, client_key,
+        ))
     db.commit()
-    db.refresh(challenge)
-
-    # Prepare async email
-    user = db.query(User).filter(User.user_id == assignment.user_id).first()
-    if not user or not user.email_id:
-        raise HTTPException(status_code=400, detail="User email not available")
-
-    subject = "Your OTP for Panel Portal"
-    html_body = otp_email_html(otp, user_name=getattr(user, "name", None))
-    text_body = otp_email_text(otp, user_name=getattr(user, "name", None))
 
-    background.add_task(send_email, user.email_id, subject, html_body, text_body)
+    if otp is not None:
+        _send_otp_email(assignment.email_id, assignment.name, otp)
 
     # Return session
-    session_id = base64.urlsafe_b64encode(str(challenge.otp_id).encode()).decode()
     return QrInitiateResponse(
         session_id=session_id,
         delivery_channel="email",
-        masked_destination=_mask_email(user.email_id),
+        masked_destination=_mask_email(assignment.email_id),
+    )
+
+@app.post("/qr/resend-otp", response_model=QrInitiateResponse)
+def qr_resend_otp(payload: ResendOtpRequest, request: Request, db: Session = Depends(get_db)):
+    enforce(rate_limiter, (QR_INITIATE_PER_IP, _client_ip(request)), (OTP_RESEND_PER_SESSION, payload.session_id))
+    # New OTP for the same session; the previous one stops working
+    otp = _generate_otp()
+    cooldown = get_settings().OTP_RESEND_COOLDOWN_SECONDS
+    outcome, challenge = otp_store.resend(
+        db, payload.session_id, _hash_otp(otp), OTP_TTL_SECONDS, cooldown
+    )
+    db.commit()
+    if outcome == COOLDOWN:
+        retry_after = max(1, int(challenge.last_sent_at + cooldown - time.time()) + 1)
+        raise HTTPException(status_code=429, detail="Please wait before requesting another OTP",
+                            headers={"Retry-After": f"{retry_after}"})
+    if outcome != RESENT:
+        status_code, detail = OTP_FAILURES[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    _send_otp_email(challenge.email_id, challenge.user_name, otp)
+    return QrInitiateResponse(
+        session_id=payload.session_id,
+        delivery_channel="email",
+        masked_destination=_mask_email(challenge.email_id),
+    )
+
+def _qr_image_response(user_assignment_id: int, profile: QrProfile, request: Request, db: Session) -> Response:
+    secret_code = (
+        db.query(UserAssignment.secret_code)
+        .filter(UserAssignment.user_assignment_id == user_assignment_id)
+        .scalar()
     )
+    if not secret_code:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+
+    # An assignment's secret never changes, so the image can be cached for good
+    url = secret_code_url(secret_code)
+    headers = {"ETag": qr_etag(url, profile), "Cache-Control": "private, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=qr_image_cache.get(url, profile), media_type=profile.media_type, headers=headers)
+
+def _authorize_qr_image(path: str, expires: int | None, sig: str | None, authorization: str | None):
+    # <img> tags cannot send a bearer header, so /user-details hands out signed,
+    # expiring URLs; API clients may still authenticate with the header
+    if verify_signed_url(path, expires, sig):
+        return
+    if authorization is None:
+        raise HTTPException(status_code=401, detail="Missing or expired link signature")
+    get_auth_context(authorization)
+
+@app.get("/qr/{user_assignment_id}.png")
+def get_qr_png(user_assignment_id: int, request: Request, expires: int | None = None, sig: str | None = None,
+               authorization: str | None = Header(None), db: Session = Depends(get_db)):
+    _authorize_qr_image(f"/qr/{user_assignment_id}.png", expires, sig, authorization)
+    return _qr_image_response(user_assignment_id, PNG_PROFILE, request, db)
+
+@app.get("/qr/{user_assignment_id}.svg")
+def get_qr_svg(user_assignment_id: int, request: Request, expires: int | None = None, sig: str | None = None,
+               authorization: str | None = Header(None), db: Session = Depends(get_db)):
+    _authorize_qr_image(f"/qr/{user_assignment_id}.svg", expires, sig, authorization)
+    return _qr_image_response(user_assignment_id, SVG_PROFILE, request, db)
 
 #### Panel APIs
 
 @app.get("/sync-panels-manually")
-def manual_sync(db: Session = Depends(get_db), str = Depends(verify_token)):
-    sync_panels_and_files(db)
-    return {"message": "Panels and files synced successfully"}
+def manual_sync(str = Depends(verify_token)):
+    report = panel_sync_service.sync_now(full=True)
+    return {
+        "message": "Panels and files synced successfully",
+        "report": report.as_dict() if report else None,
+    }
 
 # @app.get("/panels")
 # def get_panels_from_folders(str = Depends(verify_token)):
@@ -415,61 +536,114 @@ def manual_sync(db: Session = Depends(get_db), str = Depends(verify_token)):
 ## str = Depends(verify_token)
 
 @app.get("/panels")
-def get_panels(db: Session = Depends(get_db), str = Depends(verify_token)):
-    panels = []
-    sync_panels_and_files(db)
-
-    # Fetch all active (non-deleted) panels
-    db_panels = db.query(PanelMaster).filter(PanelMaster.is_deleted == False).all()
-
-    for panel in db_panels:
-        # Fetch non-deleted files for this panel
-        file_records = db.query(FileMeta).filter(
-            FileMeta.panel_id == panel.panel_id,
-            FileMeta.is_deleted == False
-        ).all()
+def get_panels(request: Request, str = Depends(verify_token)):
+    snapshot = panel_catalog.snapshot()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
-        # Build file list with id and name
-        file_list = [
-            {
-                "file_meta_id": f.file_meta_id,
-                "file_name": f.file_name
-            }
-            for f in file_records
-        ]
 
-        panels.append({
-            "panel_id": panel.panel_id,
-            "panel_name": panel.panel_name,
-            "file_count": len(file_records),
-            "files": file_list
-        })
-
-    return panels
 
 
+#### Authentication APIs
 
+# Short sessions of their own: a login must not hold a pooled connection
+# while it waits for bcrypt
+def _load_portal_user(portal_user_name: str):
+    db = SessionLocal()
+    try:
+        return (
+            db.query(PortalUser.portal_user_id, PortalUser.portal_user_name, PortalUser.password)
+            .filter(PortalUser.portal_user_name == portal_user_name)
+            .first()
+        )
+    finally:
+        db.close()
 
-#### Authentication APIs
+def _store_password_hash(portal_user_id: int, password_hash: str):
+    db = SessionLocal()
+    try:
+        db.query(PortalUser).filter(PortalUser.portal_user_id == portal_user_id).update({"password": password_hash})
+        db.commit()
+    finally:
+        db.close()
 
 @app.post("/login", response_model=TokenResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
-    
-    user = db.query(PortalUser).filter(PortalUser.portal_user_name == request.portal_user_name).first()
-    if not user or not verify_password(request.password, user.password):
+async def login(request: LoginRequest):
+    # async so a login waiting on the bcrypt pool holds no request thread;
+    # the (blocking) queries still run on the threadpool
+    user = await run_in_threadpool(_load_portal_user, request.portal_user_name)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    try:
+        verified, new_hash = await password_hasher.verify_and_update(request.password, user.password)
+    except PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many logins in progress, retry shortly",
+                            headers={"Retry-After": "1"})
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    if new_hash:
+        # Stored with older cost parameters; upgrade now that we have the plain password
+        await run_in_threadpool(_store_password_hash, user.portal_user_id, new_hash)
 
     access_token = create_access_token(data={"sub": user.portal_user_name})
     return {"access_token": access_token}
 
 
+@app.post("/logout")
+def logout(db: Session = Depends(get_db), auth: AuthContext = Depends(get_auth_context)):
+    # Revoked on every worker within REVOCATION_REFRESH_SECONDS, here immediately
+    if auth.jti is None:
+        raise HTTPException(status_code=400, detail="Token cannot be revoked; it expires on its own")
+    revoke_token(db, auth)
+    return {"message": "Logged out"}
+
+
 #### Application APIs
 
 @app.get("/admin-dashboard")
-def get_dashboard_summary(db: Session = Depends(get_db), str = Depends(verify_token)):
-    sync_panels_and_files(db)
-    result = db.execute(text("SELECT metrics_json FROM dashboard_summary_view")).fetchone()
-    return {"dashboard": result[0]}
+def get_dashboard_summary(str = Depends(verify_token)):
+    # Served from memory; dashboard_metrics_job keeps it current
+    return {"dashboard": dashboard_metrics.snapshot()}
+
+@app.get("/analytics/scans")
+def get_scan_analytics(
+    start: datetime,
+    end: datetime,
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    panel_id: int | None = None,
+    user_id: int | None = None,
+    group_by: str | None = Query(None, pattern="^(panel|user)$"),
+    db: Session = Depends(get_read_db),
+    str = Depends(verify_token),
+):
+    """Scans per hour/day by status category (initiated/verified/failed/other), from the rollup tables.
+
+    start/end are UTC; the newest minute or two may not be rolled up yet.
+    """
+    start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t for t in (start, end))
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end - start) / (timedelta(days=1) if bucket == "day" else timedelta(hours=1)) > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BUCKETS} buckets per request")
+    return {
+        "bucket": bucket,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "series": scan_series(db, start, end, bucket, panel_id, user_id, group_by),
+    }
+
+@app.get("/mail-stats")
+def get_mail_stats(str = Depends(verify_token)):
+    """Delivery counters and enqueue-to-sent latency of this worker's mail queue."""
+    return mail_queue.stats()
+
+
+@app.get("/secret-filter-stats")
+def get_secret_filter_stats(str = Depends(verify_token)):
+    """Size of this worker's secret code filter and the unknown codes it turned away."""
+    return secret_filter.stats()
 
 
 #### User APIs
@@ -477,40 +651,51 @@ def get_dashboard_summary(db: Session = Depends(get_db), str = Depends(verify_to
 
 @app.get("/users")
 def read_users(db: Session = Depends(get_db)):
-    sync_panels_and_files(db)
     return db.query(User).all()
 
 @app.get("/user-details")
-def get_user_assignments(db: Session = Depends(get_db), str = Depends(verify_token)):
-    assignments = (
-        db.query(UserAssignment, User, PanelMaster)
-        .join(User, User.user_id == UserAssignment.user_id)
-        .join(PanelMaster, PanelMaster.panel_id == UserAssignment.panel_id)
-        .all()
-    )
-
-    user_map = {}
-
-    for assignment, user, panel in assignments:
-        qr_base64 = base64.b64encode(assignment.qr_code).decode('utf-8') if assignment.qr_code else ""
+def get_user_assignments(
+    after_user_id: int | None = None,
+    limit: int = Query(USER_PAGE_SIZE, ge=1, le=USER_PAGE_MAX),
+    panel_id: int | None = None,
+    q: str | None = Query(None, max_length=100),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db),
+    str = Depends(verify_token),
+):
+    """Users with their assignments, keyset-paginated on user_id.
+
+    Pass the X-Next-Cursor header back as after_user_id for the next page.
+    format=ndjson streams every matching user (one JSON object per line)
+    from a server-side cursor instead of returning one page.
+    """
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_user_details(after_user_id, panel_id, q),
+            media_type="application/x-ndjson",
+        )
 
-        if user.user_id not in user_map:
-            user_map[user.user_id] = {
-                "user_id": user.user_id,
-                "user_name": user.name,
-                "email_id": user.email_id,
-                "phone_number": user.phone_number,
-                "assignments": []
-            }
+    user_ids, next_cursor = page_user_ids(db, after_user_id, panel_id, q, limit)
+    users = list(group_by_user(assignment_rows(db, panel_id=panel_id, user_ids=user_ids))) if user_ids else []
+    headers = {"Access-Control-Expose-Headers": "X-Next-Cursor"}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = f"{next_cursor}"
+    return JSONResponse(content=users, headers=headers)
 
-        user_map[user.user_id]["assignments"].append({
-            "panel_id": panel.panel_id,
-            "panel_name": panel.panel_name,
-            "secret_code": assignment.secret_code,
-            "qr_code_base64": qr_base64,
-        })
 
-    return list(user_map.values())
+def _stream_user_details(after_user_id, panel_id, prefix):
+    # Own session: the request's session is closed before the body is sent
+    db = ReadSessionLocal()
+    try:
+        rows = (
+            assignment_rows(db, after_user_id, panel_id, prefix)
+            .execution_options(stream_results=True)
+            .yield_per(STREAM_BATCH_SIZE)
+        )
+        for user in group_by_user(rows):
+            yield json.dumps(user, separators=(",", ":")) + "\n"
+    finally:
+        db.close()
 
 # @app.get("/user-details", response_model=List[UserDetails])
 # def get_user_assignments(db: Session = Depends(get_db)):
@@ -543,41 +728,71 @@ def delete_user(user_id: int, db: Session = Depends(get_db), str = Depends(verif
         raise HTTPException(status_code=404, detail="User not found")
     
     # Optional: delete related assignments
-    db.query(UserAssignment).filter(UserAssignment.user_id == user_id).delete()
+    removed = db.query(UserAssignment).filter(UserAssignment.user_id == user_id).delete()
     
     db.delete(user)
     db.commit()
+    dashboard_metrics.adjust(users=-1, assignments=-removed)
+    secret_filter.note_removed(removed)
     return {"message": f"User {user_id} deleted successfully"}
 
 @app.post("/users")
-def create_user(user: UserCreate, db: Session = Depends(get_db), str = Depends(verify_token)):
+def create_user(user: UserCreate, background: BackgroundTasks, db: Session = Depends(get_db), str = Depends(verify_token)):
     db_user = User(name=user.name,email_id=user.email_id,phone_number=user.phone_number)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     # Loop through assignments and create them
+    secret_codes = []
     for panel in user.panels:
-        secret_code = generate_secret_code()
-        # Proper base64 encoding of the secret code
-        encoded_bytes = base64.b64encode(secret_code.encode('utf-8'))
-        encoded_str = encoded_bytes.decode('utf-8')
-        file_url = f"{WEBAPP_URL}verify-secret-code/{encoded_str}"
-        qr_code_bytes = generate_qr_code_bytes(file_url)
+        # QR images are rendered by GET /qr/{user_assignment_id}.png; warm the cache off-request
         db_assignment = UserAssignment(
             user_id=db_user.user_id,
             panel_id=panel.panel_id,
-            secret_code=secret_code,
-            qr_code=qr_code_bytes
+            secret_code=generate_secret_code(),
         )
         db.add(db_assignment)
+        secret_codes.append(db_assignment.secret_code)
 
     db.commit()
+    dashboard_metrics.adjust(users=1, assignments=len(secret_codes))
+    secret_filter.add(secret_codes)
+    background.add_task(qr_image_cache.warm, [secret_code_url(code) for code in secret_codes])
     return db_user
 
 
 
+@app.post("/users/import", status_code=202)
+def import_users(background: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db), str = Depends(verify_token)):
+    try:
+        rows = validate_rows(db, parse_rows(file.filename, file.file.read()))
+    except ImportValidationError as exc:
+        raise HTTPException(status_code=422, detail={"message": "Import file has errors", "errors": exc.errors})
+    if not rows:
+        raise HTTPException(status_code=422, detail="Import file has no rows")
+
+    job = import_jobs.create(len(rows))
+    background.add_task(
+        run_import, job, rows, SessionLocal, generate_secret_code, secret_code_url, qr_image_cache
+    )
+    # Runs after the import: pick up its secret codes now rather than at the next refresh
+    background.add_task(secret_filter_job.trigger)
+    background.add_task(_count_import, job)
+    return {"job_id": job.job_id, "status": job.status, "total_rows": job.total_rows}
+
+def _count_import(job):
+    # A failed import rolled back and reports 0 of each
+    dashboard_metrics.adjust(users=job.users_created, assignments=job.assignments_created)
+
+@app.get("/users/import/{job_id}")
+def get_import_job(job_id: str, str = Depends(verify_token)):
+    job = import_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job.as_dict()
+
 @app.put("/users/{user_id}")
-def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get_db), str = Depends(verify_token)):
+def update_user(user_id: int, user_update: UserUpdate, background: BackgroundTasks, db: Session = Depends(get_db), str = Depends(verify_token)):
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -596,30 +811,32 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
 
     # Delete removed panels
     panels_to_delete = existing_panel_names - new_panel_names
+    removed = 0
     if panels_to_delete:
-        db.query(UserAssignment).filter(
+        removed = db.query(UserAssignment).filter(
             UserAssignment.user_id == user_id,
             UserAssignment.panel_id.in_(panels_to_delete)
         ).delete(synchronize_session=False)
 
     # Add new panels
     panels_to_add = new_panel_names - existing_panel_names
+    secret_codes = []
     for panel in user_update.panels:
         if panel.panel_id in panels_to_add:
-            secret_code = generate_secret_code()
-            encoded_str = base64.b64encode(secret_code.encode('utf-8')).decode('utf-8')
-            file_url = f"{WEBAPP_URL}verify-secret-code/{encoded_str}"
-            qr_code_bytes = generate_qr_code_bytes(file_url)
-
             db_assignment = UserAssignment(
                 user_id=user_id,
                 panel_id=panel.panel_id,
-                secret_code=secret_code,
-                qr_code=qr_code_bytes
+                secret_code=generate_secret_code(),
             )
             db.add(db_assignment)
+            secret_codes.append(db_assignment.secret_code)
 
     db.commit()
+    dashboard_metrics.adjust(assignments=len(secret_codes) - removed)
+    secret_filter.add(secret_codes)
+    secret_filter.note_removed(removed)
+    if secret_codes:
+        background.add_task(qr_image_cache.warm, [secret_code_url(code) for code in secret_codes])
     return {"message": f"User {user_id} updated successfully", "user": user}
 
 
@@ -650,14 +867,14 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
 
 @app.post("/user-scan-log")
 def log_scan(request: ScanLogRequest, db: Session = Depends(get_db), str = Depends(verify_token)):
-    assignment = db.query(UserAssignment).filter_by(secret_code=request.secret_code).first()
-    scan_log = UserScanLog(
-        user_assignment_id=assignment.user_assignment_id,
-        scan_datetime=datetime.utcnow,
-        verification_status=request.verification_status
+    assignment_id = (
+        db.query(UserAssignment.user_assignment_id)
+        .filter(UserAssignment.secret_code == request.secret_code)
+        .scalar()
     )
-    db.add(scan_log)
-    db.commit()
+    if assignment_id is None:
+        raise HTTPException(status_code=404, detail="Invalid secret code")
+    scan_log_buffer.record(assignment_id, request.verification_status)
     return {"message": "Scan log saved"}
     # userAssignId = request.user_assignment_id
     # if assignment:
@@ -674,33 +891,39 @@ def log_scan(request: ScanLogRequest, db: Session = Depends(get_db), str = Depen
     # raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @app.post("/verify-secret/{secret_code}")
-def verify_secret(secret_code: str, db: Session = Depends(get_db), str = Depends(verify_token)):
-    assignment = db.query(UserAssignment).filter_by(secret_code=secret_code).first()
-    if assignment and assignment.secret_code == secret_code:
-        user = db.query(User).filter_by(user_id=assignment.user_id).first()
-        access_token = create_access_token(data={"sub": user.name,"user_id":user.user_id,"assignment":assignment.user_assignment_id})
-        scan_log = UserScanLog(
-            user_assignment_id=assignment.user_assignment_id,
-            verification_status="1"
-        )
-        db.add(scan_log)
-        db.commit()
+def verify_secret(secret_code: str, request: Request, db: Session = Depends(get_db), str = Depends(verify_token)):
+    enforce(rate_limiter, (SECRET_CHECK_PER_IP, _client_ip(request)), (SECRET_CHECK_PER_SECRET, secret_code))
+    if not secret_filter.might_exist(secret_code):
+        # Counted in /secret-filter-stats, not logged: a guessing client would flood user_scan_log
+        raise HTTPException(status_code=403, detail="Invalid secret code")
+    assignment = (
+        db.query(UserAssignment.user_assignment_id, User.user_id, User.name)
+        .join(User, User.user_id == UserAssignment.user_id)
+        .filter(UserAssignment.secret_code == secret_code)
+        .first()
+    )
+    if assignment:
+        access_token = create_access_token(data={"sub": assignment.name,"user_id":assignment.user_id,"assignment":assignment.user_assignment_id})
+        scan_log_buffer.record(assignment.user_assignment_id, "1")
         return {"status": "verified","access_token":access_token}
-    else:
-        scan_log = UserScanLog(
-            user_assignment_id=assignment.user_assignment_id,
-            verification_status="2"
-        )
-        db.add(scan_log)
-        db.commit()
+    # Unknown code: still logged, without an assignment
+    scan_log_buffer.record(None, "2")
     raise HTTPException(status_code=403, detail="Invalid secret code")
 
 @app.post("/get-assigned-files", response_model=FilesDetail)
-def get_assigned_files(request: GetFilesRequest, db: Session = Depends(get_db), str = Depends(verify_token)):
+def get_assigned_files(request: GetFilesRequest, db: Session = Depends(get_db), auth: AuthContext = Depends(get_auth_context)):
+    # Usually the body carries the same token as the header, already decoded
+    try:
+        claims = auth if request.access_token == auth.token else decode_token(request.access_token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Expired or Invalid access")
+    if claims.assignment is None:
+        raise HTTPException(status_code=401, detail="Expired or Invalid access")
+
     assignment_data = (
         db.query(UserAssignment, PanelMaster)
         .join(PanelMaster, PanelMaster.panel_id == UserAssignment.panel_id)
-        .filter(UserAssignment.user_assignment_id == get_assignment_id_from_token(request.access_token))
+        .filter(UserAssignment.user_assignment_id == claims.assignment)
         .first()
     )
 
@@ -709,17 +932,20 @@ def get_assigned_files(request: GetFilesRequest, db: Session = Depends(get_db),
 
     assignment, panel = assignment_data  # Unpack tuple properly
 
-    panel_folder = os.path.join(PANEL_BASE_DIR, panel.panel_name)
-
-    if not os.path.exists(panel_folder) or not os.path.isdir(panel_folder):
+    if panel.is_deleted:
         raise HTTPException(status_code=404, detail="Panel folder not found")
 
-    file_names = os.listdir(panel_folder)
+    # Listing comes from the file_meta index kept current by the panel sync
+    file_records = (
+        db.query(FileMeta.file_meta_id, FileMeta.file_name, FileMeta.file_size, FileMeta.mime_type)
+        .filter(FileMeta.panel_id == panel.panel_id, FileMeta.is_deleted == False)
+        .order_by(FileMeta.file_meta_id)
+        .all()
+    )
 
     files = [
-        {"file_meta_id": idx + 1, "file_name": f}
-        for idx, f in enumerate(file_names)
-        if os.path.isfile(os.path.join(panel_folder, f))
+        {"file_meta_id": f.file_meta_id, "file_name": f.file_name, "file_size": f.file_size, "mime_type": f.mime_type}
+        for f in file_records
     ]
 
     return {
@@ -758,8 +984,33 @@ def get_assigned_files(request: GetFilesRequest, db: Session = Depends(get_db),
 #         "panel_name": assignment.panel_id
 #     }
 
+@app.get("/duplicate-files")
+def get_duplicate_files(db: Session = Depends(get_db), str = Depends(verify_token)):
+    # Identical documents (same SHA-256) copied into more than one place
+    duplicates = (
+        db.query(FileMeta.content_hash)
+        .filter(FileMeta.is_deleted == False, FileMeta.content_hash.isnot(None))
+        .group_by(FileMeta.content_hash)
+        .having(func.count(FileMeta.file_meta_id) > 1)
+        .subquery()
+    )
+    rows = (
+        db.query(FileMeta.content_hash, FileMeta.file_size, FileMeta.file_meta_id, FileMeta.file_name, PanelMaster.panel_name)
+        .join(PanelMaster, PanelMaster.panel_id == FileMeta.panel_id)
+        .join(duplicates, duplicates.c.content_hash == FileMeta.content_hash)
+        .filter(FileMeta.is_deleted == False)
+        .order_by(FileMeta.content_hash, FileMeta.file_meta_id)
+        .all()
+    )
+
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(row.content_hash, {"content_hash": row.content_hash, "file_size": row.file_size, "copies": []})
+        group["copies"].append({"file_meta_id": row.file_meta_id, "panel_name": row.panel_name, "file_name": row.file_name})
+    return list(groups.values())
+
 @app.get("/panel-files/{panel_id}", response_model=List[FileMetaResponse])
-def get_files_by_panel(panel_id: int, db: Session = Depends(get_db), str = Depends(verify_token)):
+def get_files_by_panel(panel_id: int, db: Session = Depends(get_read_db), str = Depends(verify_token)):
     files = db.query(FileMeta.file_meta_id, FileMeta.panel_id, FileMeta.file_name).filter(FileMeta.panel_id == panel_id).all()
     if not files:
         raise HTTPException(status_code=404, detail="No files found for this panel")
@@ -788,24 +1039,22 @@ def get_files_by_panel(panel_id: int, db: Session = Depends(get_db), str = Depen
 #     })
 
 @app.get("/view-file/{panel_name}/{file_name}")
-def view_file(panel_name: str, file_name: str, str1 = Depends(verify_token)):
-    file_path = os.path.join(PANEL_BASE_DIR, panel_name, file_name)
-
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-
-    file_size = os.path.getsize(file_path)  # Get the file size in bytes
-    file_stream = open(file_path, "rb")
-
-    return StreamingResponse(
-        file_stream,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"inline; filename={file_name}",
-            "Content-Length": str(file_size),  # Add this line
-            "Access-Control-Expose-Headers": "Content-Length"  # Optional but important for frontend JS to read it
-        }
+def view_file(panel_name: str, file_name: str, request: Request, db: Session = Depends(get_db), str1 = Depends(verify_token)):
+    file_path = resolve_panel_file(PANEL_BASE_DIR, panel_name, file_name)
+    settings = get_settings()
+    if settings.FILE_OFFLOAD_MODE != "none":
+        return offload_response(
+            settings.FILE_OFFLOAD_MODE, file_path, panel_name, file_name,
+            prefix=settings.FILE_OFFLOAD_PREFIX,
+        )
+    indexed = (
+        db.query(FileMeta.file_size, FileMeta.file_mtime, FileMeta.content_hash)
+        .join(PanelMaster, PanelMaster.panel_id == FileMeta.panel_id)
+        .filter(PanelMaster.panel_name == panel_name, FileMeta.file_name == file_name, FileMeta.is_deleted == False)
+        .first()
     )
+    db.close()  # release the connection before streaming
+    return serve_file(request, file_path, file_name, indexed=indexed)
     
 @app.get("/view-file1/{assignment_id}")
 def view_file(assignment_id: int, secret_code: str, db: Session = Depends(get_db), str = Depends(verify_token)):
@@ -825,24 +1074,19 @@ def view_file(assignment_id: int, secret_code: str, db: Session = Depends(get_db
 
 
 @app.post("/user-assignment")
-def create_user_assignment(payload: UserAssignmentCreate, db: Session = Depends(get_db), str = Depends(verify_token)):
-    secret_code = generate_secret_code()
-    # Proper base64 encoding of the secret code
-    encoded_bytes = base64.b64encode(secret_code.encode('utf-8'))
-    encoded_str = encoded_bytes.decode('utf-8')
-    file_url = f"{WEBAPP_URL}verify-secret-code/{encoded_str}"
-    qr_code_bytes = generate_qr_code_bytes(file_url)
-
+def create_user_assignment(payload: UserAssignmentCreate, background: BackgroundTasks, db: Session = Depends(get_db), str = Depends(verify_token)):
     assignment = UserAssignment(
         user_id=payload.user_id,
         panel_id=payload.panel_id,
-        secret_code=secret_code,
-        qr_code=qr_code_bytes,
+        secret_code=generate_secret_code(),
     )
 
     db.add(assignment)
     db.commit()
     db.refresh(assignment)
+    dashboard_metrics.adjust(assignments=1)
+    secret_filter.add([assignment.secret_code])
+    background.add_task(qr_image_cache.warm, [secret_code_url(assignment.secret_code)])
 
     return {
         "user_assignment_id": assignment.user_assignment_id,
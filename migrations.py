@@ -0,0 +1,283 @@
+# migrations.py
+import argparse
+import logging
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+from database import Base
+import models  # noqa: F401  registers every table on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_NAME = "panel_portal_migrations"
+MIGRATION_LOCK_TIMEOUT = 120   # seconds a worker waits for another one's migrations
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+# ------------------ Helpers ------------------
+
+def _has_index(conn, table: str, columns, unique: bool = False) -> bool:
+    # Any index or unique constraint on exactly these columns (in order) will do
+    inspector = inspect(conn)
+    candidates = [(i["column_names"], i.get("unique", False)) for i in inspector.get_indexes(table)]
+    candidates += [(u["column_names"], True) for u in inspector.get_unique_constraints(table)]
+    return any(list(cols) == list(columns) and (is_unique or not unique) for cols, is_unique in candidates)
+
+
+def _check_duplicates(conn, table: str, columns):
+    cols = ", ".join(columns)
+    not_null = " AND ".join(f"{c} IS NOT NULL" for c in columns)
+    duplicates = conn.execute(text(
+        f"SELECT {cols}, COUNT(*) FROM {table} WHERE {not_null} GROUP BY {cols} HAVING COUNT(*) > 1 LIMIT 5"
+    )).fetchall()
+    if duplicates:
+        sample = "; ".join(", ".join(f"{v}" for v in row[:-1]) + f" (x{row[-1]})" for row in duplicates)
+        raise MigrationError(f"Cannot add unique index on {table}({cols}), duplicate values: {sample}")
+
+
+def ensure_index(conn, table: str, name: str, columns, unique: bool = False):
+    if _has_index(conn, table, columns, unique):
+        return
+    if unique:
+        _check_duplicates(conn, table, columns)
+    logger.info("Creating index %s on %s(%s)", name, table, ", ".join(columns))
+    conn.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+    ))
+
+
+def _merge_duplicate_panels(conn):
+    # Panel syncs racing in two workers before panel_master.panel_name was
+    # unique could insert a panel twice; keep the oldest row and move the
+    # files and assignments of the others onto it
+    merged = 0
+    for panel_name, keep_id in conn.execute(text(
+        "SELECT panel_name, MIN(panel_id) FROM panel_master WHERE panel_name IS NOT NULL "
+        "GROUP BY panel_name HAVING COUNT(*) > 1"
+    )).fetchall():
+        duplicate_ids = [row[0] for row in conn.execute(
+            text("SELECT panel_id FROM panel_master WHERE panel_name = :name AND panel_id <> :keep"),
+            {"name": panel_name, "keep": keep_id},
+        )]
+        for table in ("file_meta", "user_assignment"):
+            conn.execute(
+                text(f"UPDATE {table} SET panel_id = :keep WHERE panel_id IN :ids")
+                .bindparams(bindparam("ids", expanding=True)),
+                {"keep": keep_id, "ids": duplicate_ids},
+            )
+        conn.execute(
+            text("DELETE FROM panel_master WHERE panel_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": duplicate_ids},
+        )
+        merged += len(duplicate_ids)
+    if merged:
+        logger.warning("Merged %d duplicate panel_master rows", merged)
+
+
+def _merge_duplicate_files(conn):
+    # Same race for file_meta(panel_id, file_name); nothing references
+    # file_meta rows, and the next sync refreshes the one kept from the disk
+    duplicate_ids = [row[0] for row in conn.execute(text(
+        "SELECT f.file_meta_id FROM file_meta f JOIN ("
+        "SELECT panel_id, file_name, MIN(file_meta_id) AS keep_id FROM file_meta "
+        "WHERE panel_id IS NOT NULL AND file_name IS NOT NULL "
+        "GROUP BY panel_id, file_name HAVING COUNT(*) > 1"
+        ") d ON d.panel_id = f.panel_id AND d.file_name = f.file_name AND f.file_meta_id <> d.keep_id"
+    ))]
+    for i in range(0, len(duplicate_ids), 1000):
+        conn.execute(
+            text("DELETE FROM file_meta WHERE file_meta_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": duplicate_ids[i:i + 1000]},
+        )
+    if duplicate_ids:
+        logger.warning("Removed %d duplicate file_meta rows", len(duplicate_ids))
+
+
+def add_missing_columns(conn):
+    # create_all only creates missing tables; add columns (and their indexes)
+    # that were declared on a model after its table already existed
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        added = set()
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            added.add(column.name)
+        for index in table.indexes:
+            if added & {c.name for c in index.columns} and not _has_index(conn, table.name, [c.name for c in index.columns]):
+                index.create(conn)
+
+
+# ------------------ Migrations ------------------
+# Append only; never edit a migration that has shipped. Each must be safe to
+# re-run against a database that already has its changes (fresh databases
+# get the current models from the baseline).
+
+def _baseline(conn):
+    Base.metadata.create_all(bind=conn)
+    add_missing_columns(conn)
+
+
+def _hot_path_indexes(conn):
+    ensure_index(conn, "user_assignment", "ix_user_assignment_secret_code", ["secret_code"], unique=True)
+    ensure_index(conn, "user_assignment", "ix_user_assignment_user_id", ["user_id"])
+    ensure_index(conn, "file_meta", "ix_file_meta_panel_deleted", ["panel_id", "is_deleted"])
+    ensure_index(conn, "user_scan_log", "ix_user_scan_log_assignment_time", ["user_assignment_id", "scan_datetime"])
+    ensure_index(conn, "portal_user", "uq_portal_user_name", ["portal_user_name"], unique=True)
+    # The panel sync's retry on IntegrityError relies on these two keys. Rows
+    # only the sync writes are de-duplicated first (panels before files, as
+    # merging panels can make file names collide)
+    if not _has_index(conn, "panel_master", ["panel_name"], unique=True):
+        _merge_duplicate_panels(conn)
+    ensure_index(conn, "panel_master", "uq_panel_master_panel_name", ["panel_name"], unique=True)
+    if not _has_index(conn, "file_meta", ["panel_id", "file_name"], unique=True):
+        _merge_duplicate_files(conn)
+    ensure_index(conn, "file_meta", "uq_file_meta_panel_file", ["panel_id", "file_name"], unique=True)
+
+
+def _revoked_tokens(conn):
+    models.RevokedToken.__table__.create(conn, checkfirst=True)
+
+
+def _assignment_version(conn):
+    # Retired: the secret code filter now watches MAX(user_assignment_id). The
+    # number stays taken; a row left behind by earlier deployments is harmless.
+    pass
+
+
+def _otp_client_key(conn):
+    add_missing_columns(conn)
+
+
+MIGRATIONS = [
+    (1, "baseline: create tables, add columns declared since", _baseline),
+    (2, "hot-path indexes and unique secret_code / panel_name", _hot_path_indexes),
+    (3, "revoked_token table for logout", _revoked_tokens),
+    (4, "assignment version counter for the secret code filter (retired)", _assignment_version),
+    (5, "otp_challenge.client_key for per-client scan coalescing", _otp_client_key),
+]
+
+
+# ------------------ Runner ------------------
+
+def _lock(conn):
+    # Workers starting together: one migrates, the others wait and then find nothing to do
+    if conn.dialect.name == "mysql":
+        if conn.execute(text("SELECT GET_LOCK(:n, :t)"), {"n": MIGRATION_LOCK_NAME, "t": MIGRATION_LOCK_TIMEOUT}).scalar() != 1:
+            raise MigrationError("Timed out waiting for another process's migrations")
+
+
+def _unlock(conn):
+    if conn.dialect.name == "mysql":
+        conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": MIGRATION_LOCK_NAME})
+
+
+def applied_versions(conn) -> set:
+    if not inspect(conn).has_table("schema_version"):
+        return set()
+    return {row.version for row in conn.execute(select(schema_version.c.version))}
+
+
+def _up_to_date(conn) -> bool:
+    # One plain SELECT, no lock or reflection: the common case when workers restart
+    try:
+        done = {row.version for row in conn.execute(select(schema_version.c.version))}
+    except DBAPIError:
+        conn.rollback()  # no schema_version table yet
+        return False
+    return all(version in done for version, _, _ in MIGRATIONS)
+
+
+def migrate(engine) -> list:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        if _up_to_date(conn):
+            return applied
+        _lock(conn)
+        try:
+            schema_version.create(conn, checkfirst=True)
+            conn.commit()
+            done = applied_versions(conn)
+            for version, name, upgrade in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info("Applying migration %d: %s", version, name)
+                upgrade(conn)
+                conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+                conn.commit()
+                applied.append(version)
+        finally:
+            conn.rollback()
+            _unlock(conn)
+    return applied
+
+
+# ------------------ Query plans ------------------
+
+HOT_QUERIES = [
+    ("qr scan by secret_code", "SELECT user_assignment_id FROM user_assignment WHERE secret_code = :v", {"v": "x"}),
+    ("assignments of a user", "SELECT user_assignment_id FROM user_assignment WHERE user_id = :v", {"v": 1}),
+    ("live files of a panel", "SELECT file_meta_id FROM file_meta WHERE panel_id = :v AND is_deleted = 0", {"v": 1}),
+    ("scans of an assignment", "SELECT log_id FROM user_scan_log WHERE user_assignment_id = :v AND scan_datetime >= :t",
+     {"v": 1, "t": datetime(2000, 1, 1)}),
+    ("portal login", "SELECT password FROM portal_user WHERE portal_user_name = :v", {"v": "x"}),
+]
+
+
+def check_query_plans(engine) -> list:
+    """EXPLAIN each hot query; returns (label, uses_index, plan) tuples."""
+    results = []
+    with engine.connect() as conn:
+        for label, sql, params in HOT_QUERIES:
+            if conn.dialect.name == "sqlite":
+                plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)]
+                uses_index = all("USING" in step and "INDEX" in step for step in plan)
+            else:
+                rows = conn.execute(text(f"EXPLAIN {sql}"), params).mappings().all()
+                plan = [f"{row['table']}: key={row['key']} type={row['type']}" for row in rows]
+                uses_index = all(row["key"] for row in rows)
+            results.append((label, uses_index, plan))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="EXPLAIN the hot queries, fail if one scans")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from database import get_engine
+
+    engine = get_engine()
+    if args.status:
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+        for version, name, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending'}  {version:3d}  {name}")
+    elif args.check_plans:
+        failed = False
+        for label, uses_index, plan in check_query_plans(engine):
+            print(f"{'OK  ' if uses_index else 'SCAN'} {label}: {' | '.join(plan)}")
+            failed |= not uses_index
+        raise SystemExit(1 if failed else 0)
+    else:
+        print(f"Applied migrations: {migrate(engine) or 'none pending'}")
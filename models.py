@@ -1,7 +1,7 @@
-from sqlalchemy import Boolean, create_engine, Column, Integer, String, ForeignKey, LargeBinary, DateTime
+from sqlalchemy import Boolean, create_engine, Column, Integer, BigInteger, Float, String, ForeignKey, LargeBinary, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship, sessionmaker, declarative_base
 from datetime import datetime
-from database import SessionLocal, Base, engine
+from database import Base
 import pytz
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -20,17 +20,25 @@ class PortalUser(Base):
 class PanelMaster(Base):
     __tablename__ = "panel_master"
     panel_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    panel_name = Column(String(255))
+    panel_name = Column(String(255), unique=True)
     description = Column(String(1000))
     is_deleted = Column(Boolean, default=False)
     file_meta = relationship("FileMeta", back_populates="panel")
 
 class FileMeta(Base):
     __tablename__ = "file_meta"
+    __table_args__ = (
+        UniqueConstraint("panel_id", "file_name", name="uq_file_meta_panel_file"),
+        Index("ix_file_meta_panel_deleted", "panel_id", "is_deleted"),
+    )
     file_meta_id = Column(Integer, primary_key=True, index=True)
     panel_id = Column(Integer, ForeignKey("panel_master.panel_id"))
     file_name = Column(String(255))
     is_deleted = Column(Boolean, default=False)
+    file_size = Column(BigInteger)
+    file_mtime = Column(Float(precision=53))  # st_mtime, compared with the disk to skip re-hashing
+    mime_type = Column(String(127))
+    content_hash = Column(String(64), index=True)  # sha256 hex
     panel = relationship("PanelMaster", back_populates="file_meta")
 
 class User(Base):
@@ -42,14 +50,19 @@ class User(Base):
 
 class UserAssignment(Base):
     __tablename__ = "user_assignment"
+    __table_args__ = (
+        Index("ix_user_assignment_secret_code", "secret_code", unique=True),  # every QR scan
+        Index("ix_user_assignment_user_id", "user_id"),
+    )
     user_assignment_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id"))
     secret_code = Column(String(255))
-    qr_code = Column(LargeBinary)
+    qr_code = Column(LargeBinary)  # legacy; QR images are rendered on demand (see qr_images.py)
     panel_id = Column(Integer)
 
 class UserScanLog(Base):
     __tablename__ = "user_scan_log"
+    __table_args__ = (Index("ix_user_scan_log_assignment_time", "user_assignment_id", "scan_datetime"),)
     log_id = Column(Integer, primary_key=True, index=True)
     user_assignment_id = Column(Integer, ForeignKey("user_assignment.user_assignment_id"))
     scan_datetime = Column(DateTime)
@@ -65,6 +78,38 @@ class OtpChallenge(Base):
     max_attempts = Column(Integer, default=5, nullable=False)
     consumed = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_sent_at = Column(DateTime, nullable=True)  # last OTP mail, for the resend cooldown
+    client_key = Column(String(64), nullable=True)  # hash of the scanning browser's cookie; scans coalesce per client
 
+class DashboardCounter(Base):
+    # Precomputed dashboard numbers, maintained by dashboard_metrics.py
+    __tablename__ = "dashboard_counter"
+    metric_key = Column(String(191), primary_key=True)  # e.g. "users", "scans:2025-06-01:otp_verified"
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
 
-Base.metadata.create_all(bind=engine)
+class ScanRollupHourly(Base):
+    # user_scan_log counts per hour, filled by scan_rollup.py; 0 = no panel/user
+    __tablename__ = "scan_rollup_hourly"
+    bucket_start = Column(DateTime, primary_key=True)
+    panel_id = Column(Integer, primary_key=True, index=True, autoincrement=False)
+    user_id = Column(Integer, primary_key=True, index=True, autoincrement=False)
+    verification_status = Column(String(100), primary_key=True)
+    scan_count = Column(Integer, nullable=False, default=0)
+
+class ScanRollupDaily(Base):
+    # Same as ScanRollupHourly, bucket_start at midnight UTC
+    __tablename__ = "scan_rollup_daily"
+    bucket_start = Column(DateTime, primary_key=True)
+    panel_id = Column(Integer, primary_key=True, index=True, autoincrement=False)
+    user_id = Column(Integer, primary_key=True, index=True, autoincrement=False)
+    verification_status = Column(String(100), primary_key=True)
+    scan_count = Column(Integer, nullable=False, default=0)
+
+
+class RevokedToken(Base):
+    # Logged-out JWTs by jti, until they would have expired anyway (see auth.py)
+    __tablename__ = "revoked_token"
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=False)
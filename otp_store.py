@@ -0,0 +1,465 @@
+# otp_store.py
+import base64
+from abc import ABC, abstractmethod
+import hmac
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+
+from models import OtpChallenge, User, UserAssignment
+
+OTP_MEMORY_SWEEP_SECONDS = 30.0   # how often the memory store drops expired challenges
+OTP_REDIS_PREFIX = "otp:"
+
+# verify() / resend() outcomes
+VERIFIED = "verified"
+RESENT = "resent"
+NOT_FOUND = "not_found"
+CONSUMED = "consumed"
+EXPIRED = "expired"
+TOO_MANY_ATTEMPTS = "too_many_attempts"
+INVALID = "invalid"
+COOLDOWN = "cooldown"
+
+
+@dataclass
+class Challenge:
+    user_assignment_id: int
+    user_id: int
+    user_name: str
+    email_id: str
+    otp_hash: str
+    expires_at: float      # epoch seconds
+    max_attempts: int
+    attempts: int = 0
+    created_at: float = 0.0
+    last_sent_at: float = 0.0
+    client_key: str | None = None   # which browser scanned; only its repeated scans reuse the challenge
+
+    def is_live(self, now: float, window_seconds: float) -> bool:
+        # Reusable for a repeated scan: recent, not expired, attempts left
+        return (now - self.created_at <= window_seconds and now < self.expires_at
+                and self.attempts < self.max_attempts)
+
+
+class ChallengeStore(ABC):
+    """Where pending OTP challenges live between /qr/initiate and /qr/verify-otp.
+
+    create() returns the opaque session id handed to the client; verify()
+    counts the attempt atomically and returns (outcome, challenge), where
+    challenge carries what is needed to issue the token without more
+    queries. find_live() lets a repeated scan from the same client reuse a
+    recent challenge and resend() swaps in a new OTP, at most once per
+    cooldown. Every method
+    takes the request's db session: the SQL store writes through it (the
+    caller commits), the others ignore it.
+    """
+
+    @abstractmethod
+    def create(self, db, challenge: Challenge) -> str:
+        ...
+
+    @abstractmethod
+    def verify(self, db, session_id: str, otp_hash: str):
+        ...
+
+    @abstractmethod
+    def find_live(self, db, user_assignment_id: int, client_key: str | None, window_seconds: float):
+        """Session id of a challenge this client created within window_seconds that can still be answered.
+
+        None when there is none, or when client_key is None: a session id is
+        only ever handed back to the client it was issued to, so nobody else
+        scanning the same sticker can spend its attempts or resends.
+        """
+
+    @abstractmethod
+    def resend(self, db, session_id: str, otp_hash: str, ttl_seconds: float, cooldown_seconds: float):
+        """Replace the OTP and extend expiry; returns (RESENT | COOLDOWN | NOT_FOUND | ..., challenge).
+
+        An expired challenge is NOT_FOUND: resending must not bring it back.
+        """
+
+
+def _check(challenge: Challenge, otp_hash: str, now: float):
+    # Shared rules; the caller has already counted this attempt
+    if now > challenge.expires_at:
+        return EXPIRED
+    if challenge.attempts > challenge.max_attempts:
+        return TOO_MANY_ATTEMPTS
+    if not hmac.compare_digest(challenge.otp_hash, otp_hash):
+        return INVALID
+    return VERIFIED
+
+
+def _epoch(value: datetime) -> float:
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+# ------------------ SQL ------------------
+
+class SqlChallengeStore(ChallengeStore):
+    """Challenges as otp_challenge rows, shared by every worker through the database."""
+
+    @staticmethod
+    def _session_id(otp_id: int) -> str:
+        return base64.urlsafe_b64encode(f"{otp_id}".encode()).decode()
+
+    @staticmethod
+    def _otp_id(session_id: str):
+        try:
+            return int(base64.urlsafe_b64decode(session_id.encode()).decode())
+        except Exception:
+            return None
+
+    def _load(self, db, otp_id: int):
+        return (
+            db.query(
+                OtpChallenge.otp_hash, OtpChallenge.expires_at, OtpChallenge.attempts,
+                OtpChallenge.max_attempts, OtpChallenge.consumed, OtpChallenge.user_assignment_id,
+                OtpChallenge.created_at, OtpChallenge.last_sent_at, OtpChallenge.client_key,
+                User.user_id, User.name, User.email_id,
+            )
+            .join(UserAssignment, UserAssignment.user_assignment_id == OtpChallenge.user_assignment_id)
+            .join(User, User.user_id == UserAssignment.user_id)
+            .filter(OtpChallenge.otp_id == otp_id)
+            .with_for_update()
+            .first()
+        )
+
+    @staticmethod
+    def _challenge(row, attempts: int) -> Challenge:
+        return Challenge(
+            user_assignment_id=row.user_assignment_id,
+            user_id=row.user_id,
+            user_name=row.name,
+            email_id=row.email_id,
+            otp_hash=row.otp_hash,
+            expires_at=_epoch(row.expires_at),
+            max_attempts=row.max_attempts,
+            attempts=attempts,
+            created_at=_epoch(row.created_at),
+            last_sent_at=_epoch(row.last_sent_at or row.created_at),
+            client_key=row.client_key,
+        )
+
+    def create(self, db, challenge: Challenge) -> str:
+        now = datetime.utcnow()
+        row = OtpChallenge(
+            user_assignment_id=challenge.user_assignment_id,
+            otp_hash=challenge.otp_hash,
+            expires_at=datetime.utcfromtimestamp(challenge.expires_at),
+            attempts=0,
+            max_attempts=challenge.max_attempts,
+            consumed=False,
+            created_at=now,
+            last_sent_at=now,
+            client_key=challenge.client_key,
+        )
+        db.add(row)
+        db.flush()  # assigns otp_id
+        return self._session_id(row.otp_id)
+
+    def verify(self, db, session_id: str, otp_hash: str):
+        otp_id = self._otp_id(session_id)
+        row = self._load(db, otp_id) if otp_id is not None else None
+        if row is None:
+            return NOT_FOUND, None
+        if row.consumed:
+            return CONSUMED, None
+        if row.attempts >= row.max_attempts:
+            return TOO_MANY_ATTEMPTS, None
+
+        challenge = self._challenge(row, row.attempts + 1)
+        outcome = _check(challenge, otp_hash, time.time())
+        if outcome == EXPIRED:
+            return EXPIRED, None
+        values = {"attempts": OtpChallenge.attempts + 1}
+        if outcome == VERIFIED:
+            values["consumed"] = True
+        db.execute(update(OtpChallenge).where(OtpChallenge.otp_id == otp_id).values(**values))
+        return outcome, challenge
+
+    def find_live(self, db, user_assignment_id: int, client_key: str | None, window_seconds: float):
+        if client_key is None:
+            return None
+        now = datetime.utcnow()
+        otp_id = (
+            db.query(OtpChallenge.otp_id)
+            .filter(
+                OtpChallenge.user_assignment_id == user_assignment_id,
+                OtpChallenge.client_key == client_key,
+                OtpChallenge.consumed == False,
+                OtpChallenge.created_at >= now - timedelta(seconds=window_seconds),
+                OtpChallenge.expires_at > now,
+                OtpChallenge.attempts < OtpChallenge.max_attempts,
+            )
+            .order_by(OtpChallenge.otp_id.desc())
+            .limit(1)
+            .scalar()
+        )
+        return self._session_id(otp_id) if otp_id is not None else None
+
+    def resend(self, db, session_id: str, otp_hash: str, ttl_seconds: float, cooldown_seconds: float):
+        otp_id = self._otp_id(session_id)
+        row = self._load(db, otp_id) if otp_id is not None else None
+        if row is None:
+            return NOT_FOUND, None
+        if row.consumed:
+            return CONSUMED, None
+        if row.attempts >= row.max_attempts:
+            return TOO_MANY_ATTEMPTS, None
+        now = datetime.utcnow()
+        if row.expires_at <= now:
+            return NOT_FOUND, None
+        challenge = self._challenge(row, row.attempts)
+        # Cooldown and expiry enforced in the UPDATE itself, so racing resends send
+        # one mail and none of them revives a challenge that expired meanwhile
+        sent_before = now - timedelta(seconds=cooldown_seconds)
+        result = db.execute(
+            update(OtpChallenge)
+            .where(
+                OtpChallenge.otp_id == otp_id,
+                OtpChallenge.expires_at > now,
+                func.coalesce(OtpChallenge.last_sent_at, OtpChallenge.created_at) <= sent_before,
+            )
+            .values(otp_hash=otp_hash, expires_at=now + timedelta(seconds=ttl_seconds), last_sent_at=now)
+        )
+        if result.rowcount == 0:
+            expired = db.query(OtpChallenge.otp_id).filter(
+                OtpChallenge.otp_id == otp_id, OtpChallenge.expires_at > now
+            ).first() is None
+            return (NOT_FOUND, None) if expired else (COOLDOWN, challenge)
+        challenge.otp_hash = otp_hash
+        challenge.expires_at = _epoch(now) + ttl_seconds
+        challenge.last_sent_at = _epoch(now)
+        return RESENT, challenge
+
+
+# ------------------ Memory ------------------
+
+class MemoryChallengeStore(ChallengeStore):
+    """Challenges in a process-local TTL map: no database work at all.
+
+    Only correct when initiate and verify reach the same process (a single
+    worker, or sticky sessions); otherwise use the redis store.
+    """
+
+    def __init__(self):
+        self._challenges = {}
+        self._by_assignment = {}   # (user_assignment_id, client_key) -> latest session id
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def create(self, db, challenge: Challenge) -> str:
+        session_id = secrets.token_urlsafe(24)
+        with self._lock:
+            self._sweep(time.time())
+            self._challenges[session_id] = challenge
+            if challenge.client_key is not None:
+                self._by_assignment[challenge.user_assignment_id, challenge.client_key] = session_id
+        return session_id
+
+    def verify(self, db, session_id: str, otp_hash: str):
+        now = time.time()
+        with self._lock:
+            challenge = self._challenges.get(session_id)
+            if challenge is None:
+                return NOT_FOUND, None
+            challenge.attempts += 1
+            outcome = _check(challenge, otp_hash, now)
+            if outcome in (VERIFIED, EXPIRED):
+                self._drop(session_id)
+        return outcome, (challenge if outcome in (VERIFIED, INVALID) else None)
+
+    def find_live(self, db, user_assignment_id: int, client_key: str | None, window_seconds: float):
+        if client_key is None:
+            return None
+        with self._lock:
+            session_id = self._by_assignment.get((user_assignment_id, client_key))
+            challenge = self._challenges.get(session_id)
+            if challenge is not None and challenge.is_live(time.time(), window_seconds):
+                return session_id
+        return None
+
+    def resend(self, db, session_id: str, otp_hash: str, ttl_seconds: float, cooldown_seconds: float):
+        now = time.time()
+        with self._lock:
+            challenge = self._challenges.get(session_id)
+            if challenge is None or now > challenge.expires_at:
+                return NOT_FOUND, None
+            if challenge.attempts >= challenge.max_attempts:
+                return TOO_MANY_ATTEMPTS, None
+            if now - challenge.last_sent_at < cooldown_seconds:
+                return COOLDOWN, challenge
+            challenge.otp_hash = otp_hash
+            challenge.expires_at = now + ttl_seconds
+            challenge.last_sent_at = now
+        return RESENT, challenge
+
+    def _drop(self, session_id: str):
+        challenge = self._challenges.pop(session_id)
+        key = (challenge.user_assignment_id, challenge.client_key)
+        if self._by_assignment.get(key) == session_id:
+            del self._by_assignment[key]
+
+    def _sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + OTP_MEMORY_SWEEP_SECONDS
+        for session_id in [sid for sid, c in self._challenges.items() if c.expires_at < now]:
+            self._drop(session_id)
+
+    def __len__(self):
+        return len(self._challenges)
+
+
+# ------------------ Redis ------------------
+
+class RedisChallengeStore(ChallengeStore):
+    """Challenges as Redis hashes with a TTL, shared by every worker.
+
+    HINCRBY counts attempts atomically, DEL decides which of two concurrent
+    correct answers consumes the challenge, and a SET NX key with the
+    cooldown as TTL lets only one resend through.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("OTP_STORE=redis needs the redis package installed")
+        self._redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _keys(session_id: str):
+        return OTP_REDIS_PREFIX + session_id, f"{OTP_REDIS_PREFIX}cooldown:{session_id}"
+
+    @staticmethod
+    def _assignment_key(user_assignment_id: int, client_key: str) -> str:
+        return f"{OTP_REDIS_PREFIX}assignment:{user_assignment_id}:{client_key}"
+
+    @staticmethod
+    def _challenge(fields, attempts: int) -> Challenge:
+        return Challenge(
+            user_assignment_id=int(fields[b"user_assignment_id"]),
+            user_id=int(fields[b"user_id"]),
+            user_name=fields[b"user_name"].decode(),
+            email_id=fields[b"email_id"].decode(),
+            otp_hash=fields[b"otp_hash"].decode(),
+            expires_at=float(fields[b"expires_at"]),
+            max_attempts=int(fields[b"max_attempts"]),
+            attempts=attempts,
+            created_at=float(fields[b"created_at"]),
+            last_sent_at=float(fields[b"last_sent_at"]),
+            client_key=fields.get(b"client_key", b"").decode() or None,
+        )
+
+    def create(self, db, challenge: Challenge) -> str:
+        session_id = secrets.token_urlsafe(24)
+        key, _ = self._keys(session_id)
+        ttl_ms = max(1, int((challenge.expires_at - time.time()) * 1000))
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={
+            "user_assignment_id": challenge.user_assignment_id,
+            "user_id": challenge.user_id,
+            "user_name": challenge.user_name or "",
+            "email_id": challenge.email_id or "",
+            "otp_hash": challenge.otp_hash,
+            "expires_at": challenge.expires_at,
+            "max_attempts": challenge.max_attempts,
+            "attempts": 0,
+            "created_at": challenge.created_at,
+            "last_sent_at": challenge.last_sent_at,
+            "client_key": challenge.client_key or "",
+        })
+        pipe.pexpire(key, ttl_ms)
+        if challenge.client_key is not None:
+            pipe.set(self._assignment_key(challenge.user_assignment_id, challenge.client_key), session_id, px=ttl_ms)
+        pipe.execute()
+        return session_id
+
+    def verify(self, db, session_id: str, otp_hash: str):
+        key, _ = self._keys(session_id)
+        pipe = self._redis.pipeline()
+        pipe.hincrby(key, "attempts", 1)
+        pipe.hgetall(key)
+        attempts, fields = pipe.execute()
+        if not fields or b"otp_hash" not in fields:
+            # HINCRBY on a missing key created a stray hash: drop it
+            self._redis.delete(key)
+            return NOT_FOUND, None
+        challenge = self._challenge(fields, attempts)
+        outcome = _check(challenge, otp_hash, time.time())
+        if outcome == VERIFIED and not self._redis.delete(key):
+            return CONSUMED, None
+        return outcome, (challenge if outcome in (VERIFIED, INVALID) else None)
+
+    def find_live(self, db, user_assignment_id: int, client_key: str | None, window_seconds: float):
+        if client_key is None:
+            return None
+        session_id = self._redis.get(self._assignment_key(user_assignment_id, client_key))
+        if session_id is None:
+            return None
+        session_id = session_id.decode()
+        fields = self._redis.hgetall(self._keys(session_id)[0])
+        if not fields or b"otp_hash" not in fields:
+            return None
+        challenge = self._challenge(fields, int(fields[b"attempts"]))
+        return session_id if challenge.is_live(time.time(), window_seconds) else None
+
+    def resend(self, db, session_id: str, otp_hash: str, ttl_seconds: float, cooldown_seconds: float):
+        key, cooldown_key = self._keys(session_id)
+        fields = self._redis.hgetall(key)
+        if not fields or b"otp_hash" not in fields:
+            return NOT_FOUND, None
+        challenge = self._challenge(fields, int(fields[b"attempts"]))
+        now = time.time()
+        if now > challenge.expires_at:
+            return NOT_FOUND, None
+        if challenge.attempts >= challenge.max_attempts:
+            return TOO_MANY_ATTEMPTS, None
+        # The first send counts too: the gate opens cooldown_seconds after it
+        gate_ms = int((cooldown_seconds - (now - challenge.last_sent_at)) * 1000)
+        if gate_ms > 0 or not self._redis.set(cooldown_key, 1, nx=True, px=max(1, int(cooldown_seconds * 1000))):
+            return COOLDOWN, challenge
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={"otp_hash": otp_hash, "expires_at": now + ttl_seconds, "last_sent_at": now})
+        pipe.pexpire(key, int(ttl_seconds * 1000))
+        pipe.execute()
+        challenge.otp_hash = otp_hash
+        challenge.expires_at = now + ttl_seconds
+        challenge.last_sent_at = now
+        return RESENT, challenge
+
+
+def make_challenge_store(kind: str, redis_url: str = "") -> ChallengeStore:
+    if kind == "sql":
+        return SqlChallengeStore()
+    if kind == "memory":
+        return MemoryChallengeStore()
+    if kind == "redis":
+        if not redis_url:
+            raise RuntimeError("OTP_STORE=redis needs OTP_REDIS_URL")
+        return RedisChallengeStore(redis_url)
+    raise ValueError(f"Unknown OTP store: {kind}")
+
+
+def new_challenge(user_assignment_id: int, user_id: int, user_name: str, email_id: str, otp_hash: str,
+                  ttl_seconds: int, max_attempts: int, client_key: str | None = None) -> Challenge:
+    now = time.time()
+    return Challenge(
+        user_assignment_id=user_assignment_id,
+        user_id=user_id,
+        user_name=user_name,
+        email_id=email_id,
+        otp_hash=otp_hash,
+        expires_at=now + ttl_seconds,
+        max_attempts=max_attempts,
+        created_at=now,
+        last_sent_at=now,
+        client_key=client_key,
+    )
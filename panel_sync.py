@@ -0,0 +1,659 @@
+# panel_sync.py
+import ctypes
+import ctypes.util
+import logging
+import os
+import secrets
+import select
+import struct
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from dashboard_metrics import lock_counter
+from models import DashboardCounter, PanelMaster, FileMeta
+import scanner
+from file_server import guess_media_type
+
+logger = logging.getLogger(__name__)
+
+SYNC_DEBOUNCE_SECONDS = 1.0       # let bursts of copies settle before syncing
+SYNC_POLL_SECONDS = 10.0          # directory mtime polling interval (fallback mode)
+SYNC_FULL_RESCAN_SECONDS = 3600   # safety-net full rescan, also covers missed inotify events
+SYNC_LEASE_KEY = "panel_sync:owner"
+SYNC_LEASE_SECONDS = 60           # a worker that stops renewing loses the watcher to another after this
+SYNC_LEASE_RENEW_SECONDS = 15     # renewal by the holder, and how often the others try to take over
+SYNC_VERSION_KEY = "panel_sync:version"
+SYNC_VERSION_POLL_SECONDS = 2.0   # how often every worker reads the version to hear about other workers' syncs
+
+# inotify(7) constants
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+ROOT_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+PANEL_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ATTRIB | IN_ONLYDIR
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+# ------------------ Reconciliation ------------------
+
+RECONCILE_CHUNK_SIZE = 500   # ids per UPDATE ... WHERE id IN (...)
+RECONCILE_RETRIES = 3        # retries when a concurrent sync inserted the same rows
+
+
+@dataclass
+class SyncReport:
+    panels_scanned: int = 0
+    panels_added: int = 0
+    panels_deleted: int = 0
+    panels_reactivated: int = 0
+    files_added: int = 0
+    files_deleted: int = 0
+    files_reactivated: int = 0
+    files_updated: int = 0
+    files_hashed: int = 0
+    scan_ms: float = 0.0
+    load_ms: float = 0.0
+    hash_ms: float = 0.0
+    apply_ms: float = 0.0
+    total_ms: float = 0.0
+    version: int = 0              # SYNC_VERSION_KEY after this sync committed
+
+    @property
+    def changed(self) -> bool:
+        return any((
+            self.panels_added, self.panels_deleted, self.panels_reactivated,
+            self.files_added, self.files_deleted, self.files_reactivated, self.files_updated,
+        ))
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class _DbFile(NamedTuple):
+    file_meta_id: int
+    is_deleted: bool
+    file_size: int | None
+    file_mtime: float | None
+    content_hash: str | None
+
+
+def scan_disk(base_dir: str, panel_names=None) -> dict:
+    """Return {panel_name: {file_name: FileRecord}} for the panel folders on disk."""
+    tree = scanner.scan_tree(base_dir, panel_names, with_stat=True)
+    return {panel_name: {f.name: f for f in files} for panel_name, files in tree.items()}
+
+
+def load_catalog(db: Session, panel_names=None) -> dict:
+    """Load panels and their files in one query.
+
+    Returns {panel_name: (panel_id, is_deleted, {file_name: _DbFile})}.
+    """
+    query = (
+        db.query(
+            PanelMaster.panel_id, PanelMaster.panel_name, PanelMaster.is_deleted,
+            FileMeta.file_meta_id, FileMeta.file_name, FileMeta.is_deleted,
+            FileMeta.file_size, FileMeta.file_mtime, FileMeta.content_hash,
+        )
+        .outerjoin(FileMeta, FileMeta.panel_id == PanelMaster.panel_id)
+    )
+    if panel_names is not None:
+        query = query.filter(PanelMaster.panel_name.in_(panel_names))
+
+    catalog = {}
+    for (panel_id, panel_name, panel_deleted, file_id, file_name, file_deleted,
+         file_size, file_mtime, content_hash) in query:
+        entry = catalog.get(panel_name)
+        if entry is None:
+            entry = catalog[panel_name] = (panel_id, bool(panel_deleted), {})
+        if file_id is not None:
+            entry[2][file_name] = _DbFile(file_id, bool(file_deleted), file_size, file_mtime, content_hash)
+    return catalog
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), RECONCILE_CHUNK_SIZE):
+        yield ids[i:i + RECONCILE_CHUNK_SIZE]
+
+
+def _set_deleted(db: Session, model, id_column, ids, is_deleted: bool):
+    for chunk in _chunks(ids):
+        db.execute(
+            update(model).where(id_column.in_(chunk)).values(is_deleted=is_deleted),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def _file_values(record, content_hash) -> dict:
+    return {
+        "file_size": record.size,
+        "file_mtime": record.mtime,
+        "mime_type": guess_media_type(record.name),
+        "content_hash": content_hash,
+    }
+
+
+def _hash_changed_files(base_dir: str, disk: dict, catalog: dict, hash_cache: dict, report: SyncReport):
+    """Hash files that are new or whose (size, mtime) no longer match the index."""
+    to_hash = []
+    for panel_name, actual_files in disk.items():
+        db_files = catalog[panel_name][2] if panel_name in catalog else {}
+        for fname, record in actual_files.items():
+            known = db_files.get(fname)
+            if (known is not None and known.content_hash
+                    and known.file_size == record.size and known.file_mtime == record.mtime):
+                continue
+            key = (panel_name, fname, record.size, record.mtime)
+            if key not in hash_cache:
+                to_hash.append((key, os.path.join(base_dir, panel_name, fname)))
+
+    if to_hash:
+        started = time.perf_counter()
+        digests = scanner.hash_files([path for _, path in to_hash])
+        for key, path in to_hash:
+            hash_cache[key] = digests.get(path)
+        report.files_hashed = len(to_hash)
+        report.hash_ms = (time.perf_counter() - started) * 1000
+
+
+def _apply_diff(db: Session, disk: dict, catalog: dict, hash_cache: dict, report: SyncReport):
+    panels_to_add = [name for name in disk if name not in catalog]
+    panels_to_delete = [catalog[name][0] for name in catalog if name not in disk and not catalog[name][1]]
+    panels_to_reactivate = [catalog[name][0] for name in disk if name in catalog and catalog[name][1]]
+
+    if panels_to_add:
+        db.execute(
+            PanelMaster.__table__.insert(),
+            [{"panel_name": name, "description": "", "is_deleted": False} for name in panels_to_add],
+        )
+        new_ids = dict(
+            db.query(PanelMaster.panel_name, PanelMaster.panel_id)
+            .filter(PanelMaster.panel_name.in_(panels_to_add))
+        )
+        for name in panels_to_add:
+            catalog[name] = (new_ids[name], False, {})
+
+    files_to_add = []
+    files_to_update = []
+    files_to_delete = []
+    files_to_reactivate = []
+    for panel_name, actual_files in disk.items():
+        panel_id, _, db_files = catalog[panel_name]
+        for fname, record in actual_files.items():
+            known = db_files.get(fname)
+            content_hash = hash_cache.get((panel_name, fname, record.size, record.mtime))
+            if known is None:
+                files_to_add.append({
+                    "panel_id": panel_id, "file_name": fname, "is_deleted": False,
+                    **_file_values(record, content_hash),
+                })
+                continue
+            if known.is_deleted:
+                files_to_reactivate.append(known.file_meta_id)
+            if content_hash is not None:
+                files_to_update.append({"b_file_meta_id": known.file_meta_id, **_file_values(record, content_hash)})
+        files_to_delete.extend(
+            known.file_meta_id for fname, known in db_files.items()
+            if not known.is_deleted and fname not in actual_files
+        )
+    # Files of panels that disappeared from disk are soft-deleted with them
+    for panel_name, (_, _, db_files) in catalog.items():
+        if panel_name not in disk:
+            files_to_delete.extend(known.file_meta_id for known in db_files.values() if not known.is_deleted)
+
+    if files_to_add:
+        db.execute(FileMeta.__table__.insert(), files_to_add)
+    if files_to_update:
+        table = FileMeta.__table__
+        db.execute(
+            table.update()
+            .where(table.c.file_meta_id == bindparam("b_file_meta_id"))
+            .values({key: bindparam(key) for key in ("file_size", "file_mtime", "mime_type", "content_hash")}),
+            files_to_update,
+        )
+    _set_deleted(db, PanelMaster, PanelMaster.panel_id, panels_to_delete, True)
+    _set_deleted(db, PanelMaster, PanelMaster.panel_id, panels_to_reactivate, False)
+    _set_deleted(db, FileMeta, FileMeta.file_meta_id, files_to_delete, True)
+    _set_deleted(db, FileMeta, FileMeta.file_meta_id, files_to_reactivate, False)
+
+    report.panels_added = len(panels_to_add)
+    report.panels_deleted = len(panels_to_delete)
+    report.panels_reactivated = len(panels_to_reactivate)
+    report.files_added = len(files_to_add)
+    report.files_updated = len(files_to_update)
+    report.files_deleted = len(files_to_delete)
+    report.files_reactivated = len(files_to_reactivate)
+
+
+def sync_panels_and_files(db: Session, base_dir: str, panel_names=None) -> SyncReport:
+    """Reconcile PanelMaster/FileMeta with the folders under base_dir.
+
+    The catalog is loaded in one query, diffed in memory and the inserts,
+    soft-deletes, reactivations and metadata updates are applied as bulk
+    statements in a single transaction. Size, mtime, MIME type and SHA-256
+    are recorded per file; only files whose (size, mtime) changed are
+    re-hashed. With panel_names set only those panels are looked at, which
+    is what the watcher uses to apply a handful of changed folders.
+
+    The unique keys on panel_master.panel_name and file_meta(panel_id,
+    file_name) (migration 2 in migrations.py) stop a concurrent sync in
+    another worker from creating duplicates; if one wins the race we roll
+    back and diff again.
+
+    A sync that changed anything bumps the SYNC_VERSION_KEY counter in the
+    same transaction, which is how the other workers learn about it.
+    """
+    started = time.perf_counter()
+    report = SyncReport()
+    disk = scan_disk(base_dir, panel_names)
+    report.panels_scanned = len(disk)
+    report.scan_ms = (time.perf_counter() - started) * 1000
+    hash_cache = {}
+
+    for attempt in range(RECONCILE_RETRIES):
+        load_started = time.perf_counter()
+        catalog = load_catalog(db, panel_names)
+        report.load_ms = (time.perf_counter() - load_started) * 1000
+
+        _hash_changed_files(base_dir, disk, catalog, hash_cache, report)
+
+        apply_started = time.perf_counter()
+        try:
+            _apply_diff(db, disk, catalog, hash_cache, report)
+            if report.changed:
+                version = lock_counter(db, SYNC_VERSION_KEY)
+                version.value += 1
+                version.updated_at = datetime.utcnow()
+                report.version = version.value
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if attempt == RECONCILE_RETRIES - 1:
+                raise
+            logger.info("Concurrent panel sync detected, retrying reconciliation")
+            continue
+        report.apply_ms = (time.perf_counter() - apply_started) * 1000
+        break
+
+    report.total_ms = (time.perf_counter() - started) * 1000
+    return report
+
+
+# ------------------ Watchers ------------------
+
+class _Inotify:
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self, timeout: float):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PanelSyncService:
+    """Keeps PanelMaster/FileMeta in step with PANEL_BASE_DIR in the background.
+
+    Changes are picked up through inotify where available, otherwise by polling
+    panel directory mtimes, and only the touched panels are re-synced. All syncs
+    go through one single-flight lock so concurrent callers never start
+    duplicate scans.
+
+    With several workers only the one holding the lease row in
+    dashboard_counter (SYNC_LEASE_KEY) watches, scans and hashes; the others
+    wait to take over if it stops renewing. sync_now() (the manual sync
+    endpoint) still runs in whichever worker is asked.
+
+    Every worker reads the SYNC_VERSION_KEY counter each
+    SYNC_VERSION_POLL_SECONDS and calls its listeners when another worker's
+    sync moved it, so caches such as the /panels catalog follow a change
+    within seconds wherever it was made.
+    """
+
+    def __init__(self, base_dir: str, session_factory, use_inotify: bool = True):
+        self.base_dir = base_dir
+        self.session_factory = session_factory
+        self.use_inotify = use_inotify
+        self.last_synced_at = None
+        self.last_report = None
+        self._listeners = []
+
+        self._sync_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = set()
+        self._full_pending = True
+        self._sync_seq = 0
+        self._dir_mtimes = {}
+        self._watches = {}
+        self._retry_at = 0.0
+        self._owner_id = secrets.randbits(62)
+        self._seen_version = None
+        self.leading = False
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---- public API ----
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="panel-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.leading:
+            self._release()
+
+    def add_listener(self, callback):
+        """Call callback(report) after every sync that changed the tables.
+
+        report is None when the sync ran in another worker.
+        """
+        self._listeners.append(callback)
+
+    def mark_dirty(self, panel_names=None):
+        with self._pending_lock:
+            if panel_names is None:
+                self._full_pending = True
+            else:
+                self._pending.update(panel_names)
+
+    def sync_now(self, full: bool = False):
+        """Run a sync unless one that started after this call already finished.
+
+        Returns the SyncReport of the sync that ran, or the last report when
+        the request was coalesced into a sync another caller just completed.
+        """
+        arrival_seq = self._sync_seq
+        if full:
+            self.mark_dirty()
+        with self._sync_lock:
+            if self._sync_seq > arrival_seq and not self._has_pending():
+                return self.last_report
+            self._sync_seq += 1
+            return self._sync_pending()
+
+    # ---- internals ----
+
+    def _has_pending(self) -> bool:
+        with self._pending_lock:
+            return self._full_pending or bool(self._pending)
+
+    def _sync_pending(self):
+        with self._pending_lock:
+            full, panels = self._full_pending, self._pending
+            self._full_pending, self._pending = False, set()
+        if not full and not panels:
+            return self.last_report
+
+        db = self.session_factory()
+        try:
+            # Directory mtimes from before the scan, so the poller still sees changes made during it
+            mtimes = self._snapshot_mtimes() if full else None
+            report = sync_panels_and_files(db, self.base_dir, None if full else panels)
+            if full:
+                self._dir_mtimes = mtimes
+            self.last_synced_at = time.time()
+            self.last_report = report
+            if report.changed:
+                logger.info("Panel sync applied: %s", report.as_dict())
+                # Listeners run after the commit, so they see any other worker's
+                # earlier sync as well and that version needs no second call
+                self._seen_version = report.version
+                self._notify(report)
+        except Exception:
+            db.rollback()
+            logger.exception("Panel sync failed")
+            self.mark_dirty(None if full else panels)
+            self._retry_at = time.monotonic() + SYNC_POLL_SECONDS
+        finally:
+            db.close()
+        return self.last_report
+
+    def _notify(self, report):
+        for callback in self._listeners:
+            try:
+                callback(report)
+            except Exception:
+                logger.exception("Panel sync listener failed")
+
+    def _check_version(self):
+        """Call the listeners if another worker's sync moved SYNC_VERSION_KEY since the last look."""
+        db = self.session_factory()
+        try:
+            version = (
+                db.query(DashboardCounter.value)
+                .filter(DashboardCounter.metric_key == SYNC_VERSION_KEY)
+                .scalar()
+            ) or 0
+        except Exception:
+            logger.warning("Could not read the panel sync version", exc_info=True)
+            return
+        finally:
+            db.close()
+        if self._seen_version is not None and version != self._seen_version:
+            self._notify(None)
+        self._seen_version = version
+
+    def _claim(self) -> bool:
+        """Take or renew the lease on watching the tree; False while another worker holds it."""
+        db = self.session_factory()
+        try:
+            row = lock_counter(db, SYNC_LEASE_KEY)
+            now = datetime.utcnow()
+            held_elsewhere = (
+                row.value not in (0, self._owner_id)
+                and row.updated_at is not None
+                and now - row.updated_at < timedelta(seconds=SYNC_LEASE_SECONDS)
+            )
+            if not held_elsewhere:
+                row.value, row.updated_at = self._owner_id, now
+            db.commit()
+            self.leading = not held_elsewhere
+            return self.leading
+        except IntegrityError:
+            db.rollback()  # another worker created the lease row first
+            return False
+        finally:
+            db.close()
+
+    def _release(self):
+        db = self.session_factory()
+        try:
+            row = lock_counter(db, SYNC_LEASE_KEY)
+            if row.value == self._owner_id:
+                row.value, row.updated_at = 0, datetime.utcnow()
+            db.commit()
+            self.leading = False
+        except Exception:
+            db.rollback()
+            logger.warning("Could not release the panel sync lease", exc_info=True)
+        finally:
+            db.close()
+
+    def _snapshot_mtimes(self) -> dict:
+        return {panel.name: panel.mtime_ns for panel in scanner.list_panels(self.base_dir)}
+
+    def _poll_changes(self):
+        current = self._snapshot_mtimes()
+        previous = self._dir_mtimes
+        changed = {name for name, mtime in current.items() if previous.get(name) != mtime}
+        changed |= set(previous) - set(current)
+        self._dir_mtimes = current
+        if changed:
+            self.mark_dirty(changed)
+
+    def _open_inotify(self):
+        if not self.use_inotify:
+            return None
+        try:
+            watcher = _Inotify()
+        except (OSError, AttributeError, TypeError):
+            logger.info("inotify unavailable, polling %s every %ss", self.base_dir, SYNC_POLL_SECONDS)
+            return None
+        try:
+            self._watches = {watcher.add_watch(self.base_dir, ROOT_WATCH_MASK): None}
+            for panel in scanner.list_panels(self.base_dir):
+                self._watch_panel(watcher, panel.name)
+        except OSError:
+            logger.warning("inotify watch setup failed, falling back to polling", exc_info=True)
+            watcher.close()
+            return None
+        return watcher
+
+    def _watch_panel(self, watcher, panel_name):
+        wd = watcher.add_watch(os.path.join(self.base_dir, panel_name), PANEL_WATCH_MASK)
+        self._watches[wd] = panel_name
+
+    def _handle_events(self, watcher, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self.mark_dirty()
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches:
+                continue
+            panel_name = self._watches[wd]
+            if panel_name is None:
+                # Event on the base directory itself: a panel folder came or went
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self.mark_dirty()
+                    continue
+                if not name:
+                    continue
+                self.mark_dirty({name})
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_panel(watcher, name)
+                    except OSError:
+                        logger.warning("Could not watch panel %s", name, exc_info=True)
+            else:
+                self.mark_dirty({panel_name})
+
+    def _run(self):
+        next_claim = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() >= next_claim:
+                try:
+                    leading = self._claim()
+                except Exception:
+                    logger.warning("Could not claim the panel sync lease", exc_info=True)
+                    leading = False
+                if leading:
+                    logger.info("Watching %s in this worker", self.base_dir)
+                    self._watch()
+                next_claim = time.monotonic() + SYNC_LEASE_RENEW_SECONDS
+            self._check_version()
+            self._stop.wait(SYNC_VERSION_POLL_SECONDS)
+
+    def _watch(self):
+        # Watches first, then the full scan: whatever changes while it runs
+        # is queued as events (or newer mtimes) and synced right after
+        self.mark_dirty()
+        watcher = None
+        try:
+            watcher = self._open_inotify()
+        except OSError:
+            logger.exception("Could not read %s", self.base_dir)
+        self.sync_now()
+        next_full = time.monotonic() + SYNC_FULL_RESCAN_SECONDS
+        next_poll = time.monotonic() + SYNC_POLL_SECONDS
+        next_renew = time.monotonic() + SYNC_LEASE_RENEW_SECONDS
+        next_version = time.monotonic() + SYNC_VERSION_POLL_SECONDS
+
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() >= next_version:
+                    # Manual syncs run in whichever worker was asked
+                    next_version = time.monotonic() + SYNC_VERSION_POLL_SECONDS
+                    self._check_version()
+
+                if time.monotonic() >= next_renew:
+                    next_renew = time.monotonic() + SYNC_LEASE_RENEW_SECONDS
+                    try:
+                        if not self._claim():
+                            logger.warning("Panel sync lease taken over by another worker")
+                            return
+                    except Exception:
+                        # Nobody else can take it over while the database is unreachable either
+                        logger.warning("Could not renew the panel sync lease", exc_info=True)
+
+                if watcher:
+                    self._handle_events(watcher, watcher.read_events(1.0))
+                else:
+                    self._stop.wait(1.0)
+                    if time.monotonic() >= next_poll:
+                        next_poll = time.monotonic() + SYNC_POLL_SECONDS
+                        try:
+                            self._poll_changes()
+                        except OSError:
+                            logger.exception("Could not poll %s", self.base_dir)
+
+                if time.monotonic() >= next_full:
+                    next_full = time.monotonic() + SYNC_FULL_RESCAN_SECONDS
+                    self.mark_dirty()
+
+                if self._has_pending() and time.monotonic() >= self._retry_at:
+                    # Debounce: keep draining events until the burst settles
+                    deadline = time.monotonic() + SYNC_DEBOUNCE_SECONDS
+                    while watcher and time.monotonic() < deadline and not self._stop.is_set():
+                        self._handle_events(watcher, watcher.read_events(max(0.0, deadline - time.monotonic())))
+                    if not watcher:
+                        self._stop.wait(SYNC_DEBOUNCE_SECONDS)
+                    self.sync_now()
+        finally:
+            if watcher:
+                watcher.close()
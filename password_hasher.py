@@ -0,0 +1,114 @@
+# password_hasher.py
+# Kept free of app imports: worker processes (spawned) import only this module.
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+PASSWORD_WORKERS = max(1, min(2, (os.cpu_count() or 2) - 1))
+PASSWORD_MAX_PENDING = 16         # hashes running or queued; more are refused rather than queued
+BCRYPT_ROUNDS = 12
+
+_contexts = {}
+
+
+class PasswordPoolBusy(Exception):
+    pass
+
+
+def crypt_context(rounds: int = BCRYPT_ROUNDS) -> CryptContext:
+    # min == max == rounds: a hash made with any other cost "needs update", so
+    # raising (or lowering) BCRYPT_ROUNDS rehashes each password at its next login
+    context = _contexts.get(rounds)
+    if context is None:
+        context = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+    return context
+
+
+def verify_and_update(password: str, hashed: str, rounds: int = BCRYPT_ROUNDS):
+    """(matches, new_hash); new_hash is set when the stored hash uses other cost parameters."""
+    try:
+        return crypt_context(rounds).verify_and_update(password, hashed)
+    except ValueError:  # not a hash this context knows
+        return False, None
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+class PasswordHasher:
+    """bcrypt on a small dedicated process pool, so a burst of logins cannot
+    take the request threads (or the GIL) away from other endpoints.
+
+    At most max_pending calls run or wait at once; past that PasswordPoolBusy
+    is raised immediately, so a login storm is shed instead of queued.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._pool = None
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs background threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+            try:
+                future = self._get_pool().submit(fn, *args)
+            except Exception:
+                self._pending -= 1
+                raise
+        pool = self._pool
+        future.add_done_callback(lambda done: self._done(done, pool))
+        return future
+
+    def _done(self, future, pool):
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool) and self._pool is pool:
+                self._pool = None  # a worker died; the next call starts a fresh pool
+
+    async def verify_and_update(self, password: str, hashed: str):
+        return await asyncio.wrap_future(self._submit(verify_and_update, password, hashed, self.rounds))
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(hash_password, password, self.rounds))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.max_workers, "pending": self._pending,
+                    "max_pending": self.max_pending, "rejected": self._rejected}
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
@@ -0,0 +1,141 @@
+# qr_images.py
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from qr_render import PNG_PROFILE, QrProfile, QrRenderer
+
+QR_CACHE_MAX_ENTRIES = 4096   # rendered PNGs are ~1-2 KB each
+QR_MIGRATION_BATCH_SIZE = 500
+
+
+def qr_key(url: str, profile: QrProfile = PNG_PROFILE) -> str:
+    return hashlib.sha256(f"{profile.cache_tag}:{url}".encode("utf-8")).hexdigest()[:32]
+
+
+def qr_etag(url: str, profile: QrProfile = PNG_PROFILE) -> str:
+    return f'"{qr_key(url, profile)}"'
+
+
+class QrImageCache:
+    """Lazily rendered QR images, kept in an in-memory LRU and optionally on disk."""
+
+    def __init__(self, cache_dir: str = "", max_entries: int = QR_CACHE_MAX_ENTRIES, renderer: QrRenderer | None = None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.renderer = renderer or QrRenderer()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, url: str, profile: QrProfile = PNG_PROFILE) -> bytes:
+        key = qr_key(url, profile)
+        image = self._lookup(key, profile)
+        if image is None:
+            # Encoding holds the GIL for milliseconds: do it on the renderer's pool
+            image = self.renderer.render_one(url, profile)
+            self._store(key, profile, image)
+        return image
+
+    def warm(self, urls, profile: QrProfile = PNG_PROFILE):
+        """Render every URL not cached yet as one batch on the process pool."""
+        missing = {}
+        for url in urls:
+            key = qr_key(url, profile)
+            if self._lookup(key, profile) is None:
+                missing[key] = url
+        if not missing:
+            return
+        for key, image in zip(missing, self.renderer.render_batch(missing.values(), profile)):
+            self._store(key, profile, image)
+
+    def _lookup(self, key: str, profile: QrProfile):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+        image = self._read_disk(key, profile)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def _store(self, key: str, profile: QrProfile, image: bytes):
+        self._write_disk(key, profile, image)
+        self._remember(key, image)
+
+    def _remember(self, key: str, image: bytes):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str, profile: QrProfile) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{profile.fmt}")
+
+    def _read_disk(self, key: str, profile: QrProfile):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key, profile), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, profile: QrProfile, image: bytes):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key, profile)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(image)
+        os.replace(tmp_path, path)
+
+
+def migrate_qr_blobs(db, batch_size: int = QR_MIGRATION_BATCH_SIZE) -> int:
+    """Clear the legacy PNG blobs from user_assignment in bounded batches.
+
+    Images are regenerated on demand from secret_code with the same
+    parameters (PNG_PROFILE), so the stored bytes are redundant. Returns the rows cleared.
+    """
+    from models import UserAssignment
+
+    cleared = 0
+    while True:
+        ids = [
+            row.user_assignment_id for row in
+            db.query(UserAssignment.user_assignment_id)
+            .filter(UserAssignment.qr_code.isnot(None))
+            .limit(batch_size)
+        ]
+        if not ids:
+            return cleared
+        db.query(UserAssignment).filter(UserAssignment.user_assignment_id.in_(ids)).update(
+            {UserAssignment.qr_code: None}, synchronize_session=False
+        )
+        db.commit()
+        cleared += len(ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QR image maintenance")
+    parser.add_argument("--migrate", action="store_true", help="clear legacy user_assignment.qr_code blobs")
+    parser.add_argument("--batch-size", type=int, default=QR_MIGRATION_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.migrate:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            print(f"Cleared {migrate_qr_blobs(db, args.batch_size)} QR blobs.")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
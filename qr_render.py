@@ -0,0 +1,133 @@
+# qr_render.py
+# Kept free of app imports: worker processes (spawned) import only this module.
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+
+import qrcode
+import qrcode.constants
+
+QR_RENDER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+QR_RENDER_CHUNK_SIZE = 8          # URLs per task sent to a worker
+QR_RENDER_POOL_MIN_BATCH = 4      # smaller batches render inline, IPC costs more than they do
+
+ERROR_CORRECTION = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+@dataclass(frozen=True)
+class QrProfile:
+    fmt: str = "png"               # "png" or "svg"
+    box_size: int = 10             # pixels per module (png)
+    border: int = 4                # quiet zone, in modules
+    error_correction: str = "M"    # L / M / Q / H
+    mask_pattern: int | None = None  # 0-7 skips scoring all eight masks (most of the encode cost)
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.fmt]
+
+    @property
+    def cache_tag(self) -> str:
+        return f"{self.fmt}:{self.box_size}:{self.border}:{self.error_correction}:{self.mask_pattern}"
+
+
+# Matches the PNGs that used to be stored in user_assignment.qr_code
+PNG_PROFILE = QrProfile()
+# New format, no legacy images to match: a fixed mask is still a valid QR code
+SVG_PROFILE = QrProfile(fmt="svg", mask_pattern=0)
+
+
+def _svg(modules, border: int) -> bytes:
+    # One path of horizontal runs: no PIL, no XML tree, no compression
+    size = len(modules) + 2 * border
+    parts = []
+    for y, row in enumerate(modules):
+        x = 0
+        width = len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                parts.append(f"M{start + border} {y + border}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path fill="#000" d="{"".join(parts)}"/></svg>'
+    ).encode("ascii")
+
+
+def render(url: str, profile: QrProfile = PNG_PROFILE) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION[profile.error_correction],
+        box_size=profile.box_size,
+        border=profile.border,
+        mask_pattern=profile.mask_pattern,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    if profile.fmt == "svg":
+        return _svg(qr.modules, profile.border)
+    img = qr.make_image(fill_color="black", back_color="white")
+    byte_stream = BytesIO()
+    img.save(byte_stream, format='PNG')
+    return byte_stream.getvalue()
+
+
+def _render_chunk(urls, profile):
+    return [render(url, profile) for url in urls]
+
+
+class QrRenderer:
+    """Renders QR codes on a small process pool, off the request threads."""
+
+    def __init__(self, max_workers: int = QR_RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs background threads is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def render_one(self, url: str, profile: QrProfile = PNG_PROFILE) -> bytes:
+        """One QR code rendered on the pool; the request thread only waits for the bytes."""
+        if self.max_workers <= 1:
+            return render(url, profile)
+        return self._get_pool().submit(render, url, profile).result()
+
+    def render_batch(self, urls, profile: QrProfile = PNG_PROFILE) -> list:
+        urls = list(urls)
+        if len(urls) < QR_RENDER_POOL_MIN_BATCH or self.max_workers <= 1:
+            return _render_chunk(urls, profile)
+        chunks = [urls[i:i + QR_RENDER_CHUNK_SIZE] for i in range(0, len(urls), QR_RENDER_CHUNK_SIZE)]
+        pool = self._get_pool()
+        results = []
+        for rendered in pool.map(_render_chunk, chunks, [profile] * len(chunks)):
+            results.extend(rendered)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
@@ -0,0 +1,176 @@
+# rate_limit.py
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_MAX_KEYS = 100000       # buckets kept by the memory limiter; least recently used go first
+RATE_LIMIT_REDIS_PREFIX = "rl:"
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket: up to capacity requests at once, refilled at per_second."""
+    name: str
+    capacity: float
+    per_second: float
+
+
+# Per client IP the limits allow a few people behind one NAT; per QR secret /
+# OTP session they only allow what a real person scanning would do
+QR_INITIATE_PER_IP = RateLimit("initiate:ip", 20, 20 / 60)
+QR_INITIATE_PER_SECRET = RateLimit("initiate:secret", 5, 1 / 60)
+OTP_VERIFY_PER_IP = RateLimit("verify-otp:ip", 30, 30 / 60)
+OTP_VERIFY_PER_SESSION = RateLimit("verify-otp:session", 10, 1 / 30)
+OTP_RESEND_PER_SESSION = RateLimit("resend-otp:session", 3, 1 / 120)
+SECRET_CHECK_PER_IP = RateLimit("verify-secret:ip", 30, 30 / 60)
+SECRET_CHECK_PER_SECRET = RateLimit("verify-secret:secret", 10, 10 / 60)
+
+
+class RateLimiter(ABC):
+    """hit_all() takes one token from every (limit, key) bucket, or from none of them.
+
+    Returns 0 if allowed, else the seconds until every bucket has a token
+    again. A request refused by one bucket does not drain the others.
+    """
+
+    @abstractmethod
+    def hit_all(self, checks) -> float:
+        ...
+
+    def hit(self, limit: RateLimit, key: str) -> float:
+        return self.hit_all([(limit, key)])
+
+
+class NoRateLimiter(RateLimiter):
+    def hit_all(self, checks) -> float:
+        return 0.0
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Buckets in an LRU bounded to max_keys; per worker, so limits multiply by the worker count.
+
+    An evicted bucket comes back full, which only ever errs on the side of
+    letting a request through.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit_all(self, checks) -> float:
+        now = time.monotonic()
+        with self._lock:
+            refilled = []
+            retry_after = 0.0
+            for limit, key in checks:
+                bucket_key = (limit.name, key)
+                tokens, updated = self._buckets.pop(bucket_key, (limit.capacity, now))
+                tokens = min(limit.capacity, tokens + (now - updated) * limit.per_second)
+                if tokens < 1:
+                    retry_after = max(retry_after, (1 - tokens) / limit.per_second)
+                refilled.append((bucket_key, tokens))
+            taken = 1 if retry_after == 0 else 0
+            for bucket_key, tokens in refilled:
+                self._buckets[bucket_key] = (tokens - taken, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+# Refill every bucket and take a token from each only if all have one, in one
+# step on Redis' clock so every worker agrees. KEYS are the buckets, ARGV their
+# (capacity, rate) pairs. A bucket expires once it would be full again anyway
+_REDIS_HIT_ALL = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 't', 'ts')
+    local t = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    t = math.min(capacity, t + math.max(0, now - updated) * rate)
+    if t < 1 then
+        retry_after = math.max(retry_after, (1 - t) / rate)
+    end
+    tokens[i] = t
+end
+local taken = 0
+if retry_after == 0 then
+    taken = 1
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local rate = tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 't', tokens[i] - taken, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return tostring(retry_after)
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """Buckets shared by every worker. If Redis is unreachable requests are let through."""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package installed")
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._script = self._redis.register_script(_REDIS_HIT_ALL)
+
+    def hit_all(self, checks) -> float:
+        checks = list(checks)
+        try:
+            return float(self._script(
+                keys=[f"{RATE_LIMIT_REDIS_PREFIX}{limit.name}:{key}" for limit, key in checks],
+                args=[value for limit, _ in checks for value in (limit.capacity, limit.per_second)],
+            ))
+        except Exception:
+            logger.warning("Rate limiter unavailable, allowing %s", [limit.name for limit, _ in checks], exc_info=True)
+            return 0.0
+
+
+def make_rate_limiter(kind: str, redis_url: str = "") -> RateLimiter:
+    if kind == "memory":
+        return MemoryRateLimiter()
+    if kind == "redis":
+        if not redis_url:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs RATE_LIMIT_REDIS_URL")
+        return RedisRateLimiter(redis_url)
+    if kind == "off":
+        return NoRateLimiter()
+    raise ValueError(f"Unknown rate limiter: {kind}")
+
+
+def client_ip(request: Request, trust_forwarded: bool = False) -> str:
+    # Behind our reverse proxy the peer is the proxy; the last X-Forwarded-For
+    # entry is the address the proxy saw (earlier ones are client-supplied)
+    if trust_forwarded:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def enforce(limiter: RateLimiter, *checks):
+    """Take a token from every (limit, key) bucket at once; 429 with Retry-After if any is empty."""
+    retry_after = limiter.hit_all(checks)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, slow down",
+            headers={"Retry-After": f"{max(1, int(retry_after + 0.999))}"},
+        )
+
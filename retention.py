@@ -0,0 +1,191 @@
+# retention.py
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from dashboard_metrics import SCAN_HIGH_WATER_KEY, lock_counter
+from models import DashboardCounter, OtpChallenge, UserScanLog
+from scan_rollup import ROLLUP_HIGH_WATER_KEY
+
+logger = logging.getLogger(__name__)
+
+RETENTION_INTERVAL_SECONDS = 3600
+RETENTION_BATCH_SIZE = 5000       # rows per DELETE (and per archive segment)
+RETENTION_BATCH_PAUSE = 0.05      # seconds between batches, lets other writers in
+RETENTION_RUN_KEY = "retention:last_run"
+
+
+@dataclass
+class PurgeReport:
+    table: str
+    cutoff: str
+    rows: int = 0
+    first_id: int | None = None
+    last_id: int | None = None
+    archived_files: list = field(default_factory=list)
+    dry_run: bool = False
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _old_id_batches(db, id_col, time_col, cutoff: datetime, max_id: int, batch_size: int):
+    """Yield ascending id batches of rows older than cutoff, walking the primary key.
+
+    Rows are appended in time order, so the walk stops at the first row at
+    or after the cutoff and never needs an index on the time column. Rows
+    with no timestamp before that point count as old.
+    """
+    cursor = 0
+    while True:
+        rows = (
+            db.query(id_col, time_col)
+            .filter(id_col > cursor, id_col <= max_id)
+            .order_by(id_col)
+            .limit(batch_size)
+            .all()
+        )
+        ids = []
+        for row_id, moment in rows:
+            if moment is not None and moment >= cutoff:
+                if ids:
+                    yield ids
+                return
+            ids.append(row_id)
+        if not ids:
+            return
+        yield ids
+        cursor = ids[-1]
+
+
+def _write_segment(archive_dir: str, table: str, first_id: int, last_id: int, rows) -> str:
+    path = os.path.join(archive_dir, table, f"{table}-{first_id:012d}-{last_id:012d}.jsonl.gz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, default=str, separators=(",", ":")) + "\n")
+    # Durable before the rows are deleted
+    with open(tmp_path, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def purge_table(db, model, id_col, time_col, cutoff: datetime, max_id: int | None = None,
+                archive_dir: str = "", dry_run: bool = False, batch_size: int = RETENTION_BATCH_SIZE) -> PurgeReport:
+    """Delete (optionally archive first) rows older than cutoff in bounded batches, one commit each."""
+    report = PurgeReport(table=model.__tablename__, cutoff=cutoff.isoformat(), dry_run=dry_run)
+    if max_id is None:
+        max_id = db.query(id_col).order_by(id_col.desc()).limit(1).scalar() or 0
+    for ids in _old_id_batches(db, id_col, time_col, cutoff, max_id, batch_size):
+        report.rows += len(ids)
+        report.first_id = ids[0] if report.first_id is None else report.first_id
+        report.last_id = ids[-1]
+        if dry_run:
+            continue
+        if archive_dir:
+            rows = [
+                {column.name: getattr(row, column.name) for column in model.__table__.columns}
+                for row in db.query(model).filter(id_col.in_(ids)).order_by(id_col)
+            ]
+            report.archived_files.append(_write_segment(archive_dir, model.__tablename__, ids[0], ids[-1], rows))
+        db.execute(delete(model).where(id_col.in_(ids)))
+        db.commit()
+        time.sleep(RETENTION_BATCH_PAUSE)
+    db.commit()
+    return report
+
+
+def _folded_scan_log_id(db) -> int:
+    # Scan logs feed the dashboard counters and rollups; never delete what they have not counted yet
+    marks = dict(
+        db.query(DashboardCounter.metric_key, DashboardCounter.value)
+        .filter(DashboardCounter.metric_key.in_([SCAN_HIGH_WATER_KEY, ROLLUP_HIGH_WATER_KEY]))
+    )
+    return min(marks.get(SCAN_HIGH_WATER_KEY, 0), marks.get(ROLLUP_HIGH_WATER_KEY, 0))
+
+
+def run_retention(db, otp_days: int, scan_log_days: int, archive_dir: str = "", dry_run: bool = False) -> list:
+    """Apply the retention policy to otp_challenge and user_scan_log; 0 days keeps a table forever."""
+    now = datetime.utcnow()
+    reports = []
+    if otp_days > 0:
+        # expires_at is created_at + a fixed TTL, so it grows with otp_id like created_at does
+        reports.append(purge_table(
+            db, OtpChallenge, OtpChallenge.otp_id, OtpChallenge.expires_at, now - timedelta(days=otp_days),
+            dry_run=dry_run,
+        ))
+    if scan_log_days > 0:
+        reports.append(purge_table(
+            db, UserScanLog, UserScanLog.log_id, UserScanLog.scan_datetime, now - timedelta(days=scan_log_days),
+            max_id=_folded_scan_log_id(db), archive_dir=archive_dir, dry_run=dry_run,
+        ))
+    return reports
+
+
+class RetentionJob:
+    """Hourly retention run; with several workers only one runs per interval."""
+
+    def __init__(self, session_factory, otp_days: int, scan_log_days: int, archive_dir: str = "",
+                 interval: float = RETENTION_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.otp_days = otp_days
+        self.scan_log_days = scan_log_days
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.last_reports = []
+
+    def _claim(self, db) -> bool:
+        row = lock_counter(db, RETENTION_RUN_KEY)
+        now = int(time.time())
+        if now - row.value < self.interval / 2:
+            db.commit()
+            return False
+        row.value = now
+        row.updated_at = datetime.utcnow()
+        db.commit()
+        return True
+
+    def run(self):
+        db = self.session_factory()
+        try:
+            if not self._claim(db):
+                return
+            self.last_reports = run_retention(db, self.otp_days, self.scan_log_days, self.archive_dir)
+            for report in self.last_reports:
+                if report.rows:
+                    logger.info("Retention: deleted %d %s rows older than %s", report.rows, report.table, report.cutoff)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Purge old otp_challenge / user_scan_log rows")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted, change nothing")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    from settings import settings
+
+    db = SessionLocal()
+    try:
+        reports = run_retention(
+            db, settings.RETENTION_OTP_DAYS, settings.RETENTION_SCAN_LOG_DAYS,
+            settings.RETENTION_ARCHIVE_DIR, dry_run=args.dry_run,
+        )
+    finally:
+        db.close()
+    for report in reports:
+        verb = "would delete" if report.dry_run else "deleted"
+        print(f"{report.table}: {verb} {report.rows} rows older than {report.cutoff}"
+              f" (ids {report.first_id}..{report.last_id}), {len(report.archived_files)} archive segments")
+    if not reports:
+        print("Retention is disabled for every table (0 days).")
@@ -1,5 +1,6 @@
 from models import PanelMaster, FileMeta
-from database import SessionLocal
+from database import SessionLocal, get_engine
+from migrations import migrate
 
 def insert_sample_data():
     db = SessionLocal()
@@ -27,5 +28,6 @@ def insert_sample_data():
         db.close()
 
 if __name__ == "__main__":
+    migrate(get_engine())
     insert_sample_data()
     
\ No newline at end of file
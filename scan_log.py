@@ -0,0 +1,165 @@
+# scan_log.py
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import UserScanLog
+
+logger = logging.getLogger(__name__)
+
+SCAN_LOG_FLUSH_MS = 250          # flush at least this often...
+SCAN_LOG_BATCH_SIZE = 500        # ...or as soon as this many events are waiting
+SCAN_LOG_MAX_PENDING = 50000     # while the database is unreachable; oldest events are dropped beyond this
+SCAN_LOG_MAX_ATTEMPTS = 3        # a row the database rejects on its own is dropped after this many tries
+
+
+class ScanLogBuffer:
+    """Write-behind buffer for user_scan_log rows.
+
+    Request handlers call record(), which only appends to a list; a
+    background thread writes the events with one multi-row INSERT every
+    flush_ms or batch_size events. stop() flushes whatever is left, so the
+    app lifespan guarantees nothing is lost on a clean shutdown. Events
+    recorded in the last flush_ms before a crash are lost.
+
+    A batch the database rejects (DataError / IntegrityError) is split in
+    halves until the bad rows are isolated; the rest is written. Each bad
+    row is tried again on the next flushes and logged and dropped after
+    SCAN_LOG_MAX_ATTEMPTS. Any other error (database unreachable) puts the
+    unwritten events back in the queue.
+    """
+
+    def __init__(self, session_factory, flush_ms: int = SCAN_LOG_FLUSH_MS, batch_size: int = SCAN_LOG_BATCH_SIZE,
+                 max_pending: int = SCAN_LOG_MAX_PENDING):
+        self.session_factory = session_factory
+        self.flush_ms = flush_ms
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = []
+        self._rejected = []   # (event, attempts) for rows the database refused on their own
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scan-log", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Final scan log flush failed, %d events lost", len(self._pending))
+        if self._rejected:
+            logger.error("Dropping %d rejected scan log rows at shutdown: %s", len(self._rejected), self._rejected)
+
+    def record(self, user_assignment_id, verification_status: str, scanned_at: datetime | None = None):
+        event = {
+            "user_assignment_id": user_assignment_id,
+            "scan_datetime": scanned_at or datetime.utcnow(),
+            "verification_status": verification_status,
+        }
+        with self._cond:
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self) -> int:
+        """Write everything pending now; returns the number of rows inserted."""
+        with self._flush_lock:
+            inserted = self._retry_rejected()
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                inserted += self._write(batch)
+            return inserted
+
+    def _insert(self, rows) -> int:
+        db = self.session_factory()
+        try:
+            db.execute(UserScanLog.__table__.insert(), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.flushed += len(rows)
+        return len(rows)
+
+    def _write(self, batch) -> int:
+        inserted = 0
+        chunks = [batch]
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                inserted += self._insert(chunk)
+            except (DataError, IntegrityError) as exc:
+                if len(chunk) == 1:
+                    self._reject(chunk[0], 1, exc)
+                else:
+                    middle = len(chunk) // 2
+                    chunks += [chunk[middle:], chunk[:middle]]
+            except Exception:
+                self._requeue([event for part in [chunk] + chunks[::-1] for event in part])
+                raise
+        return inserted
+
+    def _retry_rejected(self) -> int:
+        rejected, self._rejected = self._rejected, []
+        inserted = 0
+        for i, (event, attempts) in enumerate(rejected):
+            try:
+                inserted += self._insert([event])
+            except (DataError, IntegrityError) as exc:
+                self._reject(event, attempts + 1, exc)
+            except Exception:
+                self._rejected[:0] = rejected[i:]
+                raise
+        return inserted
+
+    def _reject(self, event, attempts: int, exc: Exception):
+        if attempts < SCAN_LOG_MAX_ATTEMPTS:
+            self._rejected.append((event, attempts))
+            return
+        self.rejected += 1
+        logger.error("Dropping scan log row after %d attempts: %s (%s)", attempts, event, exc.orig)
+
+    def _requeue(self, batch):
+        with self._cond:
+            self._pending[:0] = batch
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+                logger.error("Scan log buffer full, dropped %d oldest events", overflow)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_ms / 1000)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Scan log flush failed, retrying")
+                self._stop.wait(1.0)
+
+    def __len__(self):
+        return len(self._pending)
+
@@ -0,0 +1,224 @@
+# scan_rollup.py
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import IntegrityError
+
+from dashboard_metrics import lock_counter
+from models import DashboardCounter, ScanRollupDaily, ScanRollupHourly, UserAssignment, UserScanLog
+
+ROLLUP_REFRESH_SECONDS = 60
+ROLLUP_CHUNK = 20000              # scan log rows folded per transaction
+ROLLUP_HIGH_WATER_KEY = "scan_rollup:high_water"
+
+BUCKETS = {"hour": ScanRollupHourly, "day": ScanRollupDaily}
+MAX_BUCKETS = 24 * 31             # longest series one request may ask for
+
+# verification_status values as written by the endpoints, grouped for the series
+STATUS_CATEGORIES = {
+    "qr_initiated": "initiated",
+    "otp_verified": "verified",
+    "1": "verified",              # /verify-secret success
+    "2": "failed",                # /verify-secret unknown code
+}
+CATEGORIES = ("initiated", "verified", "failed", "other")
+
+
+def truncate(moment: datetime, bucket: str) -> datetime:
+    if bucket == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _step(bucket: str) -> timedelta:
+    return timedelta(days=1) if bucket == "day" else timedelta(hours=1)
+
+
+def _add_counts(db, model, counts: Counter):
+    # Callers hold the high-water row lock, so nobody else writes rollups meanwhile
+    if not counts:
+        return
+    table = model.__table__
+    buckets = [key[0] for key in counts]
+    existing = {
+        (row.bucket_start, row.panel_id, row.user_id, row.verification_status): row.scan_count
+        for row in db.query(model).filter(model.bucket_start >= min(buckets), model.bucket_start <= max(buckets))
+    }
+    updates, inserts = [], []
+    for (bucket_start, panel_id, user_id, status), count in counts.items():
+        key = (bucket_start, panel_id, user_id, status)
+        if key in existing:
+            updates.append({"b": bucket_start, "p": panel_id, "u": user_id, "s": status, "n": existing[key] + count})
+        else:
+            inserts.append({"bucket_start": bucket_start, "panel_id": panel_id, "user_id": user_id,
+                            "verification_status": status, "scan_count": count})
+    if updates:
+        db.execute(
+            update(table)
+            .where(table.c.bucket_start == bindparam("b"), table.c.panel_id == bindparam("p"),
+                   table.c.user_id == bindparam("u"), table.c.verification_status == bindparam("s"))
+            .values(scan_count=bindparam("n")),
+            updates,
+        )
+    if inserts:
+        db.execute(table.insert(), inserts)
+
+
+def fold_scans(db, ceiling: int) -> int:
+    """Add scan logs with high-water < log_id <= ceiling to the hourly and daily rollups.
+
+    One transaction per chunk, under a lock on the high-water row, so the
+    rollups and the mark always move together. Returns the rows folded.
+    """
+    folded = 0
+    while True:
+        high_water = lock_counter(db, ROLLUP_HIGH_WATER_KEY)
+        start = high_water.value
+        if start >= ceiling:
+            db.commit()
+            return folded
+        rows = (
+            db.query(UserScanLog.log_id, UserScanLog.scan_datetime, UserScanLog.verification_status,
+                     UserAssignment.panel_id, UserAssignment.user_id)
+            .outerjoin(UserAssignment, UserAssignment.user_assignment_id == UserScanLog.user_assignment_id)
+            .filter(UserScanLog.log_id > start, UserScanLog.log_id <= ceiling)
+            .order_by(UserScanLog.log_id)
+            .limit(ROLLUP_CHUNK)
+            .all()
+        )
+        hourly, daily = Counter(), Counter()
+        for row in rows:
+            if row.scan_datetime is None:
+                continue
+            key = (row.panel_id or 0, row.user_id or 0, row.verification_status or "")
+            hourly[(truncate(row.scan_datetime, "hour"), *key)] += 1
+            daily[(truncate(row.scan_datetime, "day"), *key)] += 1
+        _add_counts(db, ScanRollupHourly, hourly)
+        _add_counts(db, ScanRollupDaily, daily)
+        high_water.value = rows[-1].log_id if len(rows) == ROLLUP_CHUNK else ceiling
+        high_water.updated_at = datetime.utcnow()
+        db.commit()
+        folded += len(rows)
+
+
+class ScanRollup:
+    """Keeps the rollup tables current; refresh() is run by a PeriodicJob."""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._seen_max_log_id = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> int:
+        with self._lock:
+            db = self.session_factory()
+            try:
+                max_log_id = db.query(func.max(UserScanLog.log_id)).scalar() or 0
+                # Same lag as dashboard_metrics: never pass an id an uncommitted batch may still fill
+                ceiling = max_log_id if self._seen_max_log_id is None else min(self._seen_max_log_id, max_log_id)
+                try:
+                    folded = fold_scans(db, ceiling)
+                except IntegrityError:
+                    db.rollback()  # another worker inserted the same rollup rows first
+                    folded = fold_scans(db, ceiling)
+                self._seen_max_log_id = max_log_id
+                return folded
+            finally:
+                db.close()
+
+
+def scan_series(db, start: datetime, end: datetime, bucket: str = "hour",
+                panel_id: int | None = None, user_id: int | None = None, group_by: str | None = None):
+    """Zero-filled per-bucket counts by status category for [start, end).
+
+    With group_by="panel" or "user" returns {group_id: series}, else one series.
+    """
+    model = BUCKETS[bucket]
+    first, step = truncate(start, bucket), _step(bucket)
+    query = (
+        db.query(model.bucket_start, model.panel_id, model.user_id, model.verification_status, model.scan_count)
+        .filter(model.bucket_start >= first, model.bucket_start < end)
+    )
+    if panel_id is not None:
+        query = query.filter(model.panel_id == panel_id)
+    if user_id is not None:
+        query = query.filter(model.user_id == user_id)
+
+    def empty_series():
+        series, moment = {}, first
+        while moment < end:
+            series[moment] = dict.fromkeys(CATEGORIES, 0)
+            moment += step
+        return series
+
+    groups = {}
+    for row in query:
+        group = row.panel_id if group_by == "panel" else row.user_id if group_by == "user" else None
+        if group not in groups:
+            groups[group] = empty_series()
+        category = STATUS_CATEGORIES.get(row.verification_status, "other")
+        groups[group][row.bucket_start][category] += row.scan_count
+
+    def as_list(series):
+        return [{"bucket_start": moment.isoformat(), **counts} for moment, counts in series.items()]
+
+    if group_by:
+        return {group: as_list(series) for group, series in sorted(groups.items())}
+    return as_list(groups.get(None) or empty_series())
+
+
+def verify_rollups(db, start: datetime, end: datetime, bucket: str = "day") -> list:
+    """Recount the raw scan log for [start, end) and compare it with the rollups.
+
+    Only meaningful for logs already folded in (log_id <= the high-water mark).
+    Returns the mismatching keys as (key, rollup_count, raw_count).
+    """
+    high_water = (
+        db.query(DashboardCounter.value).filter(DashboardCounter.metric_key == ROLLUP_HIGH_WATER_KEY).scalar() or 0
+    )
+    raw = Counter()
+    for row in (
+        db.query(UserScanLog.scan_datetime, UserScanLog.verification_status,
+                 UserAssignment.panel_id, UserAssignment.user_id)
+        .outerjoin(UserAssignment, UserAssignment.user_assignment_id == UserScanLog.user_assignment_id)
+        .filter(UserScanLog.log_id <= high_water, UserScanLog.scan_datetime >= truncate(start, bucket),
+                UserScanLog.scan_datetime < end)
+        .yield_per(ROLLUP_CHUNK)
+    ):
+        raw[(truncate(row.scan_datetime, bucket), row.panel_id or 0, row.user_id or 0,
+             row.verification_status or "")] += 1
+    model = BUCKETS[bucket]
+    rolled = Counter({
+        (row.bucket_start, row.panel_id, row.user_id, row.verification_status): row.scan_count
+        for row in db.query(model).filter(model.bucket_start >= truncate(start, bucket), model.bucket_start < end)
+    })
+    return [(key, rolled[key], raw[key]) for key in sorted(set(raw) | set(rolled)) if rolled[key] != raw[key]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan rollup maintenance")
+    parser.add_argument("--refresh", action="store_true", help="fold new scan logs into the rollups")
+    parser.add_argument("--verify", action="store_true", help="compare rollups with the raw scan log")
+    parser.add_argument("--days", type=int, default=7, help="window checked by --verify")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+
+    if args.refresh:
+        print(f"Folded {ScanRollup(SessionLocal).refresh()} scan logs.")
+    if args.verify:
+        db = SessionLocal()
+        try:
+            end = datetime.utcnow() + timedelta(hours=1)
+            for bucket in BUCKETS:
+                mismatches = verify_rollups(db, end - timedelta(days=args.days), end, bucket)
+                for key, rolled, raw in mismatches[:20]:
+                    print(f"{bucket} {key}: rollup {rolled} != raw {raw}")
+                print(f"{bucket}: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        finally:
+            db.close()
+    if not (args.refresh or args.verify):
+        parser.print_help()
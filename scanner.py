@@ -0,0 +1,112 @@
+# scanner.py
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple
+
+SCAN_MAX_WORKERS = 16  # concurrent directory reads; NFS latency hides well behind a few threads
+HASH_MAX_WORKERS = 4   # concurrent file hashes; hashlib releases the GIL on large reads
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileRecord(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+    inode: int
+
+
+class PanelRecord(NamedTuple):
+    name: str
+    path: str
+    mtime_ns: int
+    inode: int
+
+
+def list_panels(base_dir: str) -> List[PanelRecord]:
+    """List panel folders directly under base_dir.
+
+    DirEntry.is_dir() answers from the readdir d_type, so only the panel
+    directories themselves are stat'ed (their mtime drives change polling).
+    """
+    panels = []
+    with os.scandir(base_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                panels.append(PanelRecord(entry.name, entry.path, entry.stat().st_mtime_ns, entry.inode()))
+    return panels
+
+
+def scan_panel_files(panel_path: str, with_stat: bool = True) -> List[FileRecord]:
+    """List regular files in one panel folder.
+
+    File type comes from the cached DirEntry; with_stat=False skips the
+    per-file stat entirely and leaves size/mtime as 0.
+    """
+    records = []
+    with os.scandir(panel_path) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if with_stat:
+                st = entry.stat()
+                records.append(FileRecord(entry.name, st.st_size, st.st_mtime, entry.inode()))
+            else:
+                records.append(FileRecord(entry.name, 0, 0.0, entry.inode()))
+    return records
+
+
+def _scan_or_none(panel_path: str, with_stat: bool):
+    try:
+        return scan_panel_files(panel_path, with_stat)
+    except (FileNotFoundError, NotADirectoryError):
+        # Folder was removed between listing and scanning
+        return None
+
+
+def scan_tree(base_dir: str, panel_names=None, with_stat: bool = True,
+              max_workers: int = SCAN_MAX_WORKERS) -> dict:
+    """Scan every panel folder under base_dir on a bounded thread pool.
+
+    Returns {panel_name: [FileRecord, ...]}; panel_names limits the scan to
+    those folders.
+    """
+    panels = list_panels(base_dir)
+    if panel_names is not None:
+        panels = [p for p in panels if p.name in panel_names]
+    if not panels:
+        return {}
+
+    workers = max(1, min(max_workers, len(panels)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="panel-scan") as pool:
+        results = pool.map(lambda p: _scan_or_none(p.path, with_stat), panels)
+        return {
+            panel.name: files
+            for panel, files in zip(panels, results)
+            if files is not None
+        }
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_or_none(path: str):
+    try:
+        return hash_file(path)
+    except OSError:
+        return None
+
+
+def hash_files(paths, max_workers: int = HASH_MAX_WORKERS) -> dict:
+    """SHA-256 of each path, {path: hexdigest or None if unreadable}."""
+    paths = list(paths)
+    if not paths:
+        return {}
+    workers = max(1, min(max_workers, len(paths)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-hash") as pool:
+        return dict(zip(paths, pool.map(_hash_or_none, paths)))
@@ -0,0 +1,52 @@
+# scheduler.py
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs fn every interval seconds on a daemon thread; trigger() runs it early.
+
+    Failures are logged and the job carries on at the next interval.
+    """
+
+    def __init__(self, name: str, interval: float, fn, run_at_start: bool = True):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_at_start = run_at_start
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self):
+        self._wake.set()
+
+    def _run(self):
+        if not self.run_at_start:
+            self._wake.wait(self.interval)
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.fn()
+                self.last_error = None
+            except Exception as exc:
+                self.last_error = exc
+                logger.exception("Periodic job %s failed", self.name)
+            self._wake.wait(self.interval)
@@ -0,0 +1,181 @@
+# secret_filter.py
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func
+
+from models import UserAssignment
+
+logger = logging.getLogger(__name__)
+
+SECRET_FILTER_ERROR_RATE = 0.001       # share of unknown codes that still reach the database
+SECRET_FILTER_HEADROOM = 2             # capacity relative to the codes at build time
+SECRET_FILTER_MIN_CAPACITY = 10000
+SECRET_FILTER_REFRESH_SECONDS = 5      # how soon codes created on other workers are in this one's filter
+SECRET_FILTER_SETTLE_SECONDS = 60      # each refresh re-reads ids allocated this recently, for late commits
+SECRET_FILTER_REBUILD_SECONDS = 3600   # full rebuild, which drops codes of deleted assignments
+SECRET_FILTER_STALE_FRACTION = 0.1     # ...or sooner once this share of the codes was deleted here
+SECRET_FILTER_BATCH = 10000
+
+
+class BloomFilter:
+    """Bit array with k positions per item (double hashing over one blake2b digest).
+
+    No false negatives; false positives at about error_rate while at most
+    capacity items are added. Items cannot be removed.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = SECRET_FILTER_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0  # items that set at least one new bit, i.e. (roughly) distinct items
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str) -> bool:
+        """Add item; False if it was (probably) present already. Not thread-safe, callers lock."""
+        new = False
+        bits = self.bits
+        for position in self._positions(item):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        self.count += new
+        return new
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def expected_error_rate(self) -> float:
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class SecretCodeFilter:
+    """Bloom filter of every user_assignment.secret_code, so unknown codes are rejected without SQL.
+
+    might_exist() only looks at memory. Codes created on this worker are
+    added at once (add()); refresh(), run by a PeriodicJob every
+    SECRET_FILTER_REFRESH_SECONDS, reads MAX(user_assignment_id) and adds
+    the rows above the maximum it saw SECRET_FILTER_SETTLE_SECONDS ago, so
+    codes from other workers arrive within a refresh, including those of a
+    transaction that committed a while after taking its id. Until the first
+    build might_exist() answers True, i.e. every code goes to the database
+    as before.
+    """
+
+    def __init__(self, session_factory, error_rate: float = SECRET_FILTER_ERROR_RATE,
+                 rebuild_seconds: float = SECRET_FILTER_REBUILD_SECONDS,
+                 settle_seconds: float = SECRET_FILTER_SETTLE_SECONDS):
+        self.session_factory = session_factory
+        self.error_rate = error_rate
+        self.rebuild_seconds = rebuild_seconds
+        self.settle_seconds = settle_seconds
+        self.rejected = 0             # codes turned away by the filter on this worker
+        self._bloom = None
+        self._built_at = 0.0
+        self._removed = 0
+        self._max_ids = deque()       # (monotonic time, MAX(user_assignment_id)) of recent refreshes
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def might_exist(self, secret_code: str) -> bool:
+        """False only if secret_code is not among the codes this worker has seen."""
+        bloom = self._bloom
+        if bloom is None or secret_code in bloom:
+            return True
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def add(self, secret_codes):
+        # Codes created on this worker hit the filter at once instead of waiting for a refresh
+        with self._lock:
+            if self._bloom is not None:
+                for code in secret_codes:
+                    self._bloom.add(code)
+
+    def note_removed(self, count: int):
+        # Deleted codes stay in the filter (they just reach the database) until the next rebuild
+        with self._lock:
+            self._removed += count
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        return {
+            "built": bloom is not None,
+            "codes": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "expected_error_rate": round(bloom.expected_error_rate(), 6) if bloom else None,
+            "rejected": self.rejected,
+            "max_assignment_id": self._max_ids[-1][1] if self._max_ids else None,
+        }
+
+    def _needs_rebuild(self) -> bool:
+        bloom = self._bloom
+        return (
+            bloom is None
+            or time.monotonic() - self._built_at >= self.rebuild_seconds
+            or bloom.count > bloom.capacity
+            or self._removed > SECRET_FILTER_STALE_FRACTION * max(1, bloom.count)
+        )
+
+    def _settled_id(self, now: float) -> int:
+        """Highest id every row at or below which had committed settle_seconds ago (0 if unknown)."""
+        while len(self._max_ids) > 1 and now - self._max_ids[1][0] >= self.settle_seconds:
+            self._max_ids.popleft()
+        if self._max_ids and now - self._max_ids[0][0] >= self.settle_seconds:
+            return self._max_ids[0][1]
+        return 0
+
+    def _add_rows(self, db, bloom: BloomFilter, after_id: int = 0):
+        last_id = after_id
+        while True:
+            rows = (
+                db.query(UserAssignment.user_assignment_id, UserAssignment.secret_code)
+                .filter(UserAssignment.user_assignment_id > last_id)
+                .order_by(UserAssignment.user_assignment_id)
+                .limit(SECRET_FILTER_BATCH)
+                .all()
+            )
+            if not rows:
+                return
+            with self._lock:
+                for _, code in rows:
+                    if code:
+                        bloom.add(code)
+            last_id = rows[-1].user_assignment_id
+
+    def refresh(self):
+        with self._refresh_lock:
+            db = self.session_factory()
+            try:
+                now = time.monotonic()
+                max_id = db.query(func.max(UserAssignment.user_assignment_id)).scalar() or 0
+                if self._needs_rebuild():
+                    count = db.query(func.count(UserAssignment.user_assignment_id)).scalar() or 0
+                    bloom = BloomFilter(max(count * SECRET_FILTER_HEADROOM, SECRET_FILTER_MIN_CAPACITY), self.error_rate)
+                    self._add_rows(db, bloom)
+                    with self._lock:
+                        self._bloom, self._removed = bloom, 0
+                    self._built_at = now
+                    logger.info("Secret code filter built: %d codes, %d KiB", bloom.count, len(bloom.bits) // 1024)
+                else:
+                    # Rows above the settled id: new ones, and any that took their id
+                    # before the last refresh but committed after it
+                    self._add_rows(db, self._bloom, self._settled_id(now))
+                self._max_ids.append((now, max_id))
+            finally:
+                db.close()
@@ -1,4 +1,5 @@
 # settings.py
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import EmailStr
 
@@ -11,6 +12,60 @@ class Settings(BaseSettings):
     SMTP_FROM_EMAIL: EmailStr
     SMTP_USE_TLS: bool = True
     SMTP_USE_SSL: bool = False
+    # Outgoing mail queue: persistent connections, queued messages, delivery attempts
+    SMTP_POOL_SIZE: int = 2
+    SMTP_QUEUE_SIZE: int = 1000
+    SMTP_MAX_ATTEMPTS: int = 4
+    # Mail still queued at shutdown is written here and resent on startup ("" = dropped)
+    SMTP_SPOOL_DIR: str = ""
+
+    # Document downloads: "none" streams from the app, "x-accel-redirect" (nginx)
+    # or "x-sendfile" (Apache/lighttpd) hands the transfer to the reverse proxy
+    FILE_OFFLOAD_MODE: str = "none"
+    # Internal proxy location mapped onto PANEL_BASE_DIR (x-accel-redirect only)
+    FILE_OFFLOAD_PREFIX: str = "/protected-panels"
+
+    # Directory for rendered QR PNGs shared by all workers ("" = memory LRU only)
+    QR_CACHE_DIR: str = ""
+
+    # Pending OTP challenges: "sql" (otp_challenge table), "memory" (single worker
+    # only) or "redis" (shared by all workers, needs OTP_REDIS_URL)
+    OTP_STORE: str = "sql"
+    OTP_REDIS_URL: str = ""
+    # Repeated scans from the same browser (OTP client cookie) within this
+    # window reuse its pending challenge (no new mail)
+    OTP_COALESCE_SECONDS: int = 60
+    # Send the OTP client cookie over HTTPS only; turn off for plain-HTTP development
+    OTP_CLIENT_COOKIE_SECURE: bool = True
+    # Minimum gap between OTP mails for one challenge via /qr/resend-otp
+    OTP_RESEND_COOLDOWN_SECONDS: int = 30
+
+    # Retention in days (0 = keep forever). Scan logs are only purged once the
+    # dashboard counters and rollups have counted them
+    RETENTION_OTP_DAYS: int = 7
+    RETENTION_SCAN_LOG_DAYS: int = 0
+    # Purged scan logs are first written here as gzipped JSONL segments ("" = no archive)
+    RETENTION_ARCHIVE_DIR: str = ""
+
+    # Token buckets on /qr/initiate, /qr/verify-otp, /qr/resend-otp and /verify-secret:
+    # "memory" (per worker), "redis" (shared, needs RATE_LIMIT_REDIS_URL) or "off"
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_REDIS_URL: str = ""
+    # Key on the last X-Forwarded-For address, i.e. the client as seen by our
+    # reverse proxy. Only turn on when every request comes through that proxy:
+    # otherwise a client picks its own address and dodges the per-IP limits
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+
+    # bcrypt for /login runs on its own process pool; logins beyond
+    # PASSWORD_MAX_PENDING in flight get 503. Changing the rounds rehashes
+    # each password at its next successful login
+    PASSWORD_POOL_SIZE: int = 2
+    PASSWORD_MAX_PENDING: int = 16
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+
+    # Apply pending schema migrations when a worker starts. Turn off when the
+    # deploy runs "python migrations.py" once before restarting the workers
+    DB_MIGRATE_ON_STARTUP: bool = True
 
     # Pydantic v2 config
     model_config = SettingsConfigDict(
@@ -19,4 +74,15 @@ class Settings(BaseSettings):
         case_sensitive=False,
     )
 
-settings = Settings()
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Settings are read (and validated) on first use, not when this module is imported."""
+    return Settings()
+
+
+def __getattr__(name):
+    # "from settings import settings" keeps working for scripts
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,80 @@
+# tests/conftest.py
+import importlib
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+from auth import create_access_token
+from database import Base
+import models  # noqa: F401  registers every table on Base.metadata
+from settings import get_settings
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A throwaway SQLite database with the current schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+@pytest.fixture
+def panel_dir(tmp_path):
+    path = tmp_path / "panels"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def make_client(tmp_path, panel_dir, monkeypatch):
+    """make_client(**env) starts main.app (lifespan included) and returns its TestClient.
+
+    The database is a SQLite file in tmp_path unless env says otherwise,
+    PANEL_BASE_DIR is panel_dir, and main is reloaded so its module-level
+    services start from scratch.
+    """
+    from fastapi.testclient import TestClient
+
+    clients = []
+
+    def make(**env):
+        env = {
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+            "SMTP_HOST": "localhost",
+            "SMTP_USERNAME": "",
+            "SMTP_PASSWORD": "",
+            "SMTP_FROM_EMAIL": "tests@example.com",
+            **env,
+        }
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        get_settings.cache_clear()
+        database.reset_engines()
+
+        import main
+        main = importlib.reload(main)
+        main.PANEL_BASE_DIR = str(panel_dir)
+        main.panel_sync_service.base_dir = str(panel_dir)
+        client = TestClient(main.app)
+        client.__enter__()
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.__exit__(None, None, None)
+    database.reset_engines()
+    get_settings.cache_clear()
+
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'tests'})}"}
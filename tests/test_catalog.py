@@ -0,0 +1,38 @@
+# tests/test_catalog.py
+import json
+
+from http_cache import etag_matches
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_panels_revalidates_with_304_and_a_sync_changes_the_etag(make_client, auth_headers, panel_dir):
+    (panel_dir / "P1").mkdir()
+    (panel_dir / "P1" / "a.pdf").write_bytes(b"a")
+    client = make_client()
+    assert client.get("/sync-panels-manually", headers=auth_headers).status_code == 200
+
+    first = client.get("/panels", headers=auth_headers)
+    assert first.status_code == 200
+    assert [panel["panel_name"] for panel in first.json()] == ["P1"]
+    etag = first.headers["etag"]
+
+    cached = client.get("/panels", headers={**auth_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    (panel_dir / "P1" / "b.pdf").write_bytes(b"b")
+    assert client.get("/sync-panels-manually", headers=auth_headers).status_code == 200
+
+    changed = client.get("/panels", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    files = json.loads(changed.content)[0]["files"]
+    assert [f["file_name"] for f in files] == ["a.pdf", "b.pdf"]
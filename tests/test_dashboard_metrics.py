@@ -0,0 +1,112 @@
+# tests/test_dashboard_metrics.py
+from datetime import datetime
+
+import dashboard_metrics
+from dashboard_metrics import ENTITY_KEYS, SCAN_STATUSES, DashboardMetrics, scan_key
+from models import DashboardCounter, PanelMaster, User, UserScanLog
+from panel_sync import SyncReport
+
+
+def test_scan_key_maps_unknown_statuses_to_other():
+    assert scan_key("2026-01-02", "otp_verified") == "scans:2026-01-02:otp_verified"
+    assert scan_key("2026-01-02", "1") == "scans:2026-01-02:1"
+    for status in (None, "", "Success", "x" * 100, "1; drop table"):
+        assert scan_key("2026-01-02", status) == "scans:2026-01-02:other"
+
+
+def test_arbitrary_statuses_add_a_bounded_number_of_counters(session_factory):
+    db = session_factory()
+    scanned_at = datetime(2026, 1, 2, 10)
+    statuses = ["qr_initiated", "otp_verified", "1", "2"] + [f"junk-{i}" for i in range(200)]
+    db.add_all([UserScanLog(user_assignment_id=None, scan_datetime=scanned_at, verification_status=s) for s in statuses])
+    db.commit()
+    db.close()
+
+    metrics = DashboardMetrics(session_factory, interval=0)
+    metrics.refresh()
+    metrics.refresh()
+
+    db = session_factory()
+    try:
+        counters = dict(
+            db.query(DashboardCounter.metric_key, DashboardCounter.value)
+            .filter(DashboardCounter.metric_key.like("scans:%"))
+        )
+    finally:
+        db.close()
+    assert counters == {
+        "scans:2026-01-02:qr_initiated": 1,
+        "scans:2026-01-02:otp_verified": 1,
+        "scans:2026-01-02:1": 1,
+        "scans:2026-01-02:2": 1,
+        "scans:2026-01-02:other": 200,
+    }
+    assert len(counters) <= len(SCAN_STATUSES) + 1
+
+
+def _counters(session_factory) -> dict:
+    db = session_factory()
+    try:
+        return dict(db.query(DashboardCounter.metric_key, DashboardCounter.value))
+    finally:
+        db.close()
+
+
+def test_entities_are_counted_once_then_kept_by_deltas(session_factory, monkeypatch):
+    db = session_factory()
+    db.add_all([User(name="a"), User(name="b"), PanelMaster(panel_name="P1", is_deleted=False)])
+    db.commit()
+    recounts = []
+    original = dashboard_metrics.recount_entities
+    monkeypatch.setattr(dashboard_metrics, "recount_entities", lambda db: recounts.append(1) or original(db))
+
+    first = DashboardMetrics(session_factory)
+    second = DashboardMetrics(session_factory)
+    first.refresh()
+    second.refresh()
+    assert len(recounts) == 1
+    assert {k: v for k, v in _counters(session_factory).items() if k in ENTITY_KEYS} == \
+        {"panels": 1, "files": 0, "users": 2, "assignments": 0}
+
+    db.add(User(name="c"))
+    db.commit()
+    db.close()
+    second.adjust(users=1, assignments=2)
+    second.note_sync(SyncReport(panels_added=2, panels_deleted=1, files_added=5, files_deleted=2))
+    second.note_sync(None)  # another worker's sync: that worker counts it
+    second.refresh()
+    first.refresh()
+    assert len(recounts) == 1
+    assert second.snapshot()["users"] == 3 and second.snapshot()["assignments"] == 2
+    assert first.snapshot()["panels"] == 2 and first.snapshot()["files"] == 3
+
+
+def test_only_one_worker_folds_scans_per_interval(session_factory, monkeypatch):
+    folds = []
+    original = dashboard_metrics.update_counters
+    monkeypatch.setattr(dashboard_metrics, "update_counters",
+                        lambda db, ceiling: folds.append(ceiling) or original(db, ceiling))
+    workers = [DashboardMetrics(session_factory) for _ in range(3)]
+    for worker in workers:
+        worker.refresh()
+    assert len(folds) == 1
+
+
+def test_admin_dashboard_follows_user_writes(make_client, auth_headers):
+    client = make_client()
+    import main
+
+    main.dashboard_metrics.refresh()
+    assert client.get("/admin-dashboard", headers=auth_headers).json()["dashboard"]["users"] == 0
+    for name in ("alice", "bob"):
+        client.post("/users", headers=auth_headers, json={
+            "name": name, "email_id": f"{name}@example.com", "phone_number": "1", "panels": [],
+        })
+    db = main.SessionLocal()
+    user_id = db.query(User.user_id).filter(User.name == "alice").scalar()
+    db.close()
+    client.delete(f"/users/{user_id}", headers=auth_headers)
+    main.dashboard_metrics.refresh()
+
+    dashboard = client.get("/admin-dashboard", headers=auth_headers).json()["dashboard"]
+    assert (dashboard["users"], dashboard["assignments"]) == (1, 0)
@@ -0,0 +1,103 @@
+# tests/test_database.py
+import json
+
+import pytest
+from sqlalchemy import create_engine
+
+import database
+from database import Base, ReadSessionLocal, SessionLocal
+from models import PanelMaster, User, UserAssignment
+
+
+@pytest.fixture
+def two_databases(tmp_path, monkeypatch):
+    """Primary and replica as two separate SQLite files, so a read that hits the wrong one shows."""
+    urls = {role: f"sqlite:///{tmp_path / f'{role}.db'}" for role in ("primary", "replica")}
+    for url in urls.values():
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        engine.dispose()
+    monkeypatch.setenv("DATABASE_URL", urls["primary"])
+    monkeypatch.setenv("DATABASE_READ_URL", urls["replica"])
+    database.reset_engines()
+    yield urls
+    database.reset_engines()
+
+
+def _names(session_factory):
+    db = session_factory()
+    try:
+        return [name for (name,) in db.query(User.name).order_by(User.user_id)]
+    finally:
+        db.close()
+
+
+def test_sessions_go_to_their_own_database(two_databases):
+    assert str(database.get_engine().url) == two_databases["primary"]
+    assert str(database.get_read_engine().url) == two_databases["replica"]
+
+    db = SessionLocal()
+    db.add(User(name="written"))
+    db.commit()
+    db.close()
+
+    assert _names(SessionLocal) == ["written"]
+    assert _names(ReadSessionLocal) == []
+
+
+def test_without_a_replica_reads_use_the_primary(tmp_path, monkeypatch):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"localdatabase": {"url": f"sqlite:///{tmp_path / 'only.db'}"}}))
+    monkeypatch.setattr(database, "config_path", str(config))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("DATABASE_READ_URL", raising=False)
+    database.load_config.cache_clear()
+    database.reset_engines()
+    try:
+        assert database.get_read_engine() is database.get_engine()
+    finally:
+        database.reset_engines()
+        database.load_config.cache_clear()
+
+
+def test_replica_profile_inherits_the_pool_settings(tmp_path, monkeypatch):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({
+        "localdatabase": {"url": f"sqlite:///{tmp_path / 'primary.db'}", "pool_pre_ping": False,
+                          "read_replica": "replica"},
+        "replica": {"url": f"sqlite:///{tmp_path / 'replica.db'}"},
+    }))
+    monkeypatch.setattr(database, "config_path", str(config))
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("DATABASE_READ_URL", raising=False)
+    database.load_config.cache_clear()
+    database.reset_engines()
+    try:
+        read_engine = database.get_read_engine()
+        assert read_engine is not database.get_engine()
+        assert read_engine.url.database.endswith("replica.db")
+        assert read_engine.pool._pre_ping is False
+    finally:
+        database.reset_engines()
+        database.load_config.cache_clear()
+
+
+def test_read_endpoints_use_the_replica(two_databases, make_client, auth_headers):
+    client = make_client(DATABASE_URL=two_databases["primary"], DATABASE_READ_URL=two_databases["replica"])
+
+    replica = create_engine(two_databases["replica"])
+    with replica.begin() as conn:
+        conn.execute(PanelMaster.__table__.insert(), {"panel_id": 1, "panel_name": "P1", "is_deleted": False})
+        conn.execute(User.__table__.insert(), {"user_id": 1, "name": "on the replica"})
+        conn.execute(UserAssignment.__table__.insert(),
+                     {"user_assignment_id": 1, "user_id": 1, "panel_id": 1, "secret_code": "Abc12345"})
+    replica.dispose()
+
+    response = client.post("/users", headers=auth_headers, json={
+        "name": "on the primary", "email_id": "p@example.com", "phone_number": "1", "panels": [],
+    })
+    assert response.status_code == 200
+
+    users = client.get("/user-details", headers=auth_headers).json()
+    assert [user["user_name"] for user in users] == ["on the replica"]
+    assert _names(SessionLocal) == ["on the primary"]
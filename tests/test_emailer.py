@@ -0,0 +1,126 @@
+# tests/test_emailer.py
+import socket
+import time
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+import emailer
+from emailer import MailQueue
+from settings import get_settings
+
+
+class Recorder:
+    """aiosmtpd handler: records each message and the session (connection) it came on.
+
+    replies holds canned answers to DATA, used up one per message before mail is accepted.
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = []
+        self.replies = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.pop(0)
+        if session not in self.sessions:
+            self.sessions.append(session)
+        self.messages.append(envelope.content.decode("utf-8", "replace"))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def smtp_env(monkeypatch):
+    def point_at(port):
+        for key, value in {
+            "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_USE_TLS": "false",
+            "SMTP_USERNAME": "", "SMTP_PASSWORD": "", "SMTP_FROM_EMAIL": "portal@example.com",
+        }.items():
+            monkeypatch.setenv(key, value)
+        get_settings.cache_clear()
+
+    monkeypatch.setattr(emailer, "MAIL_RETRY_BASE_SECONDS", 0.05)
+    yield point_at
+    get_settings.cache_clear()
+
+
+@pytest.fixture
+def smtp_server(smtp_env):
+    handler = Recorder()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    smtp_env(controller.port)
+    yield handler
+    controller.stop()
+
+
+def test_queue_reuses_its_connections(smtp_server):
+    mail_queue = MailQueue(pool_size=2)
+    mail_queue.start()
+    for i in range(20):
+        mail_queue.enqueue(f"user{i}@example.com", f"OTP {i}", f"<p>{i}</p>", f"{i}")
+    mail_queue.stop(timeout=10)
+
+    assert len(smtp_server.messages) == 20
+    assert len(smtp_server.sessions) <= 2
+    stats = mail_queue.stats()
+    assert (stats["sent"], stats["failed"], stats["retried"]) == (20, 0, 0)
+    assert stats["latency_p50_ms"] is not None
+
+
+def test_transient_failure_is_retried_permanent_is_not(smtp_server):
+    smtp_server.replies = ["451 Try again later"]
+    mail_queue = MailQueue(pool_size=1)
+    mail_queue.start()
+    mail_queue.enqueue("a@example.com", "first", "<p>a</p>")
+    _wait_for(lambda: mail_queue.stats()["sent"] == 1)
+
+    smtp_server.replies = ["550 No such user"]
+    mail_queue.enqueue("b@example.com", "second", "<p>b</p>")
+    _wait_for(lambda: mail_queue.stats()["failed"] == 1)
+    mail_queue.stop(timeout=5)
+
+    stats = mail_queue.stats()
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (1, 1, 1)
+    assert len(smtp_server.messages) == 1 and "Subject: first" in smtp_server.messages[0]
+
+
+def test_undelivered_mail_is_spooled_and_sent_by_the_next_start(smtp_env, tmp_path):
+    smtp_env(_free_port())  # nothing listens there
+    spool = tmp_path / "spool"
+    down = MailQueue(pool_size=1, spool_dir=str(spool))
+    down.start()
+    down.enqueue("a@example.com", "while down", "<p>a</p>")
+    _wait_for(lambda: down.stats()["retried"] >= 1)
+    down.stop(timeout=0.1)
+    assert [p.suffix for p in spool.iterdir()] == [".eml"]
+
+    handler = Recorder()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        smtp_env(controller.port)
+        up = MailQueue(pool_size=1, spool_dir=str(spool))
+        up.start()
+        _wait_for(lambda: up.stats()["sent"] == 1)
+        up.stop(timeout=5)
+    finally:
+        controller.stop()
+
+    assert "Subject: while down" in handler.messages[0]
+    assert list(spool.iterdir()) == []
@@ -0,0 +1,168 @@
+# tests/test_file_server.py
+import os
+from urllib.parse import unquote
+
+import pytest
+
+from file_server import MAX_RANGES, offload_response
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 64
+
+
+@pytest.fixture
+def manual(panel_dir):
+    (panel_dir / "Panel A").mkdir()
+    path = panel_dir / "Panel A" / "manual 1.pdf"
+    path.write_bytes(PDF)
+    return path
+
+
+def proxy_get(client, url, headers, panel_dir, prefix="/protected-panels"):
+    """What nginx / Apache do with the app's answer: follow X-Accel-Redirect or X-Sendfile.
+
+    Returns (app response, body the client would receive).
+    """
+    response = client.get(url, headers=headers)
+    if "x-accel-redirect" in response.headers:
+        location = response.headers["x-accel-redirect"]
+        assert location.startswith(prefix + "/")  # an internal location, mapped onto the panel tree
+        path = os.path.join(panel_dir, *(unquote(part) for part in location[len(prefix) + 1:].split("/")))
+    elif "x-sendfile" in response.headers:
+        path = response.headers["x-sendfile"]
+    else:
+        return response, response.content
+    with open(path, "rb") as fh:
+        return response, fh.read()
+
+
+def test_offload_response_headers(tmp_path):
+    accel = offload_response("x-accel-redirect", str(tmp_path / "P" / "a b.pdf"), "P", "a b.pdf", prefix="/internal/")
+    assert accel.headers["x-accel-redirect"] == "/internal/P/a%20b.pdf"
+    assert accel.headers["content-type"] == "application/pdf"
+    assert accel.body == b""
+
+    sendfile = offload_response("x-sendfile", str(tmp_path / "P" / "a b.pdf"), "P", "a b.pdf")
+    assert sendfile.headers["x-sendfile"] == str(tmp_path / "P" / "a b.pdf")
+
+    # Non-latin-1 names go out as the path's UTF-8 bytes, quoted in the URL for nginx
+    accel = offload_response("x-accel-redirect", "/srv/P/€.pdf", "P", "€.pdf", prefix="/internal")
+    assert accel.headers["x-accel-redirect"] == "/internal/P/%E2%82%AC.pdf"
+    sendfile = offload_response("x-sendfile", "/srv/P/€.pdf", "P", "€.pdf")
+    assert (b"x-sendfile", "/srv/P/€.pdf".encode("utf-8")) in sendfile.raw_headers
+
+    with pytest.raises(ValueError):
+        offload_response("sendfile", "x", "P", "a.pdf")
+
+
+@pytest.mark.parametrize("mode", ["x-accel-redirect", "x-sendfile"])
+def test_view_file_is_handed_to_the_proxy(make_client, auth_headers, panel_dir, manual, mode):
+    client = make_client(FILE_OFFLOAD_MODE=mode)
+
+    response, body = proxy_get(client, "/view-file/Panel A/manual 1.pdf", auth_headers, panel_dir)
+
+    assert response.status_code == 200
+    assert response.content == b""            # the app itself sends no body
+    assert body == PDF
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-disposition"] == 'inline; filename="manual 1.pdf"'
+
+
+def test_view_file_offload_still_checks_the_token_and_the_path(make_client, auth_headers, panel_dir, manual):
+    client = make_client(FILE_OFFLOAD_MODE="x-accel-redirect")
+
+    assert client.get("/view-file/Panel A/manual 1.pdf").status_code == 422
+    assert client.get("/view-file/Panel A/..", headers=auth_headers).status_code == 404
+
+
+def test_view_file_without_offload_streams_ranges(make_client, auth_headers, manual):
+    client = make_client(FILE_OFFLOAD_MODE="none")
+
+    response = client.get("/view-file/Panel A/manual 1.pdf", headers={**auth_headers, "Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.content == PDF[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(PDF)}"
+
+
+@pytest.fixture
+def direct(make_client, auth_headers, manual):
+    client = make_client(FILE_OFFLOAD_MODE="none")
+    # Index the file first: once file_meta has its SHA-256 that becomes the ETag
+    client.get("/sync-panels-manually", headers=auth_headers)
+    return lambda **headers: client.get("/view-file/Panel A/manual 1.pdf", headers={**auth_headers, **headers})
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=-100", len(PDF) - 100, len(PDF) - 1),                    # suffix
+    (f"bytes=-{len(PDF) + 50}", 0, len(PDF) - 1),                     # suffix longer than the file
+    ("bytes=16000-", 16000, len(PDF) - 1),                            # open-ended
+    (f"bytes=10-{len(PDF) + 50}", 10, len(PDF) - 1),                  # end past the file is clamped
+    ("bytes=0-9, 5-19", 0, 19),                                       # overlapping parts are merged
+])
+def test_single_ranges(direct, range_header, start, end):
+    response = direct(Range=range_header)
+    assert response.status_code == 206
+    assert response.content == PDF[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(PDF)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+@pytest.mark.parametrize("range_header", [f"bytes={len(PDF)}-", f"bytes={len(PDF) + 10}-{len(PDF) + 20}", "bytes=-0"])
+def test_unsatisfiable_range_is_416(direct, range_header):
+    response = direct(Range=range_header)
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(PDF)}"
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("range_header", [
+    "bytes=abc-def", "bytes=20-10", "bytes=5", "items=0-9", "bytes=",
+    "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1)),
+])
+def test_malformed_or_abusive_range_falls_back_to_200(direct, range_header):
+    response = direct(Range=range_header)
+    assert response.status_code == 200
+    assert response.content == PDF
+    assert "content-range" not in response.headers
+
+
+def test_multiple_ranges_are_sent_as_multipart(direct):
+    response = direct(Range="bytes=0-3, 100-103")
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+    parts = [part for part in response.content.split(b"--" + boundary) if part.strip(b"\r\n-")]
+    assert len(parts) == 2
+    assert f"Content-Range: bytes 0-3/{len(PDF)}".encode() in parts[0] and parts[0].endswith(PDF[0:4] + b"\r\n")
+    assert f"Content-Range: bytes 100-103/{len(PDF)}".encode() in parts[1]
+    assert int(response.headers["content-length"]) == len(response.content)
+
+
+def test_if_range(direct):
+    etag = direct().headers["etag"]
+    last_modified = direct().headers["last-modified"]
+
+    assert direct(Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+    assert direct(Range="bytes=0-9", **{"If-Range": last_modified}).status_code == 206
+    for stale in ('"0123-stale"', "W/" + etag, "Thu, 01 Jan 1970 00:00:00 GMT"):
+        response = direct(Range="bytes=0-9", **{"If-Range": stale})
+        assert response.status_code == 200
+        assert response.content == PDF
+
+
+def test_conditional_get(direct):
+    full = direct()
+    etag, last_modified = full.headers["etag"], full.headers["last-modified"]
+
+    for headers in ({"If-None-Match": etag}, {"If-None-Match": f'"other", W/{etag}'},
+                    {"If-Modified-Since": last_modified}):
+        response = direct(**headers)
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    assert direct(**{"If-None-Match": '"other"'}).status_code == 200
+    # If-None-Match wins over If-Modified-Since
+    assert direct(**{"If-None-Match": '"other"', "If-Modified-Since": last_modified}).status_code == 200
+    assert direct(**{"If-None-Match": etag, "Range": "bytes=0-9"}).status_code == 304
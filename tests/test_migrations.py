@@ -0,0 +1,87 @@
+# tests/test_migrations.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+from migrations import _has_index, check_query_plans, migrate
+
+# Tables as they were before the unique keys, filled by two racing syncs
+LEGACY_SCHEMA = [
+    "CREATE TABLE panel_master (panel_id INTEGER PRIMARY KEY, panel_name VARCHAR(255), "
+    "description VARCHAR(1000), is_deleted BOOLEAN)",
+    "CREATE TABLE file_meta (file_meta_id INTEGER PRIMARY KEY, panel_id INTEGER, file_name VARCHAR(255), "
+    "is_deleted BOOLEAN)",
+    "CREATE TABLE users (user_id INTEGER PRIMARY KEY, name VARCHAR(255), email_id VARCHAR(255), "
+    "phone_number VARCHAR(20))",
+    "CREATE TABLE user_assignment (user_assignment_id INTEGER PRIMARY KEY, user_id INTEGER, "
+    "secret_code VARCHAR(255), qr_code BLOB, panel_id INTEGER)",
+    "INSERT INTO panel_master VALUES (1, 'P1', '', 0), (2, 'P2', '', 0), (3, 'P1', '', 0)",
+    "INSERT INTO file_meta VALUES (1, 1, 'a.pdf', 0), (2, 1, 'b.pdf', 0), (3, 3, 'a.pdf', 0), "
+    "(4, 3, 'c.pdf', 0), (5, 2, 'a.pdf', 0), (6, 2, 'a.pdf', 0)",
+    "INSERT INTO users VALUES (1, 'u', 'u@example.com', '')",
+    "INSERT INTO user_assignment VALUES (1, 1, 's1', NULL, 1), (2, 1, 's2', NULL, 3)",
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def test_duplicate_panels_and_files_are_merged_before_the_unique_keys(legacy_engine):
+    migrate(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT panel_id, panel_name FROM panel_master ORDER BY panel_id")).fetchall() == [
+            (1, "P1"), (2, "P2"),
+        ]
+        assert conn.execute(text("SELECT file_meta_id, panel_id, file_name FROM file_meta ORDER BY file_meta_id")).fetchall() == [
+            (1, 1, "a.pdf"), (2, 1, "b.pdf"), (4, 1, "c.pdf"), (5, 2, "a.pdf"),
+        ]
+        assert conn.execute(text("SELECT panel_id FROM user_assignment ORDER BY user_assignment_id")).scalars().all() == [1, 1]
+        assert _has_index(conn, "panel_master", ["panel_name"], unique=True)
+        assert _has_index(conn, "file_meta", ["panel_id", "file_name"], unique=True)
+
+
+def test_unique_keys_reject_a_racing_insert(legacy_engine):
+    migrate(legacy_engine)
+
+    with pytest.raises(IntegrityError):
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO panel_master (panel_name, is_deleted) VALUES ('P2', 0)"))
+    with pytest.raises(IntegrityError):
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO file_meta (panel_id, file_name, is_deleted) VALUES (1, 'b.pdf', 0)"))
+
+
+def test_migrate_is_a_no_op_once_applied(engine):
+    assert migrate(engine)
+    assert migrate(engine) == []
+
+
+@pytest.mark.parametrize("fresh", [True, False], ids=["fresh", "legacy"])
+def test_hot_queries_use_an_index(tmp_path, legacy_engine, fresh):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}") if fresh else legacy_engine
+    migrate(engine)
+
+    plans = check_query_plans(engine)
+    assert [label for label, uses_index, plan in plans if not uses_index] == []
+    assert len(plans) == 5
+    engine.dispose()
+
+
+def test_query_plan_check_notices_a_missing_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    migrate(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_user_assignment_user_id"))
+
+    plans = {label: (uses_index, plan) for label, uses_index, plan in check_query_plans(engine)}
+    uses_index, plan = plans["assignments of a user"]
+    assert not uses_index and any(step.startswith("SCAN") for step in plan)
+    engine.dispose()
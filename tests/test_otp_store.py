@@ -0,0 +1,84 @@
+# tests/test_otp_store.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import OtpChallenge, User, UserAssignment
+from otp_store import (
+    COOLDOWN, NOT_FOUND, RESENT, VERIFIED, ChallengeStore, MemoryChallengeStore, SqlChallengeStore, new_challenge,
+)
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    user = User(name="alice", email_id="alice@example.com", phone_number="1")
+    db.add(user)
+    db.flush()
+    db.add(UserAssignment(user_assignment_id=1, user_id=user.user_id, panel_id=1, secret_code="Abc12345"))
+    db.commit()
+    yield db
+    db.close()
+
+
+def _challenge(db, ttl_seconds=300):
+    user = db.query(User).one()
+    return new_challenge(1, user.user_id, user.name, user.email_id, "hash-1", ttl_seconds, 5)
+
+
+def test_challenge_store_is_abstract():
+    with pytest.raises(TypeError):
+        ChallengeStore()
+
+
+@pytest.mark.parametrize("store", [SqlChallengeStore(), MemoryChallengeStore()], ids=["sql", "memory"])
+def test_resend_honours_the_cooldown(db, store):
+    session_id = store.create(db, _challenge(db))
+    db.commit()
+
+    assert store.resend(db, session_id, "hash-2", 300, cooldown_seconds=60)[0] == COOLDOWN
+    outcome, challenge = store.resend(db, session_id, "hash-2", 300, cooldown_seconds=0)
+    db.commit()
+    assert outcome == RESENT and challenge.otp_hash == "hash-2"
+    assert store.verify(db, session_id, "hash-2")[0] == VERIFIED
+
+
+@pytest.mark.parametrize("store", [SqlChallengeStore(), MemoryChallengeStore()], ids=["sql", "memory"])
+def test_resend_does_not_revive_an_expired_challenge(db, store):
+    session_id = store.create(db, _challenge(db, ttl_seconds=-1))
+    db.commit()
+
+    assert store.resend(db, session_id, "hash-2", 300, cooldown_seconds=0) == (NOT_FOUND, None)
+    db.commit()
+    if isinstance(store, SqlChallengeStore):
+        row = db.query(OtpChallenge).one()
+        assert row.otp_hash == "hash-1" and row.expires_at < datetime.utcnow()
+
+
+def test_sql_resend_racing_with_expiry_is_not_found(db, monkeypatch):
+    store = SqlChallengeStore()
+    session_id = store.create(db, _challenge(db))
+    db.commit()
+    # The row expires between the load and the UPDATE
+    load = store._load
+
+    def load_then_expire(db, otp_id):
+        row = load(db, otp_id)
+        db.query(OtpChallenge).update({OtpChallenge.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+        return row
+
+    monkeypatch.setattr(store, "_load", load_then_expire)
+    assert store.resend(db, session_id, "hash-2", 300, cooldown_seconds=0) == (NOT_FOUND, None)
+    db.commit()
+    assert db.query(OtpChallenge.otp_hash).scalar() == "hash-1"
+
+
+@pytest.mark.parametrize("store", [SqlChallengeStore(), MemoryChallengeStore()], ids=["sql", "memory"])
+def test_find_live_only_hands_a_challenge_back_to_its_client(db, store):
+    user = db.query(User).one()
+    session_id = store.create(db, new_challenge(1, user.user_id, user.name, user.email_id, "hash-1", 300, 5, "client-a"))
+    db.commit()
+
+    assert store.find_live(db, 1, "client-a", 60) == session_id
+    assert store.find_live(db, 1, "client-b", 60) is None
+    assert store.find_live(db, 1, None, 60) is None
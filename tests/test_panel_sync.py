@@ -0,0 +1,129 @@
+# tests/test_panel_sync.py
+import time
+from datetime import datetime, timedelta
+
+import panel_sync
+from catalog import PanelCatalog
+from models import DashboardCounter, FileMeta, PanelMaster
+from panel_sync import SYNC_LEASE_KEY, SYNC_LEASE_SECONDS, PanelSyncService
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def file_names(session_factory) -> set:
+    db = session_factory()
+    try:
+        return {
+            (panel, name) for panel, name in
+            db.query(PanelMaster.panel_name, FileMeta.file_name)
+            .join(FileMeta, FileMeta.panel_id == PanelMaster.panel_id)
+            .filter(FileMeta.is_deleted == False)
+        }
+    finally:
+        db.close()
+
+
+def test_only_the_lease_holder_watches(session_factory, panel_dir):
+    first = PanelSyncService(str(panel_dir), session_factory)
+    second = PanelSyncService(str(panel_dir), session_factory)
+
+    assert first._claim()
+    assert not second._claim()
+    assert first._claim()  # renewal
+
+    first._release()
+    assert second._claim()
+    assert not first._claim()
+
+
+def test_an_expired_lease_is_taken_over(session_factory, panel_dir):
+    stalled = PanelSyncService(str(panel_dir), session_factory)
+    other = PanelSyncService(str(panel_dir), session_factory)
+    assert stalled._claim()
+
+    db = session_factory()
+    db.query(DashboardCounter).filter(DashboardCounter.metric_key == SYNC_LEASE_KEY).update(
+        {"updated_at": datetime.utcnow() - timedelta(seconds=SYNC_LEASE_SECONDS + 1)}
+    )
+    db.commit()
+    db.close()
+
+    assert other._claim()
+    assert not stalled._claim()
+
+
+def test_second_worker_does_not_scan(session_factory, panel_dir, monkeypatch):
+    (panel_dir / "P1").mkdir()
+    (panel_dir / "P1" / "a.pdf").write_bytes(b"a")
+    scans = []
+    original = panel_sync.sync_panels_and_files
+    monkeypatch.setattr(panel_sync, "sync_panels_and_files",
+                        lambda db, base_dir, panel_names=None: scans.append(panel_names) or original(db, base_dir, panel_names))
+
+    first = PanelSyncService(str(panel_dir), session_factory)
+    second = PanelSyncService(str(panel_dir), session_factory)
+    first.start()
+    try:
+        assert wait_for(lambda: first.last_report is not None)
+        second.start()
+        time.sleep(0.5)
+        assert not second.leading
+        assert second.last_report is None
+        assert scans == [None]
+    finally:
+        second.stop()
+        first.stop()
+
+
+def test_files_added_during_the_initial_scan_are_picked_up(session_factory, panel_dir, monkeypatch):
+    (panel_dir / "P1").mkdir()
+    (panel_dir / "P1" / "a.pdf").write_bytes(b"a")
+    original = panel_sync.sync_panels_and_files
+
+    def slow_first_sync(db, base_dir, panel_names=None):
+        report = original(db, base_dir, panel_names)
+        if panel_names is None and not (panel_dir / "P1" / "late.pdf").exists():
+            # Copied in after the scan read P1, before the sync returned
+            (panel_dir / "P1" / "late.pdf").write_bytes(b"late")
+        return report
+
+    monkeypatch.setattr(panel_sync, "sync_panels_and_files", slow_first_sync)
+    service = PanelSyncService(str(panel_dir), session_factory)
+    service.start()
+    try:
+        assert wait_for(lambda: ("P1", "late.pdf") in file_names(session_factory))
+    finally:
+        service.stop()
+    assert file_names(session_factory) == {("P1", "a.pdf"), ("P1", "late.pdf")}
+
+
+def test_a_sync_in_one_worker_reaches_the_others_catalog(session_factory, panel_dir, monkeypatch):
+    monkeypatch.setattr(panel_sync, "SYNC_VERSION_POLL_SECONDS", 0.05)
+    (panel_dir / "P1").mkdir()
+    first = PanelSyncService(str(panel_dir), session_factory)
+    second = PanelSyncService(str(panel_dir), session_factory)
+    catalog = PanelCatalog(session_factory)
+    second.add_listener(catalog.invalidate)
+    first.start()
+    try:
+        assert wait_for(lambda: first.last_report is not None)
+        second.start()
+        assert b'"P1"' in catalog.snapshot().body
+        etag = catalog.snapshot().etag
+
+        (panel_dir / "P2").mkdir()
+        (panel_dir / "P2" / "b.pdf").write_bytes(b"b")
+        first.sync_now(full=True)
+        assert wait_for(lambda: catalog.snapshot().etag != etag, timeout=5.0)
+        assert b'"b.pdf"' in catalog.snapshot().body
+        assert not second.leading and second.last_report is None
+    finally:
+        second.stop()
+        first.stop()
@@ -0,0 +1,112 @@
+# tests/test_qr_images.py
+import time
+
+import pytest
+
+from auth import SIGNED_URL_SECONDS, sign_url, verify_signed_url
+from models import PanelMaster, User, UserAssignment
+from qr_images import QrImageCache
+from qr_render import PNG_PROFILE, SVG_PROFILE, QrRenderer, render
+
+
+@pytest.fixture
+def assignment_id(make_client):
+    client = make_client()
+    import main
+
+    db = main.SessionLocal()
+    try:
+        panel = PanelMaster(panel_name="Panel A")
+        user = User(name="alice", email_id="alice@example.com", phone_number="1")
+        db.add_all([panel, user])
+        db.flush()
+        assignment = UserAssignment(user_id=user.user_id, panel_id=panel.panel_id, secret_code="Abc12345")
+        db.add(assignment)
+        db.commit()
+        return client, assignment.user_assignment_id
+    finally:
+        db.close()
+
+
+def test_signed_url_expiry_is_rounded_and_checked():
+    now = 10 * SIGNED_URL_SECONDS + 5
+    url = sign_url("/qr/7.png", now=now)
+    assert url == sign_url("/qr/7.png", now=now + SIGNED_URL_SECONDS - 10)  # stable, so browsers reuse it
+    path, _, query = url.partition("?")
+    params = dict(part.split("=", 1) for part in query.split("&"))
+    assert int(params["expires"]) - now >= SIGNED_URL_SECONDS
+
+    assert not verify_signed_url(path, int(params["expires"]), params["sig"])  # signed in 1970, long expired
+    future = sign_url("/qr/7.png")
+    params = dict(part.split("=", 1) for part in future.partition("?")[2].split("&"))
+    assert verify_signed_url("/qr/7.png", int(params["expires"]), params["sig"])
+    assert not verify_signed_url("/qr/8.png", int(params["expires"]), params["sig"])
+    assert not verify_signed_url("/qr/7.svg", int(params["expires"]), params["sig"])
+    assert not verify_signed_url("/qr/7.png", int(params["expires"]) + 1, params["sig"])
+    assert not verify_signed_url("/qr/7.png", None, None)
+
+
+def test_user_details_hands_out_urls_an_img_tag_can_load(assignment_id, auth_headers):
+    client, user_assignment_id = assignment_id
+    users = client.get("/user-details", headers=auth_headers).json()
+    url = users[0]["assignments"][0]["qr_code_url"]
+    assert url.startswith(f"/qr/{user_assignment_id}.png?expires=")
+
+    response = client.get(url)  # no Authorization header, like <img src>
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+
+    assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_qr_image_rejects_unsigned_tampered_and_expired_links(assignment_id, auth_headers):
+    client, user_assignment_id = assignment_id
+    path = f"/qr/{user_assignment_id}.png"
+    signed = sign_url(path)
+    expired = sign_url(path, now=time.time() - 3 * SIGNED_URL_SECONDS)
+
+    assert client.get(path).status_code == 401
+    assert client.get(expired).status_code == 401
+    assert client.get(signed.replace(".png", ".svg")).status_code == 401
+    assert client.get(signed.replace("sig=", "sig=x")).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer nope"}).status_code == 401
+    # API clients can still use their bearer token
+    assert client.get(f"/qr/{user_assignment_id}.svg", headers=auth_headers).status_code == 200
+
+
+class RecordingRenderer(QrRenderer):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.rendered = []
+
+    def render_one(self, url, profile=PNG_PROFILE):
+        self.rendered.append((url, profile.fmt))
+        return super().render_one(url, profile)
+
+
+def test_cache_misses_go_to_the_renderer(tmp_path):
+    renderer = RecordingRenderer()
+    cache = QrImageCache(str(tmp_path / "qr"), renderer=renderer)
+    url = "https://qr.example.com/#/verify-secret-code/Abc12345"
+
+    image = cache.get(url)
+    assert image == render(url)
+    assert cache.get(url) == image
+    assert cache.get(url, SVG_PROFILE).startswith(b"<svg")
+    assert renderer.rendered == [(url, "png"), (url, "svg")]
+
+    # Another worker sharing the disk cache does not render again
+    other = RecordingRenderer()
+    assert QrImageCache(str(tmp_path / "qr"), renderer=other).get(url) == image
+    assert other.rendered == []
+
+
+def test_render_one_uses_the_process_pool():
+    renderer = QrRenderer(max_workers=2)
+    try:
+        url = "https://qr.example.com/#/verify-secret-code/Abc12345"
+        assert renderer.render_one(url, SVG_PROFILE) == render(url, SVG_PROFILE)
+        assert renderer._pool is not None
+    finally:
+        renderer.shutdown()
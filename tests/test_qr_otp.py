@@ -0,0 +1,65 @@
+# tests/test_qr_otp.py
+import base64
+
+import pytest
+
+from models import PanelMaster, UserAssignment
+
+
+@pytest.fixture
+def otp_client(make_client, auth_headers, monkeypatch):
+    """The app with one assignment to scan; returns (client, encoded secret, list of OTPs mailed)."""
+    client = make_client(RATE_LIMIT_BACKEND="off", OTP_CLIENT_COOKIE_SECURE="false")
+    import main
+
+    db = main.SessionLocal()
+    db.add(PanelMaster(panel_id=1, panel_name="P1", is_deleted=False))
+    db.commit()
+    response = client.post("/users", headers=auth_headers, json={
+        "name": "alice", "email_id": "alice@example.com", "phone_number": "1", "panels": [{"panel_id": 1}],
+    })
+    assert response.status_code == 200
+    secret_code = db.query(UserAssignment.secret_code).scalar()
+    db.close()
+    mailed = []
+    monkeypatch.setattr(main, "_send_otp_email", lambda email_id, user_name, otp: mailed.append(otp))
+    return client, base64.b64encode(secret_code.encode()).decode(), mailed
+
+
+def _scan(client, encoded_secret):
+    response = client.post("/qr/initiate", json={"encoded_secret": encoded_secret})
+    assert response.status_code == 200, response.text
+    return response.json()["session_id"]
+
+
+def test_repeated_scans_from_one_browser_share_a_challenge(otp_client):
+    client, encoded_secret, mailed = otp_client
+    session_id = _scan(client, encoded_secret)
+    assert "qr_client" in client.cookies
+    assert _scan(client, encoded_secret) == session_id
+    assert len(mailed) == 1
+
+    client.cookies.clear()  # a browser without the cookie never joins an existing challenge
+    assert _scan(client, encoded_secret) != session_id
+    assert len(mailed) == 2
+
+
+def test_a_second_scanner_cannot_exhaust_the_first_scanners_attempts(otp_client):
+    client, encoded_secret, mailed = otp_client
+    first_session = _scan(client, encoded_secret)
+    first_cookies = dict(client.cookies)
+
+    client.cookies.clear()  # someone else scans the same sticker
+    second_session = _scan(client, encoded_secret)
+    assert second_session != first_session
+    for _ in range(10):
+        client.post("/qr/verify-otp", json={"session_id": second_session, "otp": "000000"})
+        client.post("/qr/resend-otp", json={"session_id": second_session})
+    assert client.post("/qr/verify-otp", json={"session_id": second_session, "otp": mailed[1]}).status_code == 429
+
+    client.cookies.clear()
+    client.cookies.update(first_cookies)
+    assert _scan(client, encoded_secret) == first_session
+    response = client.post("/qr/verify-otp", json={"session_id": first_session, "otp": mailed[0]})
+    assert response.status_code == 200
+    assert response.json()["access_token"]
@@ -0,0 +1,62 @@
+# tests/test_rate_limit.py
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from rate_limit import MemoryRateLimiter, NoRateLimiter, RateLimit, RateLimiter, client_ip, enforce
+from settings import Settings
+
+PER_IP = RateLimit("test:ip", 10, 1 / 60)
+PER_SECRET = RateLimit("test:secret", 2, 1 / 60)
+
+
+def test_rate_limiter_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimiter()
+    assert NoRateLimiter().hit(PER_SECRET, "x") == 0
+
+
+def test_a_refused_request_does_not_drain_the_other_buckets():
+    limiter = MemoryRateLimiter()
+    for _ in range(2):
+        enforce(limiter, (PER_IP, "10.0.0.1"), (PER_SECRET, "guess"))
+    # Hammering one exhausted secret must not use up the client's per-IP budget
+    for _ in range(20):
+        with pytest.raises(HTTPException) as exc_info:
+            enforce(limiter, (PER_IP, "10.0.0.1"), (PER_SECRET, "guess"))
+        assert exc_info.value.status_code == 429
+        assert int(exc_info.value.headers["Retry-After"]) >= 1
+    for i in range(8):
+        enforce(limiter, (PER_IP, "10.0.0.1"), (PER_SECRET, f"other{i}"))
+    assert limiter.hit(PER_IP, "10.0.0.1") > 0
+
+
+def test_retry_after_is_the_longest_wait():
+    limiter = MemoryRateLimiter()
+    slow = RateLimit("test:slow", 1, 1 / 600)
+    fast = RateLimit("test:fast", 1, 1 / 6)
+    assert limiter.hit_all([(slow, "k"), (fast, "k")]) == 0
+    assert limiter.hit_all([(slow, "k"), (fast, "k")]) == pytest.approx(600, rel=0.01)
+
+
+def test_evicted_buckets_come_back_full():
+    limiter = MemoryRateLimiter(max_keys=2)
+    limiter.hit(PER_SECRET, "a")
+    limiter.hit(PER_SECRET, "a")
+    assert limiter.hit(PER_SECRET, "a") > 0
+    limiter.hit(PER_SECRET, "b")
+    limiter.hit(PER_SECRET, "c")
+    assert limiter.hit(PER_SECRET, "a") == 0
+
+
+def _request(forwarded_for):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers, "client": ("192.0.2.7", 5000)})
+
+
+def test_forwarded_for_is_ignored_unless_trusted():
+    assert Settings.model_fields["RATE_LIMIT_TRUST_FORWARDED"].default is False
+    request = _request("203.0.113.9, 198.51.100.1")
+    assert client_ip(request) == "192.0.2.7"
+    assert client_ip(request, trust_forwarded=True) == "198.51.100.1"
+    assert client_ip(_request(None), trust_forwarded=True) == "192.0.2.7"
@@ -0,0 +1,124 @@
+# tests/test_retention.py
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import retention
+from dashboard_metrics import SCAN_HIGH_WATER_KEY
+from models import DashboardCounter, OtpChallenge, User, UserAssignment, UserScanLog
+from retention import RetentionJob, purge_table, run_retention
+from scan_rollup import ROLLUP_HIGH_WATER_KEY
+
+NOW = datetime.utcnow()
+
+
+@pytest.fixture
+def db(session_factory, monkeypatch):
+    monkeypatch.setattr(retention, "RETENTION_BATCH_PAUSE", 0)
+    db = session_factory()
+    db.add(User(user_id=1, name="alice"))
+    db.add(UserAssignment(user_assignment_id=1, user_id=1, panel_id=1, secret_code="Abc12345"))
+    db.commit()
+    yield db
+    db.close()
+
+
+def _add_otps(db, ages_in_days):
+    db.add_all([
+        OtpChallenge(user_assignment_id=1, otp_hash="h", expires_at=NOW - timedelta(days=age), created_at=NOW)
+        for age in ages_in_days
+    ])
+    db.commit()
+
+
+def _add_scans(db, ages_in_days):
+    db.add_all([
+        UserScanLog(user_assignment_id=1, scan_datetime=NOW - timedelta(days=age), verification_status=f"{age}")
+        for age in ages_in_days
+    ])
+    db.commit()
+
+
+def _set_high_water(db, dashboard: int, rollup: int):
+    db.add_all([
+        DashboardCounter(metric_key=SCAN_HIGH_WATER_KEY, value=dashboard, updated_at=NOW),
+        DashboardCounter(metric_key=ROLLUP_HIGH_WATER_KEY, value=rollup, updated_at=NOW),
+    ])
+    db.commit()
+
+
+def _count_deletes(engine):
+    deletes = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("DELETE"):
+            deletes.append(statement)
+
+    return deletes
+
+
+def test_old_otp_challenges_are_purged_in_batches_and_live_ones_survive(db, engine):
+    _add_otps(db, [30, 20, 10, 9, 8, 6, 1, 0, -1])  # negative age: not expired yet
+    deletes = _count_deletes(engine)
+
+    report = purge_table(db, OtpChallenge, OtpChallenge.otp_id, OtpChallenge.expires_at,
+                         NOW - timedelta(days=7), batch_size=2)
+
+    assert (report.rows, report.first_id, report.last_id) == (5, 1, 5)
+    assert len(deletes) == 3
+    remaining = [expires_at for (expires_at,) in db.query(OtpChallenge.expires_at).order_by(OtpChallenge.otp_id)]
+    assert remaining == [NOW - timedelta(days=age) for age in (6, 1, 0, -1)]
+
+
+def test_dry_run_deletes_nothing(db):
+    _add_otps(db, [30, 20, 1])
+    report = purge_table(db, OtpChallenge, OtpChallenge.otp_id, OtpChallenge.expires_at,
+                         NOW - timedelta(days=7), dry_run=True)
+    assert report.rows == 2 and report.dry_run
+    assert db.query(OtpChallenge).count() == 3
+
+
+def test_scan_logs_are_archived_then_purged_only_once_counted(db, tmp_path, monkeypatch):
+    _add_scans(db, [40, 35, 34, 33, 32, 31, 2, 1])
+    _set_high_water(db, dashboard=6, rollup=4)  # ids 5 and 6 are old but the rollup has not seen them
+    monkeypatch.setattr(retention, "purge_table", lambda *args, **kwargs: purge_table(*args, **kwargs, batch_size=3))
+
+    reports = run_retention(db, otp_days=0, scan_log_days=30, archive_dir=str(tmp_path / "archive"))
+
+    assert [(r.table, r.rows) for r in reports] == [("user_scan_log", 4)]
+    assert [log_id for (log_id,) in db.query(UserScanLog.log_id).order_by(UserScanLog.log_id)] == [5, 6, 7, 8]
+    segments = reports[0].archived_files
+    assert [path.rsplit("/", 1)[1] for path in segments] == [
+        "user_scan_log-000000000001-000000000003.jsonl.gz",
+        "user_scan_log-000000000004-000000000004.jsonl.gz",
+    ]
+    archived = []
+    for path in segments:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            archived.extend(json.loads(line) for line in fh)
+    assert [row["log_id"] for row in archived] == [1, 2, 3, 4]
+    assert [row["verification_status"] for row in archived] == ["40", "35", "34", "33"]
+
+
+def test_zero_days_keeps_everything(db):
+    _add_otps(db, [400])
+    _add_scans(db, [400])
+    _set_high_water(db, dashboard=1, rollup=1)
+    assert run_retention(db, otp_days=0, scan_log_days=0) == []
+    assert db.query(OtpChallenge).count() == 1 and db.query(UserScanLog).count() == 1
+
+
+def test_retention_job_runs_once_per_interval_across_workers(session_factory, db):
+    _add_otps(db, [30])
+    first = RetentionJob(session_factory, otp_days=7, scan_log_days=0)
+    second = RetentionJob(session_factory, otp_days=7, scan_log_days=0)
+
+    first.run()
+    second.run()
+
+    assert [r.rows for r in first.last_reports] == [1]
+    assert second.last_reports == []
@@ -0,0 +1,102 @@
+# tests/test_scan_log.py
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import scan_log
+from database import Base
+from models import User, UserAssignment, UserScanLog
+from scan_log import ScanLogBuffer
+
+
+@pytest.fixture
+def fk_session_factory(tmp_path):
+    """SQLite with foreign keys enforced, so a scan of an unknown assignment is an IntegrityError."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'scans.db'}")
+
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(user_id=1, name="alice"))
+    db.add_all([UserAssignment(user_assignment_id=i, user_id=1, panel_id=1, secret_code=f"code{i}") for i in (1, 2)])
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+
+def _logged(factory):
+    db = factory()
+    try:
+        return sorted(db.query(UserScanLog.user_assignment_id, UserScanLog.verification_status))
+    finally:
+        db.close()
+
+
+def test_bad_rows_are_isolated_and_dropped_after_max_attempts(fk_session_factory):
+    buffer = ScanLogBuffer(fk_session_factory)
+    for i in range(10):
+        buffer.record(1, f"ok{i}")
+    buffer.record(999, "orphan")      # no such assignment
+    buffer.record(2, "ok10")
+
+    assert buffer.flush() == 11
+    assert len(_logged(fk_session_factory)) == 11
+    assert (buffer.flushed, buffer.rejected) == (11, 0)
+
+    for _ in range(scan_log.SCAN_LOG_MAX_ATTEMPTS - 1):
+        assert buffer.flush() == 0
+    assert buffer.rejected == 1
+    assert buffer._rejected == []
+    assert buffer.flush() == 0
+    assert (999, "orphan") not in _logged(fk_session_factory)
+
+
+def test_rejected_row_is_written_once_it_becomes_valid(fk_session_factory):
+    buffer = ScanLogBuffer(fk_session_factory)
+    buffer.record(3, "early")
+    assert buffer.flush() == 0
+
+    db = fk_session_factory()
+    db.add(UserAssignment(user_assignment_id=3, user_id=1, panel_id=1, secret_code="code3"))
+    db.commit()
+    db.close()
+
+    assert buffer.flush() == 1
+    assert (3, "early") in _logged(fk_session_factory)
+    assert buffer.rejected == 0
+
+
+def test_outage_requeues_unwritten_events(fk_session_factory):
+    calls = []
+
+    def flaky_factory():
+        calls.append(1)
+        if len(calls) > 1:  # the whole batch is refused, then the database goes away mid-bisect
+            raise OperationalError("INSERT", {}, Exception("connection refused"))
+        return fk_session_factory()
+
+    buffer = ScanLogBuffer(flaky_factory)
+    buffer.record(999, "orphan")
+    for i in range(3):
+        buffer.record(1, f"ok{i}")
+    with pytest.raises(OperationalError):
+        buffer.flush()
+    assert (len(buffer), buffer.flushed, buffer._rejected) == (4, 0, [])
+
+    buffer.session_factory = fk_session_factory
+    buffer.flush()
+    assert [status for _, status in _logged(fk_session_factory)] == ["ok0", "ok1", "ok2"]
+
+
+def test_verification_status_longer_than_the_column_is_refused(make_client, auth_headers):
+    client = make_client()
+    response = client.post("/user-scan-log", headers=auth_headers, json={
+        "user_assignment_id": 1, "secret_code": "x", "verification_status": "x" * 101,
+    })
+    assert response.status_code == 422
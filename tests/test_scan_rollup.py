@@ -0,0 +1,95 @@
+# tests/test_scan_rollup.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+import scan_rollup
+from models import ScanRollupDaily, ScanRollupHourly, User, UserAssignment, UserScanLog
+from scan_rollup import ScanRollup, fold_scans, scan_series, verify_rollups
+
+START = datetime(2026, 3, 1)
+STATUSES = ["qr_initiated", "otp_verified", "1", "2", None]
+SQL_BUCKETS = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    db.add_all([User(user_id=u, name=f"user{u}") for u in (1, 2, 3)])
+    db.add_all([
+        UserAssignment(user_assignment_id=a, user_id=1 + a % 3, panel_id=1 + a % 2, secret_code=f"code{a}")
+        for a in range(1, 7)
+    ])
+    db.commit()
+    yield db
+    db.close()
+
+
+def _add_scans(db, count, rng):
+    db.add_all([
+        UserScanLog(
+            user_assignment_id=rng.choice([1, 2, 3, 4, 5, 6, None]),
+            scan_datetime=START + timedelta(minutes=rng.randrange(3 * 24 * 60)),
+            verification_status=rng.choice(STATUSES),
+        )
+        for _ in range(count)
+    ])
+    db.commit()
+
+
+def _group_by(db, bucket):
+    """The rollup computed by the database itself from the raw log."""
+    moment = func.strftime(SQL_BUCKETS[bucket], UserScanLog.scan_datetime)
+    panel_id = func.coalesce(UserAssignment.panel_id, 0)
+    user_id = func.coalesce(UserAssignment.user_id, 0)
+    status = func.coalesce(UserScanLog.verification_status, "")
+    return {
+        (moment_, panel, user, status_): count
+        for moment_, panel, user, status_, count in
+        db.query(moment, panel_id, user_id, status, func.count(UserScanLog.log_id))
+        .outerjoin(UserAssignment, UserAssignment.user_assignment_id == UserScanLog.user_assignment_id)
+        .filter(UserScanLog.scan_datetime.isnot(None))
+        .group_by(moment, panel_id, user_id, status)
+    }
+
+
+def _rollup(db, model):
+    return {
+        (row.bucket_start.strftime("%Y-%m-%d %H:%M:%S"), row.panel_id, row.user_id, row.verification_status):
+            row.scan_count
+        for row in db.query(model)
+    }
+
+
+def test_fold_scans_matches_group_by_on_the_raw_log(db, monkeypatch):
+    monkeypatch.setattr(scan_rollup, "ROLLUP_CHUNK", 37)  # many chunks, rows updated across chunks
+    rng = random.Random(17)
+    _add_scans(db, 400, rng)
+    db.add(UserScanLog(user_assignment_id=1, scan_datetime=None, verification_status="1"))  # never counted
+    db.commit()
+
+    assert fold_scans(db, 250) == 250
+    _add_scans(db, 300, rng)
+    max_log_id = db.query(func.max(UserScanLog.log_id)).scalar()
+    assert fold_scans(db, max_log_id) == max_log_id - 250
+    assert fold_scans(db, max_log_id) == 0
+
+    assert _rollup(db, ScanRollupHourly) == _group_by(db, "hour")
+    assert _rollup(db, ScanRollupDaily) == _group_by(db, "day")
+    for bucket in ("hour", "day"):
+        assert verify_rollups(db, START, START + timedelta(days=3), bucket) == []
+
+    series = scan_series(db, START, START + timedelta(days=3), "day")
+    assert sum(point[c] for point in series for c in scan_rollup.CATEGORIES) == 700
+
+
+def test_refresh_lags_one_round_behind_the_max_id(session_factory, db):
+    _add_scans(db, 50, random.Random(3))
+    rollup = ScanRollup(session_factory)
+    assert rollup.refresh() == 50
+    _add_scans(db, 10, random.Random(4))
+    assert rollup.refresh() == 0      # ids above the previous max may still belong to an open batch
+    assert rollup.refresh() == 10
+    assert _rollup(db, ScanRollupDaily) == _group_by(db, "day")
@@ -0,0 +1,150 @@
+# tests/test_secret_filter.py
+import math
+import random
+import string
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from migrations import migrate
+import secret_filter as secret_filter_module
+from models import User, UserAssignment, UserScanLog
+from secret_filter import BloomFilter, SecretCodeFilter
+
+ALPHABET = string.ascii_letters + string.digits
+
+
+def _codes(rng, count):
+    return {"".join(rng.choice(ALPHABET) for _ in range(8)) for _ in range(count)}
+
+
+def test_bloom_filter_false_positive_rate_is_bounded():
+    rng = random.Random(25)
+    error_rate = 0.001
+    valid = _codes(rng, 20000)
+    bloom = BloomFilter(len(valid), error_rate)  # filled to capacity: the worst case before a rebuild
+    for code in valid:
+        bloom.add(code)
+
+    assert [code for code in valid if code not in bloom] == []
+    probes = [code for code in _codes(rng, 100000) if code not in valid]
+    rate = sum(code in bloom for code in probes) / len(probes)
+    # Twice the target plus 3 standard deviations of sampling noise
+    assert rate <= 2 * error_rate + 3 * math.sqrt(error_rate / len(probes))
+    assert bloom.expected_error_rate() == pytest.approx(error_rate, rel=0.5)
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    migrate(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(User(user_id=1, name="alice"))
+    db.add_all([UserAssignment(user_id=1, panel_id=p, secret_code=f"known{p:03d}") for p in range(50)])
+    db.commit()
+    db.close()
+    yield engine, factory
+    engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(secret_filter_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _create_elsewhere(factory, code, user_assignment_id=None):
+    """What another worker does: insert the assignment, nothing else."""
+    db = factory()
+    db.add(UserAssignment(user_assignment_id=user_assignment_id, user_id=1, panel_id=99, secret_code=code))
+    db.commit()
+    db.close()
+
+
+def _count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_unknown_codes_are_rejected_from_memory_and_known_ones_never_are(migrated):
+    engine, factory = migrated
+    secret_filter = SecretCodeFilter(factory)
+    assert secret_filter.might_exist("anything")  # not built yet: everything goes to SQL
+    secret_filter.refresh()
+
+    statements = _count_statements(engine)
+    assert all(secret_filter.might_exist(f"known{p:03d}") for p in range(50))
+    rejected = sum(not secret_filter.might_exist(code) for code in _codes(random.Random(1), 1000))
+    assert rejected >= 990
+    assert statements == []
+    assert secret_filter.stats()["rejected"] == rejected
+
+
+def test_code_created_on_another_worker_is_picked_up_by_the_next_refresh(migrated, clock):
+    engine, factory = migrated
+    secret_filter = SecretCodeFilter(factory)
+    secret_filter.refresh()
+    _create_elsewhere(factory, "fresh001")
+    assert not secret_filter.might_exist("fresh001")  # stale until the refresh, by design
+
+    clock[0] += 5
+    statements = _count_statements(engine)
+    secret_filter.refresh()
+    assert secret_filter.might_exist("fresh001")
+    assert not any("count(" in statement.lower() for statement in statements)  # incremental, not a rebuild
+
+
+def test_ids_committed_late_are_picked_up_within_the_settle_window(migrated, clock):
+    _, factory = migrated
+    secret_filter = SecretCodeFilter(factory, settle_seconds=60)
+    secret_filter.refresh()
+    _create_elsewhere(factory, "later100", user_assignment_id=100)
+    clock[0] += 5
+    secret_filter.refresh()
+
+    # Took id 60 before id 100 was committed, but only commits now
+    _create_elsewhere(factory, "early060", user_assignment_id=60)
+    clock[0] += 5
+    secret_filter.refresh()
+    assert secret_filter.might_exist("early060")
+
+    # Past the window a refresh starts above the settled maximum
+    clock[0] += 60
+    secret_filter.refresh()
+    clock[0] += 5
+    secret_filter.refresh()
+    _create_elsewhere(factory, "late0070", user_assignment_id=70)
+    _create_elsewhere(factory, "next0101", user_assignment_id=101)
+    clock[0] += 5
+    secret_filter.refresh()
+    assert secret_filter.might_exist("next0101")
+    assert not secret_filter.might_exist("late0070")
+
+    clock[0] += secret_filter.rebuild_seconds
+    secret_filter.refresh()
+    assert secret_filter.might_exist("late0070")
+
+
+def test_verify_secret_rejects_from_the_filter_without_logging_a_scan(make_client, auth_headers):
+    client = make_client()
+    import main
+
+    db = main.SessionLocal()
+    db.add(User(user_id=1, name="alice"))
+    db.commit()
+    main.secret_filter.refresh()
+    assert client.post("/verify-secret/Zz9Yy8Xx", headers=auth_headers).status_code == 403
+    stats = client.get("/secret-filter-stats", headers=auth_headers).json()
+    assert stats["built"] and stats["rejected"] == 1
+    main.scan_log_buffer.flush()
+    assert db.query(UserScanLog).count() == 0
+
+    _create_elsewhere(main.SessionLocal, "Zz9Yy8Xx")
+    main.secret_filter.refresh()
+    response = client.post("/verify-secret/Zz9Yy8Xx", headers=auth_headers)
+    assert response.status_code == 200 and response.json()["status"] == "verified"
+    db.close()
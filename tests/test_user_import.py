@@ -0,0 +1,113 @@
+# tests/test_user_import.py
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+import user_import
+from models import PanelMaster, User, UserAssignment
+from user_import import ImportJobRegistry, parse_rows, run_import, validate_rows
+
+
+class NullQrCache:
+    def warm(self, urls):
+        pass
+
+
+@pytest.fixture
+def panels(session_factory):
+    db = session_factory()
+    db.add_all([PanelMaster(panel_name="P1"), PanelMaster(panel_name="P2")])
+    # Same name as an imported user: the ids must not be mixed up
+    db.add(User(name="Asha", email_id="old@example.com", phone_number=""))
+    db.commit()
+    db.close()
+
+
+def _rows(session_factory, csv_text):
+    db = session_factory()
+    try:
+        return validate_rows(db, parse_rows("users.csv", csv_text.encode("utf-8")))
+    finally:
+        db.close()
+
+
+def test_import_links_assignments_to_the_right_users(session_factory, panels, monkeypatch):
+    monkeypatch.setattr(user_import, "IMPORT_BATCH_SIZE", 2)
+    rows = _rows(session_factory, (
+        "name,email,panels\n"
+        "Asha,asha@example.com,P1;P2\n"
+        "Ben,ben@example.com,P2\n"
+        "Asha,asha2@example.com,P1\n"
+    ))
+    codes = (f"code{i}" for i in itertools.count())
+    job = ImportJobRegistry().create(len(rows))
+
+    run_import(job, rows, session_factory, lambda: next(codes), str, NullQrCache())
+
+    assert job.status == "completed", job.error
+    assert (job.users_created, job.assignments_created) == (3, 4)
+    db = session_factory()
+    try:
+        assigned = sorted(
+            (email, panel_name) for email, panel_name in
+            db.query(User.email_id, PanelMaster.panel_name)
+            .join(UserAssignment, UserAssignment.user_id == User.user_id)
+            .join(PanelMaster, PanelMaster.panel_id == UserAssignment.panel_id)
+        )
+    finally:
+        db.close()
+    assert assigned == [
+        ("asha2@example.com", "P1"),
+        ("asha@example.com", "P1"),
+        ("asha@example.com", "P2"),
+        ("ben@example.com", "P2"),
+    ]
+
+
+def test_rows_inserted_by_another_worker_during_the_import_are_not_picked_up(session_factory, panels, engine):
+    @event.listens_for(engine, "after_cursor_execute")
+    def other_worker(conn, cursor, statement, parameters, context, executemany):
+        # The same person, imported by someone else right after our INSERT
+        if statement.startswith("INSERT INTO users") and "phone_number" in statement:
+            cursor.connection.execute(
+                "INSERT INTO users (name, email_id, phone_number) VALUES ('Ben', 'ben@example.com', 'elsewhere')"
+            )
+
+    rows = _rows(session_factory, "name,email,panels\nBen,ben@example.com,P1\n")
+    job = ImportJobRegistry().create(len(rows))
+    try:
+        run_import(job, rows, session_factory, lambda: "code0", str, NullQrCache())
+    finally:
+        event.remove(engine, "after_cursor_execute", other_worker)
+
+    assert job.status == "completed", job.error
+    db = session_factory()
+    try:
+        assert db.query(User.phone_number).join(UserAssignment, UserAssignment.user_id == User.user_id).all() == [("",)]
+    finally:
+        db.close()
+
+
+def test_failed_import_writes_nothing(session_factory, panels, monkeypatch):
+    monkeypatch.setattr(user_import, "IMPORT_BATCH_SIZE", 1)
+    rows = _rows(session_factory, "name,email,panels\nA,a@example.com,P1\nB,b@example.com,P1\nC,c@example.com,P1\n")
+    calls = itertools.count()
+
+    def make_secret():  # fails in the third batch, after two were inserted
+        n = next(calls)
+        if n == 2:
+            raise RuntimeError("boom")
+        return f"code{n}"
+
+    job = ImportJobRegistry().create(len(rows))
+    run_import(job, rows, session_factory, make_secret, str, NullQrCache())
+
+    assert job.status == "failed"
+    assert (job.users_created, job.assignments_created) == (0, 0)
+    db = session_factory()
+    try:
+        assert db.query(User).count() == 1
+        assert db.query(UserAssignment).count() == 0
+    finally:
+        db.close()
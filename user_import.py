@@ -0,0 +1,249 @@
+# user_import.py
+import csv
+import io
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+
+from email_validator import EmailNotValidError, validate_email
+
+from models import PanelMaster, User, UserAssignment
+
+IMPORT_BATCH_SIZE = 250        # rows per multi-row INSERT; the whole file is one transaction
+IMPORT_QR_BATCH_SIZE = 200     # QR codes per render batch
+IMPORT_MAX_ERRORS = 100        # validation errors reported back
+IMPORT_JOBS_KEPT = 50          # finished jobs kept for polling
+
+COLUMN_ALIASES = {
+    "name": "name",
+    "user_name": "name",
+    "email": "email_id",
+    "email_id": "email_id",
+    "phone": "phone_number",
+    "phone_number": "phone_number",
+    "panels": "panels",
+    "panel_names": "panels",
+}
+PANEL_SEPARATORS = (";", "|")
+
+
+class ImportValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+# ------------------ Parsing & validation ------------------
+
+def _read_csv(content: bytes):
+    text = content.decode("utf-8-sig")
+    return list(csv.reader(io.StringIO(text)))
+
+
+def _read_xlsx(content: bytes):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportValidationError([{"row": 0, "error": "XLSX import needs openpyxl installed; upload a CSV instead"}])
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    sheet = workbook.worksheets[0]
+    return [["" if cell is None else str(cell) for cell in row] for row in sheet.iter_rows(values_only=True)]
+
+
+def _split_panels(value: str):
+    for sep in PANEL_SEPARATORS:
+        value = value.replace(sep, ",")
+    return [p.strip() for p in value.split(",") if p.strip()]
+
+
+def parse_rows(filename: str, content: bytes):
+    """Read an uploaded CSV/XLSX into dicts with name/email_id/phone_number/panels."""
+    if (filename or "").lower().endswith(".xlsx"):
+        table = _read_xlsx(content)
+    else:
+        try:
+            table = _read_csv(content)
+        except UnicodeDecodeError:
+            raise ImportValidationError([{"row": 0, "error": "File is not UTF-8 CSV"}])
+
+    if not table:
+        raise ImportValidationError([{"row": 0, "error": "File is empty"}])
+
+    header = [COLUMN_ALIASES.get(h.strip().lower().replace(" ", "_"), "") for h in table[0]]
+    missing = {"name", "email_id", "panels"} - set(header)
+    if missing:
+        raise ImportValidationError([{"row": 1, "error": f"Missing columns: {', '.join(sorted(missing))}"}])
+
+    rows = []
+    for line_no, values in enumerate(table[1:], start=2):
+        if not any(v.strip() for v in values):
+            continue
+        record = {key: value.strip() for key, value in zip(header, values) if key}
+        record["panels"] = _split_panels(record.get("panels", ""))
+        record.setdefault("phone_number", "")
+        record["row"] = line_no
+        rows.append(record)
+    return rows
+
+
+def validate_rows(db, rows):
+    """Check every row and resolve panel names to ids in one query.
+
+    Raises ImportValidationError listing the bad rows; nothing is written
+    unless the whole file is valid.
+    """
+    panel_names = {name for row in rows for name in row["panels"]}
+    panel_ids = dict(
+        db.query(PanelMaster.panel_name, PanelMaster.panel_id)
+        .filter(PanelMaster.panel_name.in_(panel_names), PanelMaster.is_deleted == False)
+    ) if panel_names else {}
+
+    errors = []
+    seen_emails = set()
+    for row in rows:
+        problems = []
+        if not row.get("name"):
+            problems.append("name is required")
+        try:
+            email = validate_email(row.get("email_id", ""), check_deliverability=False).normalized
+            if email.lower() in seen_emails:
+                problems.append(f"duplicate email {email} in file")
+            seen_emails.add(email.lower())
+            row["email_id"] = email
+        except EmailNotValidError as exc:
+            problems.append(f"invalid email: {exc}")
+        if len(row.get("phone_number", "")) > 20:
+            problems.append("phone number longer than 20 characters")
+        if not row["panels"]:
+            problems.append("at least one panel is required")
+        unknown = [name for name in row["panels"] if name not in panel_ids]
+        if unknown:
+            problems.append(f"unknown panels: {', '.join(unknown)}")
+        if problems:
+            errors.append({"row": row["row"], "error": "; ".join(problems)})
+            if len(errors) >= IMPORT_MAX_ERRORS:
+                break
+        else:
+            row["panel_ids"] = sorted({panel_ids[name] for name in row["panels"]})
+
+    if errors:
+        raise ImportValidationError(errors)
+    return rows
+
+
+# ------------------ Jobs ------------------
+
+@dataclass
+class ImportJob:
+    job_id: str
+    total_rows: int
+    status: str = "queued"          # queued / running / rendering_qr / completed / failed
+    processed_rows: int = 0
+    users_created: int = 0
+    assignments_created: int = 0
+    qr_rendered: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    rows_per_second: float | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ImportJobRegistry:
+    """Import jobs of this process, kept in memory for progress polling."""
+
+    def __init__(self, max_finished: int = IMPORT_JOBS_KEPT):
+        self.max_finished = max_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, total_rows: int) -> ImportJob:
+        job = ImportJob(job_id=uuid.uuid4().hex, total_rows=total_rows)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = sorted(
+                (j for j in self._jobs.values() if j.finished_at is not None),
+                key=lambda j: j.finished_at,
+            )
+            for old in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[old.job_id]
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+def _insert_users(db, batch):
+    """Insert the batch's users and return their new user_ids in batch order.
+
+    The flush sends one multi-row INSERT ... RETURNING where the dialect has
+    it (SQLite, PostgreSQL, MariaDB) and row-by-row INSERTs with lastrowid on
+    MySQL; either way each object gets the id of its own row, whatever other
+    workers insert meanwhile or however many rows share a name.
+    """
+    users = [User(name=r["name"], email_id=r["email_id"], phone_number=r["phone_number"]) for r in batch]
+    db.add_all(users)
+    db.flush()
+    user_ids = [user.user_id for user in users]
+    db.expunge_all()  # assignments go in as Core inserts; keep the session small on big files
+    return user_ids
+
+
+def run_import(job: ImportJob, rows, session_factory, make_secret, qr_url, qr_cache):
+    """Insert users and assignments in batched statements and one transaction, then render their QR codes.
+
+    A failure rolls the whole file back, so the same file can simply be uploaded again.
+    """
+    job.status = "running"
+    job.started_at = time.time()
+    secret_codes = []
+    assignments = []
+    db = session_factory()
+    try:
+        for i in range(0, len(rows), IMPORT_BATCH_SIZE):
+            batch = rows[i:i + IMPORT_BATCH_SIZE]
+            user_ids = _insert_users(db, batch)
+
+            for user_id, row in zip(user_ids, batch):
+                for panel_id in row["panel_ids"]:
+                    secret_code = make_secret()
+                    assignments.append({"user_id": user_id, "panel_id": panel_id, "secret_code": secret_code})
+                    secret_codes.append(secret_code)
+
+            job.processed_rows += len(batch)
+            job.users_created += len(user_ids)
+        # Assignment ids are taken right before the commit: the secret code filter
+        # of other workers only re-reads ids allocated within its settle window
+        for i in range(0, len(assignments), IMPORT_BATCH_SIZE):
+            db.execute(UserAssignment.__table__.insert(), assignments[i:i + IMPORT_BATCH_SIZE])
+            job.assignments_created += len(assignments[i:i + IMPORT_BATCH_SIZE])
+        db.commit()
+
+        elapsed = time.time() - job.started_at
+        job.rows_per_second = round(job.processed_rows / elapsed, 1) if elapsed > 0 else None
+    except Exception as exc:
+        db.rollback()
+        job.status = "failed"
+        job.error = str(exc)
+        job.users_created = job.assignments_created = 0
+        job.finished_at = time.time()
+        return
+    finally:
+        db.close()
+
+    job.status = "rendering_qr"
+    try:
+        for i in range(0, len(secret_codes), IMPORT_QR_BATCH_SIZE):
+            chunk = secret_codes[i:i + IMPORT_QR_BATCH_SIZE]
+            qr_cache.warm([qr_url(code) for code in chunk])
+            job.qr_rendered += len(chunk)
+    except Exception as exc:
+        # Users are in; QR images still render on demand
+        job.error = f"QR pre-rendering failed: {exc}"
+    job.status = "completed"
+    job.finished_at = time.time()
@@ -0,0 +1,97 @@
+# user_listing.py
+from sqlalchemy import or_
+
+from auth import sign_url
+from models import PanelMaster, User, UserAssignment
+
+USER_PAGE_SIZE = 100
+USER_PAGE_MAX = 1000
+STREAM_BATCH_SIZE = 1000  # rows fetched per round trip when streaming
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _user_filters(after_user_id=None, prefix=None):
+    filters = []
+    if after_user_id is not None:
+        filters.append(User.user_id > after_user_id)
+    if prefix:
+        pattern = _escape_like(prefix) + "%"
+        filters.append(or_(User.name.like(pattern, escape="\\"), User.email_id.like(pattern, escape="\\")))
+    return filters
+
+
+def assignment_rows(db, after_user_id=None, panel_id=None, prefix=None, user_ids=None):
+    """Assignment rows joined with user and panel, in (user_id, user_assignment_id) order.
+
+    Columns are selected explicitly so the legacy qr_code blobs are never loaded.
+    """
+    query = (
+        db.query(
+            UserAssignment.user_assignment_id, UserAssignment.secret_code,
+            User.user_id, User.name, User.email_id, User.phone_number,
+            PanelMaster.panel_id, PanelMaster.panel_name,
+        )
+        .join(User, User.user_id == UserAssignment.user_id)
+        .join(PanelMaster, PanelMaster.panel_id == UserAssignment.panel_id)
+        .filter(*_user_filters(after_user_id, prefix))
+        .order_by(User.user_id, UserAssignment.user_assignment_id)
+    )
+    if panel_id is not None:
+        query = query.filter(UserAssignment.panel_id == panel_id)
+    if user_ids is not None:
+        query = query.filter(User.user_id.in_(user_ids))
+    return query
+
+
+def page_user_ids(db, after_user_id=None, panel_id=None, prefix=None, limit=USER_PAGE_SIZE):
+    """Next `limit` user ids (keyset on user_id) that have a matching assignment.
+
+    Returns (user_ids, next_cursor); next_cursor is None on the last page.
+    """
+    has_assignment = (
+        db.query(UserAssignment.user_assignment_id)
+        .join(PanelMaster, PanelMaster.panel_id == UserAssignment.panel_id)
+        .filter(UserAssignment.user_id == User.user_id)
+    )
+    if panel_id is not None:
+        has_assignment = has_assignment.filter(UserAssignment.panel_id == panel_id)
+
+    user_ids = [
+        row.user_id for row in
+        db.query(User.user_id)
+        .filter(*_user_filters(after_user_id, prefix))
+        .filter(has_assignment.exists())
+        .order_by(User.user_id)
+        .limit(limit + 1)
+    ]
+    if len(user_ids) > limit:
+        return user_ids[:limit], user_ids[limit - 1]
+    return user_ids, None
+
+
+def group_by_user(rows):
+    """Fold ordered assignment rows into one dict per user, yielding each user as it completes."""
+    current = None
+    for row in rows:
+        if current is None or current["user_id"] != row.user_id:
+            if current is not None:
+                yield current
+            current = {
+                "user_id": row.user_id,
+                "user_name": row.name,
+                "email_id": row.email_id,
+                "phone_number": row.phone_number,
+                "assignments": [],
+            }
+        current["assignments"].append({
+            "user_assignment_id": row.user_assignment_id,
+            "panel_id": row.panel_id,
+            "panel_name": row.panel_name,
+            "secret_code": row.secret_code,
+            "qr_code_url": sign_url(f"/qr/{row.user_assignment_id}.png"),
+        })
+    if current is not None:
+        yield current